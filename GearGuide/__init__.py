@@ -1,20 +1,47 @@
+import os
 from flask import Flask
-from GearGuide.config import Config
+from GearGuide.config import CONFIGS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from GearGuide.weather_cache import WeatherCache
+from GearGuide.outbound import OutboundClient
+from GearGuide.geocode_cache import GeocodeCache
+from GearGuide.gazetteer import Gazetteer
+from GearGuide.social_graph import SocialGraph
+from GearGuide.sql_metrics import SQLMetrics
+from GearGuide.db_engine import engine_options, init_engine
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
+weather_cache = WeatherCache()
+http_client = OutboundClient()
+geocode_cache = GeocodeCache()
+gazetteer = Gazetteer()
+social_graph = SocialGraph()
+sql_metrics = SQLMetrics()
 
-def create_app():
+def create_app(config_name=None):
     app = Flask(__name__)
 
-    app.config.from_object(Config)
+    # GEARGUIDE_CONFIG=production picks ProductionConfig
+    config_name = config_name or os.environ.get('GEARGUIDE_CONFIG') or 'default'
+    if config_name not in CONFIGS:
+        raise ValueError(f"Unknown GEARGUIDE_CONFIG {config_name!r}; expected one of {', '.join(CONFIGS)}")
+    app.config.from_object(CONFIGS[config_name])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
 
     db.init_app(app)
+    with app.app_context():
+        init_engine(app, db.engine)
     migrate.init_app(app, db)
+    weather_cache.init_app(app)
+    http_client.init_app(app)
+    geocode_cache.init_app(app)
+    gazetteer.init_app(app)
+    social_graph.init_app(app)
+    sql_metrics.init_app(app)
 
     login_manager.init_app(app)
     login_manager.login_view = "main.login"
@@ -39,6 +66,21 @@ def create_app():
     from .weather_route import bp as weather_bp
     app.register_blueprint(weather_bp)
 
+    from .prefetch import Prefetcher
+    Prefetcher(app)
+
+    from .geocode_worker import GeocodeWorker
+    GeocodeWorker(app)
+
+    from .geocode_route import bp as geocode_bp
+    app.register_blueprint(geocode_bp)
+
+    from .trip_import import bp as trip_import_bp
+    app.register_blueprint(trip_import_bp)
+
+    from .stats_route import bp as stats_bp
+    app.register_blueprint(stats_bp)
+
     from flask import render_template
     @app.errorhandler(404)
     def not_found(error):
@@ -4,3 +4,147 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or "dev-secret-key-change"
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'gearguide.db')
+
+    # Weather caching. TTLs are in seconds; the forecast TTL is only used
+    # when NWS doesn't send Cache-Control/Expires headers. MIN_TTL keeps a
+    # no-cache or max-age=0 forecast from being refetched on every request.
+    WEATHER_POINTS_TTL = int(os.environ.get('WEATHER_POINTS_TTL') or 7 * 24 * 60 * 60)
+    WEATHER_FORECAST_TTL = int(os.environ.get('WEATHER_FORECAST_TTL') or 15 * 60)
+    WEATHER_FORECAST_MIN_TTL = int(os.environ.get('WEATHER_FORECAST_MIN_TTL') or 60)
+    WEATHER_FORECAST_MAX_TTL = int(os.environ.get('WEATHER_FORECAST_MAX_TTL') or 60 * 60)
+    WEATHER_POINTS_CACHE_SIZE = int(os.environ.get('WEATHER_POINTS_CACHE_SIZE') or 4096)
+    WEATHER_FORECAST_CACHE_SIZE = int(os.environ.get('WEATHER_FORECAST_CACHE_SIZE') or 1024)
+    WEATHER_SUGGESTIONS_CACHE_SIZE = int(os.environ.get('WEATHER_SUGGESTIONS_CACHE_SIZE') or 1024)
+
+    # Upstream APIs; point these at benchmarks/stub_server.py for load tests
+    NWS_BASE_URL = os.environ.get('NWS_BASE_URL') or 'https://api.weather.gov'
+    NOMINATIM_BASE_URL = os.environ.get('NOMINATIM_BASE_URL') or 'https://nominatim.openstreetmap.org'
+
+    # Outbound HTTP (NWS, Nominatim). Timeouts are in seconds.
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT') or 3.05)
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT') or 10)
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES') or 2)
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF') or 0.25)
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE') or 10)
+    HTTP_BREAKER_THRESHOLD = int(os.environ.get('HTTP_BREAKER_THRESHOLD') or 5)
+    HTTP_BREAKER_RESET = float(os.environ.get('HTTP_BREAKER_RESET') or 30)
+
+    # /stats shows upstream latency, breaker state and cache counters, so
+    # it is a 404 unless STATS_ENABLED is set or the app runs in debug mode
+    STATS_ENABLED = (os.environ.get('STATS_ENABLED') or '').lower() in ('1', 'true', 'yes')
+
+    # Forecast prefetching for upcoming trips. PREFETCH_EVERY is how often
+    # (in seconds) the in-process prefetcher runs; 0 leaves it off so it
+    # can be run from cron with `flask weather prefetch` instead.
+    WEATHER_FORECAST_HORIZON_DAYS = int(os.environ.get('WEATHER_FORECAST_HORIZON_DAYS') or 7)
+    WEATHER_PREFETCH_EVERY = int(os.environ.get('WEATHER_PREFETCH_EVERY') or 0)
+    WEATHER_PREFETCH_BUDGET = int(os.environ.get('WEATHER_PREFETCH_BUDGET') or 50)
+    WEATHER_PREFETCH_SPACING = float(os.environ.get('WEATHER_PREFETCH_SPACING') or 0.5)
+    WEATHER_PREFETCH_MARGIN = int(os.environ.get('WEATHER_PREFETCH_MARGIN') or 5 * 60)
+
+    # /weather/batch: how many coordinates one request may ask for and how
+    # many upstream NWS fetches it may run at once
+    WEATHER_BATCH_MAX_ITEMS = int(os.environ.get('WEATHER_BATCH_MAX_ITEMS') or 50)
+    WEATHER_BATCH_WORKERS = int(os.environ.get('WEATHER_BATCH_WORKERS') or 4)
+
+    # How long (seconds) a stale stored forecast is served from memory
+    # before we check the database / retry NWS again
+    WEATHER_STALE_TTL = int(os.environ.get('WEATHER_STALE_TTL') or 60)
+
+    # Destination autocomplete (/geocode/suggest). Queries shorter than
+    # MIN_CHARS are only answered from the local index.
+    GEOCODE_SUGGEST_LIMIT = int(os.environ.get('GEOCODE_SUGGEST_LIMIT') or 6)
+    GEOCODE_SUGGEST_MIN_CHARS = int(os.environ.get('GEOCODE_SUGGEST_MIN_CHARS') or 3)
+    GEOCODE_SUGGEST_CACHE_SIZE = int(os.environ.get('GEOCODE_SUGGEST_CACHE_SIZE') or 4096)
+    GEOCODE_SUGGEST_TTL = int(os.environ.get('GEOCODE_SUGGEST_TTL') or 24 * 60 * 60)
+    GEOCODE_INDEX_SIZE = int(os.environ.get('GEOCODE_INDEX_SIZE') or 20000)
+
+    # Nominatim allows 1 request/second per application; this limit is
+    # shared by every worker through the rate_limits table
+    NOMINATIM_RATE = float(os.environ.get('NOMINATIM_RATE') or 1)
+    NOMINATIM_BURST = float(os.environ.get('NOMINATIM_BURST') or 1)
+
+    # Geocoding for new trips. With GEOCODE_ASYNC on, trips are saved right
+    # away and geocoded by a background worker; otherwise the worker only
+    # retries lookups that failed inline. Backoff and wait are in seconds.
+    GEOCODE_ASYNC = (os.environ.get('GEOCODE_ASYNC') or '').lower() in ('1', 'true', 'yes')
+    GEOCODE_MAX_ATTEMPTS = int(os.environ.get('GEOCODE_MAX_ATTEMPTS') or 5)
+    GEOCODE_RETRY_BACKOFF = float(os.environ.get('GEOCODE_RETRY_BACKOFF') or 5)
+    GEOCODE_LIMIT_WAIT = float(os.environ.get('GEOCODE_LIMIT_WAIT') or 5)
+
+    # Offline gazetteer of popular outdoor destinations, checked before
+    # Nominatim. The CSV is compiled into the index on first use.
+    GAZETTEER_SOURCE = os.environ.get('GAZETTEER_SOURCE') or os.path.join(basedir, 'data', 'gazetteer.csv')
+    GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH') or os.path.join(basedir, 'data', 'gazetteer.idx')
+
+    # Bulk trip import (`flask trips import` and /trips/import). Trips are
+    # inserted BATCH_SIZE per transaction.
+    TRIP_IMPORT_MAX_ROWS = int(os.environ.get('TRIP_IMPORT_MAX_ROWS') or 1000)
+    TRIP_IMPORT_BATCH_SIZE = int(os.environ.get('TRIP_IMPORT_BATCH_SIZE') or 100)
+    TRIP_IMPORT_GEOCODE_WORKERS = int(os.environ.get('TRIP_IMPORT_GEOCODE_WORKERS') or 4)
+
+    # "People you may know" on the friends page. Each worker keeps the
+    # friend graph in memory and rebuilds it every SOCIAL_GRAPH_TTL seconds
+    # to pick up other workers' writes; MAX_SCAN caps the friend-of-friend
+    # ids read per suggestion.
+    PEOPLE_YOU_MAY_KNOW_LIMIT = int(os.environ.get('PEOPLE_YOU_MAY_KNOW_LIMIT') or 5)
+    SOCIAL_GRAPH_TTL = float(os.environ.get('SOCIAL_GRAPH_TTL') or 300)
+    SOCIAL_GRAPH_MAX_SCAN = int(os.environ.get('SOCIAL_GRAPH_MAX_SCAN') or 30000)
+
+    # Per-request SQL instrumentation: a Server-Timing "db" header and a
+    # JSON log line (logger GearGuide.sql) per request. A statement shape
+    # repeated more than N_PLUS_ONE_THRESHOLD times in one request is
+    # reported as an N+1 query.
+    SQL_METRICS = (os.environ.get('SQL_METRICS') or '').lower() in ('1', 'true', 'yes')
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD') or 5)
+
+    # Trips, friends and invite lists are shown PAGE_SIZE rows at a time.
+    # The JSON list endpoints (for infinite scroll) take a ?limit= of up
+    # to MAX_PAGE_SIZE.
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 20)
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 100)
+
+    # Database engine tuning, filled in by ProductionConfig. SQLITE_PRAGMAS
+    # run on every new SQLite connection; DB_POOL_* are passed to
+    # SQLAlchemy's connection pool (None keeps SQLAlchemy's default).
+    SQLITE_PRAGMAS = {}
+    DB_POOL_SIZE = None
+    DB_MAX_OVERFLOW = None
+    DB_POOL_TIMEOUT = None
+    DB_POOL_RECYCLE = None
+    DB_POOL_PRE_PING = None
+
+
+class ProductionConfig(Config):
+    """Config for running under gunicorn with several worker processes
+
+    Select it with GEARGUIDE_CONFIG=production."""
+
+    # WAL lets readers keep reading while a writer commits, and NORMAL only
+    # syncs at checkpoints (safe in WAL mode; a power cut can lose the last
+    # commits but never corrupts the file). busy_timeout makes a writer wait
+    # its turn instead of failing with "database is locked". cache_size is
+    # in KiB when negative.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL',
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE') or -64 * 1024),
+    }
+
+    # Connection pool per worker process, mostly for Postgres. Pre-ping and
+    # recycle drop connections the server or a proxy closed while idle.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 30 * 60)
+    DB_POOL_PRE_PING = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() in ('1', 'true', 'yes')
+
+
+# GEARGUIDE_CONFIG -> config class
+CONFIGS = {
+    'default': Config,
+    'development': Config,
+    'production': ProductionConfig,
+}
@@ -1,10 +1,17 @@
 from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash
-from datetime import date
-from GearGuide.models import User, Trip, TripInvite, Friendship, PackListItem
+from datetime import date, datetime, timezone
+import base64
+import heapq
+import json
+from GearGuide.models import User, Trip, TripInvite, Friendship, FriendEdge, PackListItem, ForecastEntry, GeocodeEntry, RateLimitBucket
 from GearGuide import db
-from typing import List
-from sqlalchemy import or_
+from typing import List, NamedTuple
+from sqlalchemy import or_, update, delete, insert, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+
+# bound parameters allowed in one statement by SQLite before 3.32
+MAX_BOUND_PARAMETERS = 999
 
 def add_user(
     username : str, 
@@ -96,16 +103,217 @@ def get_trip(
     # trip = db.session.query(Trip).get({'id':trip_id})
     return Trip.query.get(trip_id)
 
-def get_users_trips(
-    user_id : int   
+def is_trip_member(
+    user_id : int,
+    trip : Trip
+) -> bool:
+    """Returns True if the user hosts the trip or has accepted an invite to it"""
+
+    if trip.host_id == user_id:
+        return True
+
+    invite = TripInvite.query.filter_by(
+        user_id=user_id,
+        trip_id=trip.id,
+        accepted=True
+    ).first()
+
+    return invite is not None
+
+class TripView(NamedTuple):
+    """Everything the trip detail page shows, for one viewer"""
+
+    trip : Trip
+    is_host : bool
+    is_member : bool             # host or accepted invitee
+    members : List[User]         # host first, then accepted invitees
+    pack_items : List[PackListItem]
+    pending_invite_ids : set     # users invited who haven't accepted yet
+    friends_for_invite : List[User]  # viewer's friends not on the trip; host only
+
+def load_trip_view(
+    trip_id : int,
+    viewer_id : int
+) -> TripView | None:
+    """Loads a trip with its host, invites, members and pack list for viewer_id
+
+    Takes three queries however many members or items the trip has (the
+    trip joined to its host, then its invites with their users, then its
+    pack list), plus one for the host's friends when the viewer is the host.
+
+    Returns None if there is no such trip"""
+
+    trip = (
+        db.session.query(Trip)
+        .options(
+            joinedload(Trip.host),
+            selectinload(Trip.invites).joinedload(TripInvite.user),
+            selectinload(Trip.pack_items),
+        )
+        .filter(Trip.id == trip_id)
+        .first()
+    )
+
+    if trip is None:
+        return None
+
+    is_host = trip.host_id == viewer_id
+    accepted = [invite for invite in trip.invites if invite.accepted]
+    is_member = is_host or any(invite.user_id == viewer_id for invite in accepted)
+    if not is_member:
+        return TripView(trip, False, False, [], [], set(), [])
+
+    members = [trip.host] + [invite.user for invite in accepted if invite.user_id != trip.host_id]
+
+    pending_invite_ids = set()
+    friends_for_invite = []
+    if is_host:
+        pending_invite_ids = {invite.user_id for invite in trip.invites if not invite.accepted}
+        member_ids = {user.id for user in members}
+        friends_for_invite = [f for f in get_users_friends(viewer_id) if f.id not in member_ids]
+
+    return TripView(trip, is_host, True, members, list(trip.pack_items), pending_invite_ids, friends_for_invite)
+
+def get_viewable_trips(
+    user_id : int,
+    trip_ids : List[int]
 ) -> List[Trip]:
-    """Gets a list of trips that the user is hosting
-    
-    List will be empty if no trips are being hosted by the user"""
+    """Returns the trips in trip_ids that the user hosts or has accepted an invite to
+
+    Trips the user can't see are silently left out"""
+
+    if not trip_ids:
+        return []
+
+    accepted_trip_ids = (
+        db.session.query(TripInvite.trip_id)
+        .filter(TripInvite.user_id == user_id, TripInvite.accepted == True)
+    )
+
+    trips = (
+        db.session.query(Trip)
+        .filter(Trip.id.in_(trip_ids))
+        .filter(or_(Trip.host_id == user_id, Trip.id.in_(accepted_trip_ids)))
+        .all()
+    )
 
-    trips = db.session.query(Trip).filter(Trip.host_id == user_id).all()
     return trips
 
+class Page(NamedTuple):
+    """One page of a list, and the cursor for the page after it"""
+
+    items : list
+    next_cursor : str | None     # None on the last page
+
+def encode_cursor(
+    key : tuple
+) -> str:
+    """Returns an opaque cursor for the sort key of the last row on a page"""
+
+    values = [v.isoformat() if isinstance(v, date) else v for v in key]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(
+    cursor : str,
+    types : tuple
+) -> tuple:
+    """Returns the sort key in a cursor made by encode_cursor, as types
+
+    Raises ValueError if the cursor wasn't made for a key of these types"""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Bad cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Bad cursor")
+    key = []
+    for kind, value in zip(types, values):
+        if kind is date and isinstance(value, str):
+            key.append(date.fromisoformat(value))
+        elif kind is not date and isinstance(value, kind) and not isinstance(value, bool):
+            key.append(value)
+        else:
+            raise ValueError("Bad cursor")
+    return tuple(key)
+
+def _page(rows : list, limit : int, key) -> Page:
+    # rows were fetched with limit + 1, so an extra row means there's a next page
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    return Page(rows, encode_cursor(key(rows[-1])))
+
+def _trip_key(trip : Trip) -> tuple:
+    return (trip.start_date, trip.id)
+
+def _user_key(user : User) -> tuple:
+    return (user.username, user.id)
+
+def get_hosted_trips_page(
+    user_id : int,
+    cursor : str | None = None,
+    limit : int = 20
+) -> Page:
+    """Returns a page of the trips a user hosts, ordered by (start_date, id)
+
+    A range scan on ix_trips_host_start.
+
+    Raises ValueError for a bad cursor"""
+
+    query = db.session.query(Trip).filter(Trip.host_id == user_id)
+    if cursor is not None:
+        query = query.filter(tuple_(Trip.start_date, Trip.id) > decode_cursor(cursor, (date, int)))
+
+    trips = query.order_by(Trip.start_date, Trip.id).limit(limit + 1).all()
+    return _page(trips, limit, _trip_key)
+
+def get_users_trips_page(
+    user_id : int,
+    cursor : str | None = None,
+    limit : int = 20
+) -> Page:
+    """Returns a page of the trips a user hosts or has accepted an invite to
+
+    Ordered by (start_date, id). Pass the page's next_cursor back in for
+    the page after it. Hosted trips are a range scan on
+    ix_trips_host_start, so a page costs the same however many trips the
+    user has hosted.
+
+    Raises ValueError for a bad cursor"""
+
+    hosted = db.session.query(Trip).filter(Trip.host_id == user_id)
+    shared = (
+        db.session.query(Trip)
+        .join(TripInvite, TripInvite.trip_id == Trip.id)
+        .filter(TripInvite.user_id == user_id, TripInvite.accepted == True)
+    )
+
+    if cursor is not None:
+        after = decode_cursor(cursor, (date, int))
+        hosted = hosted.filter(tuple_(Trip.start_date, Trip.id) > after)
+        shared = shared.filter(tuple_(Trip.start_date, Trip.id) > after)
+
+    # each side is already in order, so the page is the first limit + 1 of the merge
+    order = (Trip.start_date, Trip.id)
+    merged = heapq.merge(
+        hosted.order_by(*order).limit(limit + 1).all(),
+        shared.order_by(*order).limit(limit + 1).all(),
+        key=_trip_key,
+    )
+    trips, seen = [], set()
+    for trip in merged:
+        if trip.id not in seen:
+            seen.add(trip.id)
+            trips.append(trip)
+        if len(trips) > limit:
+            break
+
+    return _page(trips, limit, _trip_key)
+
 def invite_user_to_trip(
     user_id : int,
     trip_id : int
@@ -177,15 +385,136 @@ def get_users_friends(
 
     friends = (
         db.session.query(User)
-        .join(Friendship, or_(Friendship.user1_id == User.id, Friendship.user2_id == User.id))
-        .filter(or_(Friendship.user1_id == user_id, Friendship.user2_id == user_id))
-        .filter(User.id != user_id)
-        .filter(Friendship.status == 'ACCEPTED')
+        .join(FriendEdge, FriendEdge.friend_id == User.id)
+        .filter(FriendEdge.user_id == user_id, FriendEdge.status == 'ACCEPTED')
         .all()
     )
 
     return friends
 
+def get_pending_trip_invites_page(
+    user_id : int,
+    cursor : str | None = None,
+    limit : int = 20
+) -> Page:
+    """Returns a page of the trip invites a user hasn't answered yet
+
+    Items are (invite, trip, host) tuples ordered by the trip's
+    (start_date, id).
+
+    Raises ValueError for a bad cursor"""
+
+    query = (
+        db.session.query(TripInvite, Trip, User)
+        .join(Trip, Trip.id == TripInvite.trip_id)
+        .join(User, User.id == Trip.host_id)
+        .filter(TripInvite.user_id == user_id, TripInvite.accepted == False)
+    )
+    if cursor is not None:
+        query = query.filter(tuple_(Trip.start_date, Trip.id) > decode_cursor(cursor, (date, int)))
+
+    rows = query.order_by(Trip.start_date, Trip.id).limit(limit + 1).all()
+    return _page([tuple(row) for row in rows], limit, lambda row: _trip_key(row[1]))
+
+def _friend_edge_page(user_id : int, filters : tuple, cursor : str | None, limit : int) -> Page:
+    # users on the far side of user_id's friend edges, by (username, id)
+    query = (
+        db.session.query(User)
+        .join(FriendEdge, FriendEdge.friend_id == User.id)
+        .filter(FriendEdge.user_id == user_id, *filters)
+    )
+    if cursor is not None:
+        query = query.filter(tuple_(User.username, User.id) > decode_cursor(cursor, (str, int)))
+
+    users = query.order_by(User.username, User.id).limit(limit + 1).all()
+    return _page(users, limit, _user_key)
+
+def get_users_friends_page(
+    user_id : int,
+    cursor : str | None = None,
+    limit : int = 20
+) -> Page:
+    """Returns a page of a user's friends, ordered by (username, id)
+
+    Raises ValueError for a bad cursor"""
+
+    return _friend_edge_page(user_id, (FriendEdge.status == 'ACCEPTED',), cursor, limit)
+
+def get_pending_friend_requests_page(
+    user_id : int,
+    cursor : str | None = None,
+    limit : int = 20
+) -> Page:
+    """Returns a page of the users who have sent a user a friend request,
+    ordered by (username, id)
+
+    Raises ValueError for a bad cursor"""
+
+    filters = (FriendEdge.status == 'PENDING', FriendEdge.outgoing == False)
+    return _friend_edge_page(user_id, filters, cursor, limit)
+
+def get_users_by_ids(
+    user_ids : List[int]
+) -> List[User]:
+    """Returns the users with the given ids, in the order given
+
+    Ids with no user are left out"""
+
+    if not user_ids:
+        return []
+
+    users = {u.id: u for u in db.session.query(User).filter(User.id.in_(user_ids)).all()}
+    return [users[i] for i in user_ids if i in users]
+
+def get_friendship_pairs() -> List[tuple]:
+    """Returns (user1_id, user2_id, status) for every friendship row
+
+    Used to build the in-memory social graph"""
+
+    rows = db.session.query(Friendship.user1_id, Friendship.user2_id, Friendship.status).all()
+    return rows
+
+def get_trip_memberships() -> List[tuple]:
+    """Returns (trip_id, user_id) for every trip host and accepted invitee
+
+    Used to build the in-memory social graph"""
+
+    hosts = db.session.query(Trip.id, Trip.host_id)
+    guests = (
+        db.session.query(TripInvite.trip_id, TripInvite.user_id)
+        .filter(TripInvite.accepted == True)
+    )
+    return hosts.union_all(guests).all()
+
+def _set_friend_edges(
+    friendship : Friendship
+) -> None:
+    # mirrors a friendships row into both friend_edges rows; the caller commits.
+    # Old requests with no initiator count as outgoing on both sides, so, as
+    # before, neither user sees them as an incoming request
+    pair = (friendship.user1_id, friendship.user2_id)
+    for user_id, friend_id in (pair, pair[::-1]):
+        db.session.merge(
+            FriendEdge(
+                user_id=user_id,
+                friend_id=friend_id,
+                status=friendship.status,
+                outgoing=friendship.initiator_id in (None, user_id)
+            )
+        )
+
+def _remove_friend_edges(
+    user1_id : int,
+    user2_id : int
+) -> None:
+    # deletes both friend_edges rows for a pair; the caller commits
+    pair = (user1_id, user2_id)
+    (
+        db.session.query(FriendEdge)
+        .filter(FriendEdge.user_id.in_(pair), FriendEdge.friend_id.in_(pair))
+        .delete(synchronize_session=False)
+    )
+
 def send_friend_request(
     user1_id: int,  # sender
     user2_id: int   # receiver
@@ -217,6 +546,7 @@ def send_friend_request(
         # If there's an old row with NULL initiator_id, patch it
         if existing.status == "PENDING" and existing.initiator_id is None:
             existing.initiator_id = sender_id
+            _set_friend_edges(existing)
             db.session.commit()
             return True
 
@@ -237,6 +567,7 @@ def send_friend_request(
 
     try:
         db.session.add(friendship)
+        _set_friend_edges(friendship)
         db.session.commit()
         return True
     except IntegrityError:
@@ -261,6 +592,7 @@ def accept_friend_request(user1_id: int, user2_id: int) -> None:
         return
 
     friendship.status = "ACCEPTED"
+    _set_friend_edges(friendship)
     db.session.commit()
 
 
@@ -282,6 +614,7 @@ def remove_friend(user1_id: int, user2_id: int) -> None:
         return
 
     db.session.delete(friendship)
+    _remove_friend_edges(low, high)
     db.session.commit()
 
 def block_user(
@@ -295,17 +628,22 @@ def block_user(
     if(user1_id == user2_id):
         return False
 
-    if(user2_id > user1_id):
-        user1_id, user2_id = user2_id, user1_id
+    low = min(user1_id, user2_id)
+    high = max(user1_id, user2_id)
 
-    request = db.session.query(Friendship).get({'user1_id':user1_id, 'user2_id':user2_id})
+    request = (
+        db.session.query(Friendship)
+        .filter_by(user1_id=low, user2_id=high)
+        .first()
+    )
 
     if(request is None): # there is no friendship in the db
 
-        request = Friendship(user1_id=user1_id, user2_id=user2_id, status='BLOCKED')
+        request = Friendship(user1_id=low, user2_id=high, status='BLOCKED')
 
         try:
             db.session.add(request)
+            _set_friend_edges(request)
             db.session.commit()
             return True
         except IntegrityError:
@@ -314,6 +652,7 @@ def block_user(
 
     else: # there is a friendship in the db
         request.status = 'BLOCKED'
+        _set_friend_edges(request)
         db.session.commit()
         return True
 
@@ -336,6 +675,65 @@ def add_pack_item(
         db.session.rollback()
         return False
 
+def add_pack_items(
+    trip_id : int,
+    names : List[str],
+    commit : bool = True
+) -> int:
+    """Adds many items to a trip's pack list with one multi-row INSERT
+
+    Names already on the list, or repeated in names, are skipped. With
+    commit=False the insert is left in the caller's transaction, e.g. to
+    save a new trip and its items together.
+
+    Returns the number of items added"""
+
+    names = list(dict.fromkeys(name for name in names if name))
+    if not names:
+        return 0
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_ignoring
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_ignoring
+    else:
+        insert_ignoring = None
+
+    added = 0
+    try:
+        if insert_ignoring is None:
+            # no ON CONFLICT here; leave out the names that already exist
+            existing = {
+                name for (name,) in
+                db.session.query(PackListItem.name)
+                .filter(PackListItem.trip_id == trip_id, PackListItem.name.in_(names))
+            }
+            names = [name for name in names if name not in existing]
+
+        # chunked to stay under the database's bound parameter limit
+        chunk = MAX_BOUND_PARAMETERS // 3  # trip_id, name, is_packed per row
+        for start in range(0, len(names), chunk):
+            rows = [{"trip_id": trip_id, "name": name, "is_packed": False} for name in names[start:start + chunk]]
+            if insert_ignoring is None:
+                result = db.session.execute(insert(PackListItem).values(rows))
+            else:
+                result = db.session.execute(
+                    insert_ignoring(PackListItem)
+                    .values(rows)
+                    .on_conflict_do_nothing(index_elements=["trip_id", "name"])
+                )
+            added += result.rowcount
+
+        if commit:
+            db.session.commit()
+        return added
+    except IntegrityError:
+        if commit:
+            db.session.rollback()
+            return 0
+        raise
+
 def get_pack_list(
     trip_id : int
 ) -> List[PackListItem]:
@@ -383,4 +781,291 @@ def remove_pack_item(
 
     db.session.delete(item)
     db.session.commit()
-    return True
\ No newline at end of file
+    return True
+
+
+def sync_pack_list(
+    trip_id : int,
+    packed : List[int] = (),
+    unpacked : List[int] = (),
+    added : List[str] = (),
+    removed : List[int] = ()
+) -> dict | None:
+    """Applies a pack list diff to a trip in one transaction
+
+    packed and unpacked are item ids to check and uncheck, added are new
+    item names, and removed are item ids to delete. Each kind of change
+    is a single statement. Ids that aren't on this trip and names
+    already on the list are skipped.
+
+    Returns how many items were packed, unpacked, added and removed, or
+    None if the transaction failed and nothing was changed"""
+
+    removed = set(removed)
+    packed = set(packed) - removed
+    unpacked = set(unpacked) - removed - packed
+    on_trip = PackListItem.trip_id == trip_id
+    counts = {"packed": 0, "unpacked": 0, "added": 0, "removed": 0}
+
+    try:
+        if removed:
+            result = db.session.execute(
+                delete(PackListItem).where(on_trip, PackListItem.id.in_(removed))
+            )
+            counts["removed"] = result.rowcount
+
+        for ids, is_packed, key in ((packed, True, "packed"), (unpacked, False, "unpacked")):
+            if ids:
+                result = db.session.execute(
+                    update(PackListItem)
+                    .where(on_trip, PackListItem.id.in_(ids), PackListItem.is_packed.isnot(is_packed))
+                    .values(is_packed=is_packed)
+                )
+                counts[key] = result.rowcount
+
+        counts["added"] = add_pack_items(trip_id, added, commit=False)
+
+        db.session.commit()
+        return counts
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+def get_forecast_entry(
+    office : str,
+    grid_x : int,
+    grid_y : int
+) -> ForecastEntry | None:
+    """Gets the stored forecast for an NWS gridpoint
+
+    Returns None if that gridpoint has never been fetched"""
+
+    return db.session.get(ForecastEntry, (office, grid_x, grid_y))
+
+def save_forecast_entry(
+    office : str,
+    grid_x : int,
+    grid_y : int,
+    periods : str,
+    version : str,
+    polygon : str | None,
+    fetched_at : datetime,
+    expires_at : datetime,
+    etag : str | None = None,
+    last_modified : str | None = None
+) -> bool:
+    """Inserts or replaces the stored forecast for an NWS gridpoint
+
+    periods and polygon are JSON strings; etag and last_modified are the
+    NWS validators used for conditional refreshes. Returns False if the
+    write fails, e.g. because another worker saved the same gridpoint first"""
+
+    entry = get_forecast_entry(office, grid_x, grid_y)
+    if entry is None:
+        entry = ForecastEntry(office=office, grid_x=grid_x, grid_y=grid_y)
+        db.session.add(entry)
+
+    entry.periods = periods
+    entry.version = version
+    entry.fetched_at = fetched_at
+    entry.expires_at = expires_at
+    entry.etag = etag
+    entry.last_modified = last_modified
+    if polygon is not None:
+        entry.polygon = polygon
+
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def extend_forecast_entry(
+    office : str,
+    grid_x : int,
+    grid_y : int,
+    expires_at : datetime
+) -> bool:
+    """Pushes back the expiry of a stored forecast that NWS said is unchanged
+
+    Returns False if the gridpoint has no stored forecast"""
+
+    entry = get_forecast_entry(office, grid_x, grid_y)
+    if entry is None:
+        return False
+
+    entry.expires_at = expires_at
+    db.session.commit()
+    return True
+
+def get_forecast_polygons() -> List[tuple]:
+    """Returns (office, grid_x, grid_y, polygon) for every stored grid cell
+
+    Used to rebuild the in-memory gridpoint index after a restart"""
+
+    rows = (
+        db.session.query(ForecastEntry.office, ForecastEntry.grid_x, ForecastEntry.grid_y, ForecastEntry.polygon)
+        .filter(ForecastEntry.polygon.isnot(None))
+        .all()
+    )
+
+    return rows
+
+def get_geocode_entry(
+    normalized : str
+) -> GeocodeEntry | None:
+    """Gets the cached geocode for a normalized destination
+
+    Returns None if the destination has never been geocoded"""
+
+    return db.session.get(GeocodeEntry, normalized)
+
+def save_geocode_entry(
+    normalized : str,
+    lat : float,
+    lon : float,
+    display_name : str | None = None
+) -> bool:
+    """Caches the geocode for a normalized destination
+
+    Returns False if the write fails, e.g. because another worker cached
+    the same destination first"""
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    entry = GeocodeEntry(
+        normalized=normalized,
+        lat=lat,
+        lon=lon,
+        display_name=display_name,
+        hits=0,
+        created_at=now,
+        last_used_at=now
+    )
+
+    try:
+        db.session.add(entry)
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def record_geocode_hit(
+    normalized : str
+) -> None:
+    """Bumps the hit counter of a cached geocode in a single UPDATE"""
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    (
+        db.session.query(GeocodeEntry)
+        .filter(GeocodeEntry.normalized == normalized)
+        .update({GeocodeEntry.hits: GeocodeEntry.hits + 1, GeocodeEntry.last_used_at: now}, synchronize_session=False)
+    )
+    db.session.commit()
+
+def get_geocode_labels(
+    limit : int
+) -> List[tuple]:
+    """Returns (display_name, lat, lon) for the most used cached geocodes
+
+    Used to seed the autocomplete index after a restart"""
+
+    rows = (
+        db.session.query(GeocodeEntry.display_name, GeocodeEntry.lat, GeocodeEntry.lon)
+        .filter(GeocodeEntry.display_name.isnot(None))
+        .order_by(GeocodeEntry.hits.desc())
+        .limit(limit)
+        .all()
+    )
+
+    return rows
+
+def get_rate_limit_bucket(
+    name : str
+) -> tuple | None:
+    """Returns (tokens, updated_at) for a rate limit bucket, read fresh from the database
+
+    Returns None if the bucket doesn't exist yet"""
+
+    return (
+        db.session.query(RateLimitBucket.tokens, RateLimitBucket.updated_at)
+        .filter(RateLimitBucket.name == name)
+        .first()
+    )
+
+def create_rate_limit_bucket(
+    name : str,
+    tokens : float,
+    updated_at : float
+) -> bool:
+    """Creates a rate limit bucket
+
+    Returns False if another worker created it first"""
+
+    try:
+        db.session.add(RateLimitBucket(name=name, tokens=tokens, updated_at=updated_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def swap_rate_limit_tokens(
+    name : str,
+    expected_updated_at : float,
+    tokens : float,
+    updated_at : float
+) -> bool:
+    """Compare-and-swap on a rate limit bucket
+
+    Only writes if nobody has taken from the bucket since it was read at
+    expected_updated_at. Returns False if somebody did"""
+
+    swapped = (
+        db.session.query(RateLimitBucket)
+        .filter(RateLimitBucket.name == name, RateLimitBucket.updated_at == expected_updated_at)
+        .update({RateLimitBucket.tokens: tokens, RateLimitBucket.updated_at: updated_at}, synchronize_session=False)
+    )
+    db.session.commit()
+    return swapped == 1
+
+def get_pending_geocode_trip_ids() -> List[int]:
+    """Ids of trips still waiting for their destination to be geocoded"""
+
+    rows = db.session.query(Trip.id).filter(Trip.geocode_status == 'PENDING').all()
+    return [row.id for row in rows]
+
+def claim_trip_geocode(
+    trip_id : int,
+    attempts : int
+) -> bool:
+    """Marks the start of geocode attempt number attempts + 1 for a pending trip
+
+    Only succeeds if nobody else claimed that attempt first, so two
+    workers never geocode the same trip at once"""
+
+    claimed = (
+        db.session.query(Trip)
+        .filter(Trip.id == trip_id, Trip.geocode_status == 'PENDING', Trip.geocode_attempts == attempts)
+        .update({Trip.geocode_attempts: attempts + 1}, synchronize_session=False)
+    )
+    db.session.commit()
+    return claimed == 1
+
+def set_trip_location(
+    trip_id : int,
+    lat : float | None,
+    lon : float | None,
+    status : str
+) -> None:
+    """Stores the outcome of geocoding a trip's destination
+
+    status is DONE with coordinates, or FAILED with None for both"""
+
+    (
+        db.session.query(Trip)
+        .filter(Trip.id == trip_id)
+        .update({Trip.lat: lat, Trip.lon: lon, Trip.geocode_status: status}, synchronize_session=False)
+    )
+    db.session.commit()
@@ -0,0 +1,76 @@
+# database engine tuning: SQLite pragmas on connect and connection pool sizing
+import re
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# config key -> create_engine() argument
+POOL_OPTIONS = {
+    "DB_POOL_SIZE": "pool_size",
+    "DB_MAX_OVERFLOW": "max_overflow",
+    "DB_POOL_TIMEOUT": "pool_timeout",
+    "DB_POOL_RECYCLE": "pool_recycle",
+    "DB_POOL_PRE_PING": "pool_pre_ping",
+}
+
+_PRAGMA_NAME = re.compile(r"^[a-z_]+$")
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+
+
+def engine_options(
+    config : dict
+) -> dict:
+    """Returns SQLALCHEMY_ENGINE_OPTIONS with the DB_POOL_* settings added
+
+    Settings left as None keep SQLAlchemy's defaults, and options already
+    in SQLALCHEMY_ENGINE_OPTIONS win. An in-memory SQLite database gets no
+    pool options, since it runs on one shared connection with no pool to
+    size."""
+
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+
+    for key, option in POOL_OPTIONS.items():
+        if config.get(key) is not None:
+            options.setdefault(option, config[key])
+    return options
+
+
+def set_sqlite_pragmas(
+    dbapi_connection,
+    pragmas : dict
+) -> None:
+    """Runs PRAGMA name = value on a raw sqlite3 connection for each pragma
+
+    Raises ValueError for a name or value that isn't a plain word or number"""
+
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            value = str(value)
+            if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(value):
+                raise ValueError(f"Bad SQLite pragma {name} = {value!r}")
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def init_engine(
+    app,
+    engine
+) -> None:
+    """Applies SQLITE_PRAGMAS to every new connection the engine opens
+
+    Does nothing for other databases or when SQLITE_PRAGMAS is empty"""
+
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas or engine.dialect.name != "sqlite":
+        return
+
+    # journal_mode=WAL is stored in the database file; the others are per connection
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        set_sqlite_pragmas(dbapi_connection, pragmas)
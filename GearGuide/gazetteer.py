@@ -0,0 +1,339 @@
+# offline gazetteer: popular outdoor destinations resolved without a network call
+import csv
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+
+from GearGuide.geocode_cache import Suggestion, normalize_destination
+
+# magic, entry count, size of the keys blob, size of the labels blob
+HEADER = struct.Struct("<4sIII")
+MAGIC = b"GGZ1"
+
+# most index keys fuzzy() compares against one query
+FUZZY_SCAN = 200
+
+logger = logging.getLogger(__name__)
+
+
+def compile_gazetteer(
+    source : str,
+    target : str
+) -> int:
+    """Compiles a gazetteer CSV into the on-disk index read by Gazetteer
+
+    The CSV needs name, lat and lon columns; an optional region column
+    (e.g. a state code) is appended to the label. Every place is indexed
+    under its normalized name and its normalized label.
+
+    The index is a header, two offset arrays into the key and label
+    blobs, a float32 (lat, lon) table, then the blobs themselves, all
+    sorted by key so lookups are a binary search over the mapped file.
+    It is written in native byte order, so build it on the machine that
+    serves it. Returns the number of entries written"""
+
+    entries = {}
+    with open(source, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            region = (row.get("region") or "").strip()
+            label = f"{name}, {region}" if region else name
+            lat, lon = float(row["lat"]), float(row["lon"])
+
+            for key in (normalize_destination(name), normalize_destination(label)):
+                if key:
+                    entries.setdefault(key.encode("utf-8"), (label.encode("utf-8"), lat, lon))
+
+    keys = sorted(entries)
+    key_offsets = array("I", [0])
+    label_offsets = array("I", [0])
+    coords = array("f")
+    labels = []
+    for key in keys:
+        label, lat, lon = entries[key]
+        key_offsets.append(key_offsets[-1] + len(key))
+        label_offsets.append(label_offsets[-1] + len(label))
+        coords.extend((lat, lon))
+        labels.append(label)
+
+    keys_blob = b"".join(keys)
+    labels_blob = b"".join(labels)
+
+    # write next to the target and swap it in, so readers never see half a file
+    directory = os.path.dirname(os.path.abspath(target))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(keys), len(keys_blob), len(labels_blob)))
+            key_offsets.tofile(f)
+            label_offsets.tofile(f)
+            coords.tofile(f)
+            f.write(keys_blob)
+            f.write(labels_blob)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    return len(keys)
+
+
+# normalized US state and territory names -> the codes the gazetteer uses
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+    "puerto rico": "pr", "guam": "gu", "us virgin islands": "vi", "virgin islands": "vi",
+}
+
+US_COUNTRY = {"us", "usa", "u s a", "united states", "united states of america"}
+
+
+def _lookup_keys(text : str) -> list[str]:
+    # index keys that count as a sure match for text: the whole string, or
+    # "name region" when the part after the first comma names a region
+    keys = [normalize_destination(text)]
+    if "," not in text:
+        return keys
+
+    parts = [normalize_destination(part) for part in text.split(",")]
+    parts = [part for part in parts if part]
+    if parts and parts[-1] in US_COUNTRY:
+        parts.pop()
+    if len(parts) == 1:
+        keys.append(parts[0])
+    elif len(parts) == 2:
+        name, region = parts
+        keys.append(f"{name} {US_STATES.get(region, region)}")
+    return keys
+
+
+def _edit_distance(a : str, b : str, limit : int) -> int:
+    # Levenshtein distance, giving up early once it must exceed limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Gazetteer:
+    """Memory-mapped index of well known places, for lookups with no network
+
+    Built from GAZETTEER_SOURCE (a CSV) into GAZETTEER_PATH the first time
+    it is used, or with `flask geocode build-gazetteer`. The index is
+    rebuilt whenever the CSV is newer, in the instance folder if
+    GAZETTEER_PATH isn't writable. If neither file exists, or the index
+    can't be read, every lookup simply misses."""
+
+    def __init__(self, path : str | None = None, source : str | None = None, fallback_path : str | None = None):
+        self.path = path
+        self.source = source
+        self.fallback_path = fallback_path
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+        self._loaded = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.path = app.config["GAZETTEER_PATH"]
+        self.source = app.config["GAZETTEER_SOURCE"]
+        self.fallback_path = os.path.join(app.instance_path, "gazetteer.idx")
+        app.extensions["gazetteer"] = self
+
+    def _stale(self, path : str | None) -> bool:
+        if not self.source or not os.path.exists(self.source):
+            return False
+        if not path or not os.path.exists(path):
+            return True
+        return os.path.getmtime(self.source) > os.path.getmtime(path)
+
+    def _ensure_loaded(self) -> bool:
+        if self._loaded is not None:
+            return self._loaded
+
+        with self._lock:
+            if self._loaded is not None:
+                return self._loaded
+
+            # a missing, unreadable or corrupt index is tried once per
+            # process; after that every lookup misses and Nominatim answers
+            try:
+                self._loaded = self._load()
+            except (OSError, ValueError) as e:
+                logger.warning("Offline gazetteer disabled: %s", e)
+                self._loaded = False
+            return self._loaded
+
+    def _load(self) -> bool:
+        path = self.path
+        if self._stale(path):
+            try:
+                compile_gazetteer(self.source, path)
+            except OSError:
+                # read-only install; keep our own copy in the instance folder
+                if not self.fallback_path:
+                    raise
+                path = self.fallback_path
+                if self._stale(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    compile_gazetteer(self.source, path)
+
+        if not path or not os.path.exists(path):
+            return False
+
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, count, keys_len, labels_len = HEADER.unpack_from(data)
+        except struct.error:
+            magic, count, keys_len, labels_len = b"", 0, 0, 0
+        offsets_len = (count + 1) * 4
+        if magic != MAGIC or len(data) != HEADER.size + 2 * offsets_len + count * 8 + keys_len + labels_len:
+            # checked before any view of data exists, so it can still be closed
+            data.close()
+            raise ValueError(f"{path} is not a gazetteer index")
+
+        view = memoryview(data)
+        pos = HEADER.size
+        self._key_offsets = view[pos:pos + offsets_len].cast("I")
+        pos += offsets_len
+        self._label_offsets = view[pos:pos + offsets_len].cast("I")
+        pos += offsets_len
+        self._coords = view[pos:pos + count * 8].cast("f")
+        pos += count * 8
+        self._keys = view[pos:pos + keys_len]
+        pos += keys_len
+        self._labels = view[pos:pos + labels_len]
+
+        self._data = data
+        self.count = count
+        return True
+
+    def _key(self, i : int) -> bytes:
+        return bytes(self._keys[self._key_offsets[i]:self._key_offsets[i + 1]])
+
+    def _place(self, i : int) -> Suggestion:
+        label = bytes(self._labels[self._label_offsets[i]:self._label_offsets[i + 1]]).decode("utf-8")
+        # float32 keeps ~1m of precision; don't show the noise beyond that
+        return Suggestion(label, round(self._coords[2 * i], 5), round(self._coords[2 * i + 1], 5))
+
+    def _lower_bound(self, key : bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _exact(self, key : bytes) -> int | None:
+        i = self._lower_bound(key)
+        if i < self.count and self._key(i) == key:
+            return i
+        return None
+
+    def _prefix_range(self, prefix : bytes, limit : int) -> list[int]:
+        found = []
+        i = self._lower_bound(prefix)
+        while i < self.count and len(found) < limit and self._key(i).startswith(prefix):
+            found.append(i)
+            i += 1
+        return found
+
+    def prefix(self, text : str, limit : int) -> list[Suggestion]:
+        """Up to limit places whose name starts with text, one per label"""
+
+        query = normalize_destination(text)
+        if not query or not self._ensure_loaded():
+            return []
+
+        places = []
+        seen = set()
+        # a place is indexed under both its name and label, so over-fetch
+        for i in self._prefix_range(query.encode("utf-8"), limit * 2):
+            place = self._place(i)
+            if place.label not in seen:
+                seen.add(place.label)
+                places.append(place)
+        return places[:limit]
+
+    def fuzzy(self, text : str) -> Suggestion | None:
+        """The closest place to a misspelled name, if one is close enough
+
+        Only the first FUZZY_SCAN names sharing the first three characters
+        and within the allowed typos in length are compared, and at most
+        one typo per eight characters is allowed"""
+
+        query = normalize_destination(text)
+        if len(query) < 5 or not self._ensure_loaded():
+            return None
+
+        limit = min(3, max(1, len(query) // 8))
+        best, best_distance = None, limit + 1
+        for i in self._prefix_range(query[:3].encode("utf-8"), FUZZY_SCAN):
+            key = self._key(i).decode("utf-8")
+            if abs(len(key) - len(query)) > limit:
+                continue
+            distance = _edit_distance(query, key, limit)
+            if distance < best_distance:
+                best, best_distance = i, distance
+        return self._place(best) if best is not None else None
+
+    def lookup(self, text : str) -> Suggestion | None:
+        """Resolves a destination string to a known place, only when it is sure
+
+        Matches the whole string against a place's name or its "name,
+        region" label ("Zion National Park", "Moab, UT"). A region after
+        the first comma must be the place's own, given as a code or a US
+        state name ("Lake Tahoe, California"); a trailing country of
+        "USA" is ignored. Prefixes and misspellings never match here (see
+        prefix() and fuzzy(), for autocomplete), so a None sends the
+        caller on to Nominatim."""
+
+        if not normalize_destination(text) or not self._ensure_loaded():
+            return None
+
+        place = None
+        for key in _lookup_keys(text):
+            i = self._exact(key.encode("utf-8"))
+            if i is not None:
+                place = self._place(i)
+                break
+
+        with self._stats_lock:
+            if place is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return place
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"entries": self.count, "hits": self.hits, "misses": self.misses}
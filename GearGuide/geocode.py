@@ -0,0 +1,290 @@
+# destination geocoding and autocomplete through Nominatim
+import threading
+from typing import NamedTuple
+
+import requests
+from flask import current_app
+
+from . import http_client, geocode_cache, gazetteer
+from .geocode_cache import Suggestion, normalize_destination
+from .weather_cache import SingleFlight
+from .ratelimit import TokenBucket
+from .database import (
+    get_geocode_entry,
+    save_geocode_entry,
+    record_geocode_hit,
+    get_geocode_labels,
+)
+
+NOMINATIM_HEADERS = {"User-Agent": "GearGuideApp"}
+
+# Trip.geocode_status values
+GEOCODE_PENDING = "PENDING"
+GEOCODE_DONE = "DONE"
+GEOCODE_FAILED = "FAILED"
+
+
+class GeocodeRateLimited(Exception):
+    """Raised when no Nominatim token became available in time"""
+
+
+class GeocodeResult(NamedTuple):
+    lat: float
+    lon: float
+    display_name: str | None
+
+
+# process-wide counters, reported by /stats
+_counts = {
+    "gazetteer": 0,
+    "hits": 0,
+    "misses": 0,
+    "not_found": 0,
+    "suggest_index": 0,
+    "suggest_cache": 0,
+    "suggest_upstream": 0,
+    "suggest_limited": 0,
+}
+_counts_lock = threading.Lock()
+_seed_lock = threading.Lock()
+
+# concurrent misses for the same destination share one Nominatim call
+_inflight = SingleFlight()
+
+
+def _count(key : str) -> None:
+    with _counts_lock:
+        _counts[key] += 1
+
+
+def geocode_stats() -> dict:
+    """Hit/miss counts for geocoding and autocomplete since this process started"""
+    with _counts_lock:
+        counts = dict(_counts)
+    lookups = counts["gazetteer"] + counts["hits"] + counts["misses"]
+    counts["hit_rate"] = round((counts["gazetteer"] + counts["hits"]) / lookups, 3) if lookups else None
+    counts["coalesced"] = _inflight.coalesced
+    counts.update(geocode_cache.stats())
+    counts["gazetteer_index"] = gazetteer.stats()
+    return counts
+
+
+def nominatim_limiter() -> TokenBucket:
+    """The deployment-wide limiter for Nominatim calls (1 request/second by default)"""
+    config = current_app.config
+    return TokenBucket("nominatim", config["NOMINATIM_RATE"], config["NOMINATIM_BURST"])
+
+
+def _fetch_geocode(query : str, destination : str, wait_for_limit : float) -> GeocodeResult | None:
+    # another worker may have cached it while we waited to lead
+    entry = get_geocode_entry(query)
+    if entry is not None:
+        return GeocodeResult(entry.lat, entry.lon, entry.display_name)
+
+    if not nominatim_limiter().acquire(wait_for_limit):
+        raise GeocodeRateLimited(f"No Nominatim capacity for {destination!r}")
+
+    res = http_client.get(
+        f"{current_app.config['NOMINATIM_BASE_URL']}/search",
+        params={"q": destination, "limit": 1, "format": "json"},
+        headers=NOMINATIM_HEADERS,
+    )
+    res.raise_for_status()
+    data = res.json()
+
+    if not isinstance(data, list) or len(data) == 0:
+        _count("not_found")
+        return None
+
+    result = GeocodeResult(float(data[0]["lat"]), float(data[0]["lon"]), data[0].get("display_name"))
+    save_geocode_entry(query, result.lat, result.lon, result.display_name)
+    if result.display_name:
+        geocode_cache.index.add(Suggestion(result.display_name, result.lat, result.lon))
+    return result
+
+
+def cached_geocode(
+    destination : str
+) -> GeocodeResult | None:
+    """Coordinates for a destination from the gazetteer or the geocode cache
+
+    Never calls Nominatim. Returns None on a miss in both"""
+
+    query = normalize_destination(destination)
+    if not query:
+        return None
+
+    place = gazetteer.lookup(destination)
+    if place is not None:
+        _count("gazetteer")
+        return GeocodeResult(place.lat, place.lon, place.label)
+
+    entry = get_geocode_entry(query)
+    if entry is None:
+        return None
+
+    # read before the hit is committed, which expires the entry
+    result = GeocodeResult(entry.lat, entry.lon, entry.display_name)
+    _count("hits")
+    record_geocode_hit(query)
+    return result
+
+
+def geocode_destination(
+    destination : str,
+    wait_for_limit : float | None = None
+) -> GeocodeResult | None:
+    """Coordinates for a destination, from the geocode cache or Nominatim
+
+    A cache hit makes no outbound call. Returns None if Nominatim has no
+    match (those aren't cached, so a later retry can still succeed).
+    Every Nominatim call goes through the shared rate limiter, waiting
+    up to wait_for_limit seconds (GEOCODE_LIMIT_WAIT by default) for it.
+
+    Raises requests.RequestException if Nominatim can't be reached and
+    GeocodeRateLimited if the rate limiter had no room in time"""
+
+    result = cached_geocode(destination)
+    if result is not None:
+        return result
+
+    query = normalize_destination(destination)
+    if not query:
+        return None
+
+    if wait_for_limit is None:
+        wait_for_limit = current_app.config["GEOCODE_LIMIT_WAIT"]
+
+    _count("misses")
+    return _inflight.do(query, lambda: _fetch_geocode(query, destination, wait_for_limit))
+
+
+def pretty_label(
+    place : dict
+) -> str:
+    """Short "City, State, Country" label for a Nominatim result
+
+    Falls back to Nominatim's full display_name"""
+
+    a = place.get("address") or {}
+    city = (
+        a.get("city") or a.get("town") or a.get("village") or a.get("hamlet")
+        or a.get("suburb") or a.get("municipality") or ""
+    )
+    region = a.get("state") or a.get("county") or ""
+    country = a.get("country") or ""
+    return ", ".join(part for part in (city, region, country) if part) or place.get("display_name", "")
+
+
+def _seed_index() -> None:
+    # rebuild the autocomplete index from the geocodes table after a restart
+    index = geocode_cache.index
+    if index.seeded:
+        return
+    with _seed_lock:
+        if index.seeded:
+            return
+        for label, lat, lon in get_geocode_labels(index.maxsize):
+            index.add(Suggestion(label, lat, lon))
+        index.seeded = True
+
+
+def _fetch_suggestions(query : str, text : str) -> list[Suggestion] | None:
+    # another request may have answered this query while we waited to lead
+    cached = geocode_cache.queries.get(query)
+    if cached is not None:
+        return cached
+
+    if not nominatim_limiter().try_acquire():
+        return None
+
+    res = http_client.get(
+        f"{current_app.config['NOMINATIM_BASE_URL']}/search",
+        params={
+            "q": text,
+            "format": "json",
+            "addressdetails": 1,
+            "limit": current_app.config["GEOCODE_SUGGEST_LIMIT"],
+        },
+        headers=NOMINATIM_HEADERS,
+    )
+    res.raise_for_status()
+    data = res.json()
+
+    suggestions = []
+    seen = set()
+    for place in data if isinstance(data, list) else []:
+        suggestion = Suggestion(pretty_label(place), float(place["lat"]), float(place["lon"]))
+        key = normalize_destination(suggestion.label)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        suggestions.append(suggestion)
+
+        geocode_cache.index.add(suggestion)
+        # picking this suggestion then creates the trip without a Nominatim call
+        if get_geocode_entry(key) is None:
+            save_geocode_entry(key, suggestion.lat, suggestion.lon, suggestion.label)
+
+    geocode_cache.queries.set(query, suggestions, geocode_cache.queries_ttl)
+    return suggestions
+
+
+def _merge(lists : list[list[Suggestion]], limit : int) -> list[Suggestion]:
+    # first limit suggestions across lists, one per label
+    merged = []
+    seen = set()
+    for suggestions in lists:
+        for suggestion in suggestions:
+            if len(merged) < limit and suggestion.label not in seen:
+                seen.add(suggestion.label)
+                merged.append(suggestion)
+    return merged
+
+
+def suggest_destinations(
+    text : str
+) -> tuple[list[Suggestion], str]:
+    """Autocomplete suggestions for what the user has typed so far
+
+    Tries, in order: the offline gazetteer plus the prefix index of
+    places already seen, the cache of earlier Nominatim answers, and
+    finally Nominatim itself through the shared rate limiter. Gazetteer
+    places always come first. Returns the suggestions and where they
+    came from ("index", "cache", "nominatim", "limited" or "error");
+    when Nominatim is limited or failing, the local matches are returned."""
+
+    config = current_app.config
+    limit = config["GEOCODE_SUGGEST_LIMIT"]
+    query = normalize_destination(text)
+    if not query:
+        return [], "index"
+
+    _seed_index()
+    known = gazetteer.prefix(query, limit)
+    if not known:
+        # a likely misspelling of a known place, offered but never auto-picked
+        close = gazetteer.fuzzy(query)
+        known = [close] if close is not None else []
+    local = _merge([known, geocode_cache.index.search(query, limit)], limit)
+    if len(local) >= limit or len(query) < config["GEOCODE_SUGGEST_MIN_CHARS"]:
+        _count("suggest_index")
+        return local, "index"
+
+    cached = geocode_cache.queries.get(query)
+    if cached is not None:
+        _count("suggest_cache")
+        return _merge([known, cached, local], limit), "cache"
+
+    try:
+        suggestions = _inflight.do(("suggest", query), lambda: _fetch_suggestions(query, text))
+    except (requests.RequestException, ValueError, KeyError) as e:
+        current_app.logger.warning("Nominatim suggest failed for %r: %s", text, e)
+        return local, "error"
+
+    if suggestions is None:
+        _count("suggest_limited")
+        return local, "limited"
+
+    _count("suggest_upstream")
+    return _merge([known, suggestions, local], limit), "nominatim"
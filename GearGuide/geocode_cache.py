@@ -0,0 +1,109 @@
+# in-memory caches for destination autocomplete
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import NamedTuple
+
+from GearGuide.weather_cache import TTLCache
+
+
+class Suggestion(NamedTuple):
+    label : str
+    lat : float
+    lon : float
+
+
+def normalize_destination(
+    destination : str
+) -> str:
+    """Folds case, punctuation and whitespace so equivalent spellings share a key
+
+    "  Yosemite National-Park!" and "yosemite national park" both become
+    "yosemite national park"."""
+
+    text = unicodedata.normalize("NFKC", destination).casefold()
+    text = "".join(" " if unicodedata.category(c).startswith("P") else c for c in text)
+    return " ".join(text.split())[:255]
+
+
+class PrefixIndex:
+    """Every place label we have seen, searchable by prefix
+
+    Labels are kept normalized in a sorted list, so a prefix search is a
+    binary search plus a short scan. Once maxsize labels are stored new
+    ones are ignored; the index only ever holds real places, so it is
+    not worth evicting from."""
+
+    def __init__(self, maxsize : int = 20000):
+        self.maxsize = maxsize
+        self._keys = []
+        self._items = {}
+        self._lock = threading.Lock()
+        self.seeded = False
+
+    def add(self, suggestion : Suggestion) -> None:
+        key = normalize_destination(suggestion.label)
+        if not key:
+            return
+        with self._lock:
+            if key in self._items:
+                self._items[key] = suggestion
+                return
+            if len(self._keys) >= self.maxsize:
+                return
+            insort(self._keys, key)
+            self._items[key] = suggestion
+
+    def search(self, prefix : str, limit : int) -> list[Suggestion]:
+        """Up to limit suggestions whose normalized label starts with prefix"""
+        with self._lock:
+            results = []
+            i = bisect_left(self._keys, prefix)
+            while i < len(self._keys) and len(results) < limit and self._keys[i].startswith(prefix):
+                results.append(self._items[self._keys[i]])
+                i += 1
+            return results
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._items.clear()
+            self.seeded = False
+
+    def stats(self) -> dict:
+        return {"size": len(self._keys), "maxsize": self.maxsize}
+
+
+class GeocodeCache:
+    """Caches for the /geocode/suggest route
+
+    index holds every place label seen so far (from Nominatim answers and
+    the geocodes table) and answers a prefix query outright when it has
+    enough matches. queries maps a normalized query to the suggestions
+    Nominatim returned for it, including empty answers."""
+
+    def __init__(self, app=None):
+        self.index = PrefixIndex()
+        self.queries = TTLCache()
+        self.queries_ttl = 24 * 60 * 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.index.maxsize = app.config["GEOCODE_INDEX_SIZE"]
+        self.queries.maxsize = app.config["GEOCODE_SUGGEST_CACHE_SIZE"]
+        self.queries_ttl = app.config["GEOCODE_SUGGEST_TTL"]
+        app.extensions["geocode_cache"] = self
+
+    def clear(self) -> None:
+        self.index.clear()
+        self.queries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "index": self.index.stats(),
+            "queries": self.queries.stats(),
+        }
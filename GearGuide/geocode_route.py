@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required
+
+from .geocode import suggest_destinations
+from .gazetteer import compile_gazetteer
+
+# Blueprint so it can be registered in create_app()
+bp = Blueprint("geocode", __name__)
+
+
+@bp.route("/geocode/suggest", methods=["GET"])
+@login_required
+def suggest():
+    """
+    Example: /geocode/suggest?q=yosem
+
+    Destination autocomplete for the create-trip form. Answers from the
+    local prefix index and query cache when it can; misses go to
+    Nominatim under the shared rate limit.
+    """
+
+    q = request.args.get("q", "").strip()
+    suggestions, source = suggest_destinations(q)
+
+    response = jsonify(
+        {
+            "query": q,
+            "source": source,
+            "suggestions": [s._asdict() for s in suggestions],
+        }
+    )
+
+    # partial answers shouldn't stick in the browser cache
+    if source in ("limited", "error"):
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        response.headers["Cache-Control"] = "private, max-age=300"
+    return response
+
+
+@bp.cli.command("build-gazetteer")
+def build_gazetteer_command():
+    """Compile GAZETTEER_SOURCE into the offline index at GAZETTEER_PATH"""
+
+    source = current_app.config["GAZETTEER_SOURCE"]
+    target = current_app.config["GAZETTEER_PATH"]
+    count = compile_gazetteer(source, target)
+    print(f"Wrote {count} entries from {source} to {target}")
@@ -0,0 +1,135 @@
+# background geocoding for trips saved before their destination was looked up
+import heapq
+import random
+import threading
+import time
+
+import requests
+
+from . import db
+from .database import get_trip, get_pending_geocode_trip_ids, claim_trip_geocode, set_trip_location
+from .geocode import (
+    GEOCODE_PENDING,
+    GEOCODE_DONE,
+    GEOCODE_FAILED,
+    GeocodeRateLimited,
+    geocode_destination,
+)
+
+
+class GeocodeWorker:
+    """Geocodes trips whose geocode_status is PENDING on a background thread
+
+    Trips are queued with enqueue() right after they are saved. Failed
+    lookups are retried with jittered exponential backoff, up to
+    GEOCODE_MAX_ATTEMPTS attempts, after which the trip is marked FAILED.
+    Upstream calls wait for the shared Nominatim rate limiter.
+
+    Trips left PENDING by a restart are queued again on the first request.
+    Each attempt is claimed in the database first, so with several
+    workers a trip is still only looked up by one of them at a time."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_attempts = 5
+        self.backoff = 5.0
+        self.limit_wait = 5.0
+        self._queue = []  # heap of (due time, trip id)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._resumed = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.max_attempts = app.config["GEOCODE_MAX_ATTEMPTS"]
+        self.backoff = app.config["GEOCODE_RETRY_BACKOFF"]
+        self.limit_wait = app.config["GEOCODE_LIMIT_WAIT"]
+        app.extensions["geocode_worker"] = self
+        app.before_request(self._resume_pending)
+
+    def enqueue(self, trip_id : int, delay : float = 0) -> None:
+        """Queues a trip to be geocoded after delay seconds"""
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + delay, trip_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="geocode-worker", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def _resume_pending(self) -> None:
+        # concurrent first requests must not queue every trip twice
+        with self._cond:
+            if self._resumed:
+                return
+            self._resumed = True
+        for trip_id in get_pending_geocode_trip_ids():
+            self.enqueue(trip_id)
+
+    def _next(self) -> int:
+        # blocks until the earliest queued trip is due
+        with self._cond:
+            while True:
+                if self._queue:
+                    due, trip_id = self._queue[0]
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        return trip_id
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            trip_id = self._next()
+            with self.app.app_context():
+                try:
+                    self.process(trip_id)
+                except Exception:
+                    # failed before the attempt was claimed (or while giving
+                    # up on it), so the trip is still PENDING: try it again
+                    self.app.logger.exception("Geocoding trip %s failed", trip_id)
+                    db.session.rollback()
+                    self.enqueue(trip_id, random.uniform(0, self.backoff))
+                finally:
+                    db.session.remove()
+
+    def process(self, trip_id : int) -> None:
+        """Makes one geocode attempt for a pending trip. Must run in an app context"""
+
+        trip = get_trip(trip_id)
+        if trip is None or trip.geocode_status != GEOCODE_PENDING:
+            return
+
+        destination = trip.destination
+        attempt = trip.geocode_attempts
+        if not claim_trip_geocode(trip_id, attempt):
+            return
+
+        # the attempt is ours now, so every way out must retry, fail or finish the trip
+        try:
+            result = geocode_destination(destination, wait_for_limit=self.limit_wait)
+            if result is None:
+                set_trip_location(trip_id, None, None, GEOCODE_FAILED)
+            else:
+                set_trip_location(trip_id, result.lat, result.lon, GEOCODE_DONE)
+        except (requests.RequestException, GeocodeRateLimited, ValueError, KeyError) as e:
+            self._retry_or_fail(trip_id, attempt + 1, e)
+        except Exception as e:
+            self.app.logger.exception("Geocoding trip %s failed", trip_id)
+            db.session.rollback()
+            self._retry_or_fail(trip_id, attempt + 1, e)
+
+    def _retry_or_fail(self, trip_id : int, attempts : int, error : Exception) -> None:
+        if attempts >= self.max_attempts:
+            self.app.logger.warning("Giving up geocoding trip %s after %s attempts: %s", trip_id, attempts, error)
+            set_trip_location(trip_id, None, None, GEOCODE_FAILED)
+        else:
+            # full jitter, like the outbound client's retries
+            self.enqueue(trip_id, random.uniform(0, self.backoff * (2 ** (attempts - 1))))
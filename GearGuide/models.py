@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, Date, CheckConstraint, UniqueConstraint, event, Boolean, Float, Text
+from sqlalchemy import Column, Integer, ForeignKey, String, Date, DateTime, CheckConstraint, UniqueConstraint, Index, event, Boolean, Float, Text, text
 from sqlalchemy.orm import relationship
 #from GearGuide import db
 from . import db
@@ -13,6 +13,9 @@ class User(db.Model, userMixin):
     password_hash = Column(String(256), nullable=False)
     pfp_filename = Column(String(250), default='profile_default.png')
 
+    hosted_trips = relationship('Trip', back_populates='host', passive_deletes=True)
+    trip_invites = relationship('TripInvite', back_populates='user', passive_deletes=True)
+
 class Trip(db.Model):
     __tablename__ = 'trips'
 
@@ -21,18 +24,32 @@ class Trip(db.Model):
     name = Column(String(100), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    lat = Column(Float, nullable=False)
-    lon = Column(Float, nullable=False)
+    lat = Column(Float, nullable=True)     # None until the destination is geocoded
+    lon = Column(Float, nullable=True)
     destination = Column(String(255), nullable=False)
     activities = Column(Text, nullable=True)
     notes = Column(Text, nullable=True)
 
+    geocode_status = Column(String(20), nullable=False, default='DONE', server_default='DONE')  # PENDING | DONE | FAILED
+    geocode_attempts = Column(Integer, nullable=False, default=0, server_default='0')
+
+    # not loaded unless asked for; see database.load_trip_view
+    host = relationship('User', back_populates='hosted_trips')
+    invites = relationship('TripInvite', back_populates='trip', cascade='all, delete-orphan', passive_deletes=True)
+    pack_items = relationship('PackListItem', back_populates='trip', order_by='PackListItem.id',
+                              cascade='all, delete-orphan', passive_deletes=True)
 
     __table_args__ = (
         CheckConstraint('end_date >= start_date', name='check_start_before_end_date'),
         CheckConstraint('start_date >= CURRENT_DATE', name='check_start_after_current_date'),
         CheckConstraint('end_date >= CURRENT_DATE', name='check_end_after_current_date'),
-        UniqueConstraint('host_id', 'name', name='unique_trip_name_for_host')
+        UniqueConstraint('host_id', 'name', name='unique_trip_name_for_host'),
+        # a host's trips in list order, for keyset pages; see database.get_users_trips_page
+        Index('ix_trips_host_start', 'host_id', 'start_date', 'id'),
+        # only the few trips still waiting on the geocode worker
+        Index('ix_trips_geocode_pending', 'id',
+              sqlite_where=text("geocode_status = 'PENDING'"),
+              postgresql_where=text("geocode_status = 'PENDING'")),
     )
 
 
@@ -43,6 +60,15 @@ class TripInvite(db.Model):
     trip_id = Column(Integer, ForeignKey('trips.id', ondelete='CASCADE'), primary_key=True)
     accepted = Column(Boolean, nullable=False, default=False)
 
+    user = relationship('User', back_populates='trip_invites')
+    trip = relationship('Trip', back_populates='invites')
+
+    __table_args__ = (
+        # "trips I've joined / been invited to" and "members of this trip"
+        Index('ix_trip_invites_user_accepted', 'user_id', 'accepted', 'trip_id'),
+        Index('ix_trip_invites_trip_accepted', 'trip_id', 'accepted', 'user_id'),
+    )
+
 
 class Friendship(db.Model):
     __tablename__ = 'friendships'
@@ -58,6 +84,23 @@ class Friendship(db.Model):
         UniqueConstraint('user1_id', 'user2_id', name='unique_friendship_pairings'),
         CheckConstraint('user1_id < user2_id', name='check_id1_is_lt_id2'),
         CheckConstraint('user1_id != user2_id', name='check_user_ids_not_equal'),
+        # a user's friendships are found from either side of the pair
+        Index('ix_friendships_user1_status', 'user1_id', 'status'),
+        Index('ix_friendships_user2_status', 'user2_id', 'status'),
+    )
+
+class FriendEdge(db.Model):
+    __tablename__ = 'friend_edges'
+
+    # one row per direction of each friendships row, so a user's friends
+    # and requests are a range scan on user_id; kept in step by database.py
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    friend_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    status = Column(String(20), nullable=False)  # PENDING | ACCEPTED | BLOCKED, as on Friendship
+    outgoing = Column(Boolean, nullable=False, default=False)  # user_id sent the request
+
+    __table_args__ = (
+        Index('ix_friend_edges_user_status', 'user_id', 'status', 'outgoing', 'friend_id'),
     )
 
 class PackListItem(db.Model):
@@ -68,10 +111,58 @@ class PackListItem(db.Model):
     name = Column(String(100), nullable=False)
     is_packed = Column(Boolean, default=False)
 
+    trip = relationship('Trip', back_populates='pack_items')
+
     __table_args__ = (
         UniqueConstraint('trip_id', 'name', name='unique_item_name_per_trip'),
     )
 
+class ForecastEntry(db.Model):
+    __tablename__ = 'forecasts'
+
+    # NWS gridpoint the forecast is for
+    office = Column(String(10), primary_key=True)
+    grid_x = Column(Integer, primary_key=True)
+    grid_y = Column(Integer, primary_key=True)
+
+    periods = Column(Text, nullable=False)  # JSON list of simplified periods
+    version = Column(String(40), nullable=False, default='')
+    polygon = Column(Text, nullable=True)   # JSON GeoJSON polygon of the grid cell
+    fetched_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    # validators from the NWS response, for conditional refreshes
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+
+class GeocodeEntry(db.Model):
+    __tablename__ = 'geocodes'
+
+    # destination as typed, run through geocode.normalize_destination()
+    normalized = Column(String(255), primary_key=True)
+
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    display_name = Column(String(512), nullable=True)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # most used labels, for seeding the autocomplete index
+        Index('ix_geocodes_labelled_hits', 'hits',
+              sqlite_where=text('display_name IS NOT NULL'),
+              postgresql_where=text('display_name IS NOT NULL')),
+    )
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limits'
+
+    # token bucket shared by every worker, see ratelimit.TokenBucket
+    name = Column(String(50), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # unix time of the last take
+
 @event.listens_for(Friendship, 'before_insert')
 def normalize_user_ids_for_friendships(mapper, connect, target):
     if target.user1_id > target.user2_id:
@@ -0,0 +1,243 @@
+# shared client for outbound HTTP calls (NWS, Nominatim)
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# statuses worth trying again; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a host after repeated failures
+
+    After failure_threshold consecutive failures the breaker opens and
+    every call fails fast for reset_timeout seconds. The first call after
+    that is let through as a trial: success closes the breaker again,
+    failure re-opens it."""
+
+    def __init__(self, failure_threshold : int, reset_timeout : float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HostStats:
+    """Request counters and recent latencies for one upstream host"""
+
+    def __init__(self, window : int = 500):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed : float, failed : bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(elapsed)
+            if failed:
+                self.failures += 1
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def record_short_circuit(self) -> None:
+        with self._lock:
+            self.short_circuited += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+            }
+
+        def percentile(p):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(p / 100 * len(latencies)))
+            return round(latencies[index] * 1000, 1)
+
+        counts["latency_ms"] = {
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+        }
+        return counts
+
+
+class OutboundClient:
+    """Pooled, retrying HTTP client shared by every outbound call site
+
+    Each upstream host gets its own requests.Session (so connections are
+    kept alive and reused), its own circuit breaker and its own stats.
+    Settings come from the HTTP_* keys in Config."""
+
+    def __init__(self, app=None):
+        self.connect_timeout = 3.05
+        self.read_timeout = 10
+        self.retries = 2
+        self.backoff = 0.25
+        self.pool_maxsize = 10
+        self.breaker_threshold = 5
+        self.breaker_reset = 30
+
+        self._sessions = {}
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.connect_timeout = app.config["HTTP_CONNECT_TIMEOUT"]
+        self.read_timeout = app.config["HTTP_READ_TIMEOUT"]
+        self.retries = app.config["HTTP_RETRIES"]
+        self.backoff = app.config["HTTP_BACKOFF"]
+        self.pool_maxsize = app.config["HTTP_POOL_MAXSIZE"]
+        self.breaker_threshold = app.config["HTTP_BREAKER_THRESHOLD"]
+        self.breaker_reset = app.config["HTTP_BREAKER_RESET"]
+        app.extensions["http_client"] = self
+
+    def _host_state(self, host : str):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                self._stats[host] = HostStats()
+            return session, self._breakers[host], self._stats[host]
+
+    def _sleep_before_retry(self, attempt : int, response=None) -> None:
+        # full jitter: anywhere between 0 and the exponential backoff
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), self.read_timeout))
+
+        time.sleep(delay)
+
+    def get(
+        self,
+        url : str,
+        params : dict | None = None,
+        headers : dict | None = None,
+        timeout : float | tuple | None = None
+    ) -> requests.Response:
+        """Sends a GET request through the pooled session for url's host
+
+        Connection errors, timeouts and retryable statuses are retried up
+        to HTTP_RETRIES times with jittered exponential backoff. Other
+        responses are returned as-is, so callers still check status_code.
+        Any other requests exception is raised straight away and counts
+        as a failure for the breaker.
+
+        Raises CircuitOpenError when the host's breaker is open and
+        requests.RequestException when every attempt failed."""
+
+        host = urlsplit(url).netloc
+        session, breaker, stats = self._host_state(host)
+
+        if not breaker.allow():
+            stats.record_short_circuit()
+            raise CircuitOpenError(f"Circuit open for {host}, not calling upstream")
+
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+
+        attempt = 0
+        while True:
+            response = None
+            start = time.perf_counter()
+            try:
+                response = session.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                stats.record(time.perf_counter() - start, failed=True)
+                if attempt >= self.retries:
+                    breaker.record_failure()
+                    raise
+            except requests.RequestException:
+                # not worth retrying (bad URL, too many redirects, a broken
+                # body), but still a failed call, and it ends a half-open trial
+                stats.record(time.perf_counter() - start, failed=True)
+                breaker.record_failure()
+                raise
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                stats.record(time.perf_counter() - start, failed=failed)
+                if not failed:
+                    breaker.record_success()
+                    return response
+                if attempt >= self.retries:
+                    breaker.record_failure()
+                    return response
+
+            stats.record_retry()
+            self._sleep_before_retry(attempt, response)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Per-host request counts, latency percentiles, breaker state and pool size"""
+        with self._lock:
+            hosts = list(self._stats.keys())
+
+        report = {}
+        for host in hosts:
+            report[host] = self._stats[host].snapshot()
+            report[host]["circuit"] = self._breakers[host].state
+            report[host]["pool_maxsize"] = self.pool_maxsize
+        return report
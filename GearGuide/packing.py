@@ -0,0 +1,196 @@
+# packing list helpers: weather-based suggestions for a trip
+from datetime import date, datetime, timedelta
+from typing import List
+
+from . import weather_cache
+
+RAIN_WORDS = ("rain", "shower", "drizzle")
+SNOW_WORDS = ("snow", "sleet", "flurries")
+
+# temperatures in °F at or past which we suggest cold / hot weather gear
+VERY_COLD_F = 40
+VERY_HOT_F = 85
+
+WET_WEATHER_ITEMS = [
+    "Rain jacket",
+    "Waterproof boots or shoes",
+    "Extra warm socks",
+    "Dry bag or pack liner",
+]
+
+COLD_WEATHER_ITEMS = [
+    "Insulated jacket",
+    "Gloves",
+    "Beanie or warm hat",
+    "Thermal base layers",
+]
+
+HOT_WEATHER_ITEMS = [
+    "Sun hat",
+    "Sunscreen",
+    "Lightweight, breathable clothing",
+    "Electrolyte packets",
+]
+
+# every new trip's packing list starts with these...
+BASE_ITEMS = [
+    "Water bottle",
+    "Snacks",
+    "Weather-appropriate clothing",
+    "First aid kit",
+]
+
+# ...plus the items for each of its activities
+ACTIVITY_ITEMS = {
+    "Hiking": [
+        "Hiking boots",
+        "Daypack",
+        "Trail map or GPS",
+    ],
+    "Camping": [
+        "Tent",
+        "Sleeping bag",
+        "Sleeping pad",
+        "Headlamp or flashlight",
+    ],
+    "Fishing": [
+        "Fishing rod",
+        "Tackle box",
+        "Fishing license",
+    ],
+    "Kayaking": [
+        "Life jacket",
+        "Dry bag",
+        "Water shoes",
+    ],
+    "Canoeing": [
+        "Life jacket",
+        "Dry bag",
+        "Water shoes",
+    ],
+    "Biking": [
+        "Bike",
+        "Helmet",
+        "Bike repair kit",
+    ],
+    "Swimming": [
+        "Swimsuit",
+        "Towel",
+        "Sunscreen",
+    ],
+    "Climbing": [
+        "Climbing shoes",
+        "Harness",
+        "Chalk bag",
+        "Helmet",
+    ],
+}
+
+
+def period_date(
+    period : dict
+) -> date | None:
+    """Returns the UTC calendar date a forecast period starts on"""
+
+    start = period.get("startTime")
+    if not start:
+        return None
+
+    try:
+        start = datetime.fromisoformat(start)
+    except ValueError:
+        return None
+
+    if start.utcoffset() is not None:
+        start = start - start.utcoffset()
+    return start.date()
+
+
+def trip_dates(
+    start_date : date,
+    end_date : date
+) -> List[date]:
+    """Every date from start_date through end_date, inclusive"""
+
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def group_periods_by_date(
+    periods : list[dict]
+) -> dict[date, list[dict]]:
+    """Groups forecast periods by the date they start on, keeping order"""
+
+    grouped = {}
+    for p in periods:
+        key = period_date(p)
+        if key is not None:
+            grouped.setdefault(key, []).append(p)
+    return grouped
+
+
+def seed_items(
+    activities : list[str]
+) -> set[str]:
+    """The packing list a new trip starts with, without duplicates"""
+
+    items = set(BASE_ITEMS)
+    for activity in activities:
+        items.update(ACTIVITY_ITEMS.get(activity, []))
+    return items
+
+
+def suggest_items(
+    periods : list[dict],
+    start_date : date,
+    end_date : date
+) -> List[str]:
+    """Turns forecast periods into weather-based packing suggestions
+
+    Only periods that fall on the trip's dates are considered. Can return
+    an empty list if the forecast doesn't call for anything special."""
+
+    will_rain = False
+    will_snow = False
+    very_cold = False
+    very_hot = False
+
+    by_date = group_periods_by_date(periods)
+    for day in trip_dates(start_date, end_date):
+        for p in by_date.get(day, []):
+            short = (p.get("shortForecast") or "").lower()
+            temp = p.get("temperature")
+
+            if any(word in short for word in RAIN_WORDS):
+                will_rain = True
+            if any(word in short for word in SNOW_WORDS):
+                will_snow = True
+            if isinstance(temp, (int, float)):
+                if temp <= VERY_COLD_F:
+                    very_cold = True
+                if temp >= VERY_HOT_F:
+                    very_hot = True
+
+    suggestions = []
+    if will_rain or will_snow:
+        suggestions += WET_WEATHER_ITEMS
+    if very_cold:
+        suggestions += COLD_WEATHER_ITEMS
+    if very_hot:
+        suggestions += HOT_WEATHER_ITEMS
+    return suggestions
+
+
+def get_trip_suggestions(
+    trip,
+    forecast
+) -> List[str]:
+    """Weather-based suggestions for a trip, cached per trip and forecast version
+
+    forecast is the Forecast returned by weather_route.get_forecast()"""
+
+    key = (trip.id, trip.start_date, trip.end_date, forecast.version)
+    suggestions = weather_cache.suggestions.get(key)
+    if suggestions is None:
+        suggestions = suggest_items(forecast.periods, trip.start_date, trip.end_date)
+        weather_cache.suggestions.set(key, suggestions, weather_cache.suggestions_ttl)
+    return suggestions
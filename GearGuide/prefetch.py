@@ -0,0 +1,162 @@
+# background forecast prefetching for upcoming trips
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+import requests
+from flask import current_app
+
+from . import db
+from .models import Trip
+from .database import get_forecast_entry
+from .weather_route import NWSError, get_cached_gridpoint, get_gridpoint, refresh_forecast
+
+
+class RateBudget:
+    """Caps how many upstream requests one prefetch run may make
+
+    Requests are also spaced at least spacing seconds apart so a run
+    never bursts against NWS."""
+
+    def __init__(self, max_requests : int, spacing : float):
+        self.max_requests = max_requests
+        self.spacing = spacing
+        self.used = 0
+        self._last = None
+
+    def spend(self) -> bool:
+        """Waits for the next slot and returns True, or False if the budget is used up"""
+
+        if self.used >= self.max_requests:
+            return False
+
+        if self._last is not None:
+            wait = self._last + self.spacing - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        self._last = time.monotonic()
+        self.used += 1
+        return True
+
+
+def get_upcoming_trips(
+    horizon_days : int
+) -> List[Trip]:
+    """Trips that overlap the next horizon_days days
+
+    Can return an empty list if no trips are coming up"""
+
+    today = date.today()
+
+    trips = (
+        db.session.query(Trip)
+        .filter(Trip.start_date <= today + timedelta(days=horizon_days))
+        .filter(Trip.end_date >= today)
+        .filter(Trip.lat.isnot(None), Trip.lon.isnot(None))
+        .all()
+    )
+
+    return trips
+
+
+def prefetch_upcoming_forecasts() -> dict:
+    """Warms the forecast cache for every upcoming trip
+
+    Trips are deduplicated by gridpoint, and only forecasts that are
+    missing or about to expire are fetched. Must run in an app context.
+
+    Returns counts describing what the run did"""
+
+    config = current_app.config
+    budget = RateBudget(config["WEATHER_PREFETCH_BUDGET"], config["WEATHER_PREFETCH_SPACING"])
+    margin = config["WEATHER_PREFETCH_MARGIN"]
+
+    trips = get_upcoming_trips(config["WEATHER_FORECAST_HORIZON_DAYS"])
+    summary = {"trips": len(trips), "gridpoints": 0, "refreshed": 0, "fresh": 0, "skipped": 0, "failed": 0}
+
+    # 1) Resolve each trip to its gridpoint, spending budget on unknown points only
+    gridpoints = set()
+    for trip in trips:
+        cached = get_cached_gridpoint(trip.lat, trip.lon)
+        if cached is None and not budget.spend():
+            summary["skipped"] += 1
+            continue
+
+        try:
+            gridpoints.add(cached or get_gridpoint(trip.lat, trip.lon))
+        except (NWSError, KeyError, requests.RequestException) as e:
+            current_app.logger.warning("Prefetch points lookup failed for trip %s: %s", trip.id, e)
+            summary["failed"] += 1
+
+    summary["gridpoints"] = len(gridpoints)
+
+    # 2) Refresh stored forecasts that are missing or close to expiring
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for gridpoint in gridpoints:
+        entry = get_forecast_entry(*gridpoint)
+        if entry is not None and (entry.expires_at - now).total_seconds() > margin:
+            summary["fresh"] += 1
+            continue
+
+        if not budget.spend():
+            summary["skipped"] += 1
+            continue
+
+        try:
+            refresh_forecast(gridpoint)
+            summary["refreshed"] += 1
+        except (NWSError, KeyError, requests.RequestException) as e:
+            current_app.logger.warning("Prefetch failed for %s: %s", gridpoint, e)
+            summary["failed"] += 1
+
+    return summary
+
+
+class Prefetcher:
+    """Runs prefetch_upcoming_forecasts() on a background thread
+
+    Enabled by setting WEATHER_PREFETCH_EVERY to a number of seconds. The
+    thread starts with the first request rather than in create_app() so
+    CLI commands like `flask db upgrade` don't start it. Forecasts land
+    in the shared forecasts table, so with several workers it is enough
+    to run `flask weather prefetch` from cron instead."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.extensions["weather_prefetcher"] = self
+        if app.config["WEATHER_PREFETCH_EVERY"] > 0:
+            self.app = app
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        interval = self.app.config["WEATHER_PREFETCH_EVERY"]
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    summary = prefetch_upcoming_forecasts()
+                    self.app.logger.info("Weather prefetch: %s", summary)
+                except Exception:
+                    self.app.logger.exception("Weather prefetch run failed")
+                finally:
+                    db.session.remove()
+            self._stop.wait(interval)
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,57 @@
+# rate limits shared by every worker, stored in the database
+import time
+
+from .database import get_rate_limit_bucket, create_rate_limit_bucket, swap_rate_limit_tokens
+
+# compare-and-swap attempts before giving up on a contended bucket
+MAX_ATTEMPTS = 5
+
+
+class TokenBucket:
+    """Token bucket kept in the rate_limits table
+
+    Refills at rate tokens per second up to burst. Every worker process
+    reads the same row and takes a token with a compare-and-swap UPDATE,
+    so the limit holds across the whole deployment, not per process."""
+
+    def __init__(self, name : str, rate : float, burst : float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available right now, without waiting"""
+
+        for _ in range(MAX_ATTEMPTS):
+            now = time.time()
+            bucket = get_rate_limit_bucket(self.name)
+
+            if bucket is None:
+                if create_rate_limit_bucket(self.name, self.burst - 1, now):
+                    return True
+                continue
+
+            tokens, updated_at = bucket
+            tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+            if tokens < 1:
+                return False
+
+            if swap_rate_limit_tokens(self.name, updated_at, tokens - 1, now):
+                return True
+
+        return False
+
+    def acquire(self, timeout : float) -> bool:
+        """Waits up to timeout seconds for a token
+
+        Returns False if none became available in time"""
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.try_acquire():
+                return True
+
+            wait = min(1 / self.rate, deadline - time.monotonic())
+            if wait <= 0:
+                return False
+            time.sleep(wait)
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template,redirect, url_for, request, flash
+from flask import Blueprint, render_template,redirect, url_for, request, flash, jsonify, current_app, get_template_attribute
 
 from . import db
 from .models import User, Trip, PackListItem
@@ -11,13 +11,18 @@ from .database import (
     send_friend_request,
     accept_friend_request,
     remove_friend,
-    get_users_friends,
-    get_users_trips,
+    get_hosted_trips_page,
+    get_users_trips_page,
+    get_pending_trip_invites_page,
+    get_users_friends_page,
+    get_pending_friend_requests_page,
+    get_trip,
+    load_trip_view,
+    is_trip_member,
     invite_user_to_trip,
-    add_pack_item,
+    add_pack_items,
     get_pack_list,
-    update_pack_item_status,
-    remove_pack_item,
+    sync_pack_list,
 )
 from werkzeug.security import generate_password_hash, check_password_hash   
 from flask_login import login_user, logout_user, current_user, login_required
@@ -25,6 +30,10 @@ import requests
 from datetime import datetime  
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_, and_
+from .weather_route import NWSError, get_forecast, get_cached_forecast
+from .geocode import GEOCODE_PENDING, GEOCODE_DONE, GEOCODE_FAILED, GeocodeRateLimited, cached_geocode, geocode_destination
+from .packing import get_trip_suggestions, seed_items
+from .social_graph import people_you_may_know
 #from GearGuide.database import add_user, get_user_by_username
 
 
@@ -43,7 +52,7 @@ def index():
 @login_required
 def homePage(): 
     
-    recent_trips = get_users_trips(current_user.id)
+    recent_trips = get_hosted_trips_page(current_user.id, limit=current_app.config["PAGE_SIZE"]).items
 
     return render_template("home.html", recent_trips=recent_trips)
 
@@ -77,35 +86,11 @@ def myTripsPage():
 
         return redirect(url_for("main.trips"))
 
-    # Trips I host
-    host_trips = Trip.query.filter_by(host_id=current_user.id).all()
-
-    # Trips I've accepted an invite to
-    shared_trips = (
-        db.session.query(Trip)
-        .join(TripInvite, TripInvite.trip_id == Trip.id)
-        .filter(
-            TripInvite.user_id == current_user.id,
-            TripInvite.accepted == True
-        )
-        .all()
-    )
-
-    # Combine & dedupe
-    trips_dict = {t.id: t for t in host_trips + shared_trips}
-    all_trips = list(trips_dict.values())
+    # Trips I host or have accepted an invite to, one page at a time
+    all_trips = _list_page(get_users_trips_page, "trips_after")
 
     # Pending invites *to* me (not accepted yet)
-    pending_invites = (
-        db.session.query(TripInvite, Trip, User)
-        .join(Trip, Trip.id == TripInvite.trip_id)
-        .join(User, User.id == Trip.host_id)
-        .filter(
-            TripInvite.user_id == current_user.id,
-            TripInvite.accepted == False
-        )
-        .all()
-    )
+    pending_invites = _list_page(get_pending_trip_invites_page, "invites_after")
 
     return render_template(
         "trips.html",
@@ -284,51 +269,116 @@ def myFriendsPage():
 
     # -------- GET: build lists --------
 
-    # Accepted friends (you already have a helper for this)
-    friends = get_users_friends(current_user.id)
-
-    # Pending requests *sent TO* the current user.
-    # We want the user who INITIATED the request (the sender),
-    # but only where current_user is part of the pair and NOT the initiator.
-    pending_requests = (
-        db.session.query(User)
-        .join(Friendship, User.id == Friendship.initiator_id)
-        .filter(Friendship.status == "PENDING")
-        .filter(
-            (Friendship.user1_id == current_user.id) |
-            (Friendship.user2_id == current_user.id)
-        )
-        .filter(Friendship.initiator_id != current_user.id)
-        .all()
-    )
+    # Accepted friends, one page at a time
+    friends = _list_page(get_users_friends_page, "friends_after")
+
+    # Pending requests *sent TO* the current user (we show the sender)
+    pending_requests = _list_page(get_pending_friend_requests_page, "requests_after")
+
+    # Friends of friends and people from shared trips
+    suggestions = people_you_may_know(current_user.id)
 
     return render_template(
         "friends.html",
         friends=friends,
         pending_requests=pending_requests,
+        suggestions=suggestions,
     )
 
+#______________________________________________
+# Paged lists: trips, invites, friends and requests, by keyset cursor
+
+
+def _list_page(fetch, cursor_arg):
+    # first page unless ?<cursor_arg>= holds a cursor; a bad one starts over
+    limit = current_app.config["PAGE_SIZE"]
+    try:
+        return fetch(current_user.id, request.args.get(cursor_arg) or None, limit)
+    except ValueError:
+        return fetch(current_user.id, None, limit)
+
+
+def _json_page(fetch, row_macro, serialize):
+    # one page as JSON; "html" is the rows rendered the way the page renders them
+    config = current_app.config
+    limit = request.args.get("limit", config["PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, config["MAX_PAGE_SIZE"]))
+
+    try:
+        page = fetch(current_user.id, request.args.get("after") or None, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    row = get_template_attribute("list-rows.html", row_macro)
+    return jsonify(
+        {
+            "items": [serialize(item) for item in page.items],
+            "html": "".join(str(row(item)) for item in page.items),
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+def _trip_json(trip):
+    return {
+        "id": trip.id,
+        "name": trip.name,
+        "destination": trip.destination,
+        "start_date": trip.start_date.isoformat(),
+        "end_date": trip.end_date.isoformat(),
+    }
+
+
+def _user_json(user):
+    return {"id": user.id, "username": user.username}
+
+
+@bp.route("/trips/list", endpoint="trips_page")
+@login_required
+def tripsPage():
+    """Trips the user hosts or has joined, ?after=<next_cursor>&limit=N"""
+    return _json_page(get_users_trips_page, "trip_row", _trip_json)
+
+
+@bp.route("/trips/invites", endpoint="trip_invites_page")
+@login_required
+def tripInvitesPage():
+    """Trip invites waiting on the user, ?after=<next_cursor>&limit=N"""
+    return _json_page(
+        get_pending_trip_invites_page,
+        "invite_row",
+        lambda row: {"trip": _trip_json(row[1]), "host": _user_json(row[2])},
+    )
+
+
+@bp.route("/friends/list", endpoint="friends_page")
+@login_required
+def friendsPage():
+    """The user's friends, ?after=<next_cursor>&limit=N"""
+    return _json_page(get_users_friends_page, "friend_row", _user_json)
+
+
+@bp.route("/friends/requests", endpoint="friend_requests_page")
+@login_required
+def friendRequestsPage():
+    """Friend requests waiting on the user, ?after=<next_cursor>&limit=N"""
+    return _json_page(get_pending_friend_requests_page, "request_row", _user_json)
+
 @bp.route("/trips/<int:trip_id>", methods=["GET", "POST"], endpoint="trip_detail")
 @login_required
 def viewTripPage(trip_id):
-    # 1) Fetch trip
-    trip = Trip.query.filter_by(id=trip_id).first()
-    if not trip:
+    # 1) Fetch the trip with its members and packing list in a few batched queries
+    view = load_trip_view(trip_id, current_user.id)
+    if view is None:
         flash("Trip not found.", "danger")
         return redirect(url_for("main.trips"))
 
     # 2) Permission check: host OR accepted invitee
-    is_host = (trip.host_id == current_user.id)
-
-    if not is_host:
-        invite = TripInvite.query.filter_by(
-            user_id=current_user.id,
-            trip_id=trip.id,
-            accepted=True
-        ).first()
-        if invite is None:
-            flash("You do not have permission to view this trip.", "danger")
-            return redirect(url_for("main.trips"))
+    trip = view.trip
+    is_host = view.is_host
+    if not view.is_member:
+        flash("You do not have permission to view this trip.", "danger")
+        return redirect(url_for("main.trips"))
 
     if request.method == "POST":
         form_type = request.form.get("form_type", "").strip()
@@ -343,29 +393,33 @@ def viewTripPage(trip_id):
 
         # --- Packing list update (any member can do this) ---
         if form_type == "packlist":
-            # 1) Update packed / not packed for existing items
-            pack_items = get_pack_list(trip.id)
-            for item in pack_items:
+            # Send only what changed, as one transaction
+            packed, unpacked = [], []
+            for item in view.pack_items:
                 is_packed = request.form.get(f"packed_{item.id}") is not None
-                update_pack_item_status(item.id, is_packed)
+                if is_packed and not item.is_packed:
+                    packed.append(item.id)
+                elif item.is_packed and not is_packed:
+                    unpacked.append(item.id)
 
-            # 2) Remove an item if trash button was clicked
+            # Remove an item if trash button was clicked
+            removed = []
             remove_item_id = request.form.get("remove_item_id", "").strip()
             if remove_item_id:
                 try:
-                    item_id = int(remove_item_id)
-                    remove_pack_item(item_id)
+                    removed.append(int(remove_item_id))
                 except ValueError:
                     pass  # ignore bad id
 
-            # 3) Add custom item if provided
-            new_item_name = request.form.get("new_item_name", "").strip()
-            if new_item_name:
-                success = add_pack_item(trip.id, new_item_name)
-                if not success:
-                    flash("Could not add item (maybe it already exists for this trip).", "warning")
-                else:
-                    flash("Packing list updated.", "success")
+            # Add custom item if provided
+            new_item_name = request.form.get("new_item_name", "").strip()[:100]
+            added = [new_item_name] if new_item_name else []
+
+            changes = sync_pack_list(trip.id, packed=packed, unpacked=unpacked, added=added, removed=removed)
+            if changes is None:
+                flash("Could not update the packing list. Please try again.", "danger")
+            elif added and not changes["added"]:
+                flash("Could not add item (maybe it already exists for this trip).", "warning")
             else:
                 flash("Packing list updated.", "success")
 
@@ -384,6 +438,8 @@ def viewTripPage(trip_id):
                     PackListItem.trip_id == trip.id
                 ).delete(synchronize_session=False)
 
+                # those rows are gone; don't let the delete cascade revisit them
+                db.session.expire(trip, ["invites", "pack_items"])
                 db.session.delete(trip)
                 db.session.commit()
                 flash("Trip deleted.", "success")
@@ -488,56 +544,98 @@ def viewTripPage(trip_id):
 
             return redirect(url_for("main.trip_detail", trip_id=trip.id))
 
-    # 3) Build members list: host + accepted invitees
-    host_user = User.query.get(trip.host_id)
-
-    accepted_members = (
-        db.session.query(User)
-        .join(TripInvite, TripInvite.user_id == User.id)
-        .filter(
-            TripInvite.trip_id == trip.id,
-            TripInvite.accepted == True
-        )
-        .all()
-    )
-
-    # Ensure host is always first and not duplicated
-    members_dict = {host_user.id: host_user}
-    for m in accepted_members:
-        members_dict[m.id] = m
-    members = list(members_dict.values())
-
     # Activities as a list
     activities = trip.activities.split(",") if trip.activities else []
 
-    # 4) Packing list items for this trip
-    pack_items = get_pack_list(trip.id)
-
-    # 5) Friends you can invite (host only; exclude existing members)
-    friends_for_invite = []
-    if is_host:
-        all_friends = get_users_friends(current_user.id)
-        existing_member_ids = set(u.id for u in members)
-        friends_for_invite = [f for f in all_friends if f.id not in existing_member_ids]
-
-    # 6) Pending invites to this trip (for "Pending" label in UI)
-    pending_invites_to_this_trip = set()
-    if is_host:
-        pending_invites = TripInvite.query.filter_by(
-            trip_id=trip.id,
-            accepted=False
-        ).all()
-        pending_invites_to_this_trip = {inv.user_id for inv in pending_invites}
+    # 3) Weather-based packing suggestions, if the forecast is already cached.
+    #    Otherwise weather.js asks for them once the forecast has loaded.
+    weather_suggestions = None
+    forecast = get_cached_forecast(trip.lat, trip.lon) if trip.lat is not None else None
+    if forecast is not None:
+        weather_suggestions = get_trip_suggestions(trip, forecast)
 
     return render_template(
         "trip-detail.html",
         trip=trip,
         activities=activities,
-        members=members,
+        members=view.members,
         is_host=is_host,
-        pack_items=pack_items,
-        friends_for_invite=friends_for_invite,
-        pending_invites_to_this_trip=pending_invites_to_this_trip,
+        pack_items=view.pack_items,
+        friends_for_invite=view.friends_for_invite,
+        pending_invites_to_this_trip=view.pending_invite_ids,
+        weather_suggestions=weather_suggestions,
+    )
+
+@bp.route("/trips/<int:trip_id>/suggestions", methods=["GET"], endpoint="trip_suggestions")
+@login_required
+def tripSuggestions(trip_id):
+    """Weather-based packing suggestions for a trip as JSON"""
+
+    trip = get_trip(trip_id)
+    if trip is None or not is_trip_member(current_user.id, trip):
+        return jsonify({"error": "Trip not found"}), 404
+
+    if trip.lat is None or trip.lon is None:
+        return jsonify({"trip_id": trip.id, "geocode_status": trip.geocode_status, "suggestions": []})
+
+    try:
+        forecast = get_forecast(trip.lat, trip.lon)
+    except NWSError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except KeyError:
+        return jsonify({"error": "Unexpected NWS response format"}), 500
+    except requests.RequestException as e:
+        return jsonify({"error": f"Error contacting NWS API: {e}"}), 502
+
+    return jsonify(
+        {
+            "trip_id": trip.id,
+            "forecast_version": forecast.version,
+            "suggestions": get_trip_suggestions(trip, forecast),
+        }
+    )
+
+
+
+@bp.route("/trips/<int:trip_id>/pack-list", methods=["PATCH"], endpoint="pack_list_sync")
+@login_required
+def packListSync(trip_id):
+    """
+    Applies a pack list diff in one transaction and returns the new list.
+
+    Body: {"packed": [item ids], "unpacked": [item ids],
+           "added": [names], "removed": [item ids]}, all optional.
+    """
+
+    trip = get_trip(trip_id)
+    if trip is None or not is_trip_member(current_user.id, trip):
+        return jsonify({"error": "Trip not found"}), 404
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    diff = {}
+    for key, kind in (("packed", int), ("unpacked", int), ("added", str), ("removed", int)):
+        values = body.get(key, [])
+        if not isinstance(values, list) or not all(isinstance(v, kind) and not isinstance(v, bool) for v in values):
+            return jsonify({"error": f"{key} must be a list of {'names' if kind is str else 'item ids'}"}), 400
+        diff[key] = values
+    diff["added"] = [name.strip()[:100] for name in diff["added"] if name.strip()]
+
+    changes = sync_pack_list(trip.id, **diff)
+    if changes is None:
+        return jsonify({"error": "Could not update the packing list"}), 409
+
+    return jsonify(
+        {
+            "trip_id": trip.id,
+            "changes": changes,
+            "items": [
+                {"id": item.id, "name": item.name, "is_packed": bool(item.is_packed)}
+                for item in get_pack_list(trip.id)
+            ],
+        }
     )
 
 
@@ -667,24 +765,31 @@ def createTripSubmit():
         flash("Invalid date format.", "danger")
         return redirect(url_for("main.create_trip"))
 
-    # Geocode destination
+    # Geocode destination (cached, so popular destinations skip Nominatim).
+    # In GEOCODE_ASYNC mode, or when Nominatim can't be reached, the trip is
+    # saved as pending and the geocode worker fills in the coordinates.
+    lat = None
+    lon = None
+    geocode_status = GEOCODE_PENDING
     try:
-        nominatum_url = f"https://nominatim.openstreetmap.org/search?q={destination}&limit=1&format=json"
-        res = requests.get(nominatum_url, headers={"User-Agent": "GearGuideApp"})
-        data = res.json()
-
-        if isinstance(data, list) and len(data) > 0:
-            lat = float(data[0]["lat"])
-            lon = float(data[0]["lon"])
+        if current_app.config["GEOCODE_ASYNC"]:
+            result = cached_geocode(destination)
         else:
-            lat = None
-            lon = None
-            flash("Could not geocode the destination.", "warning")
-        
+            result = geocode_destination(destination, wait_for_limit=current_app.config["GEOCODE_LIMIT_WAIT"])
+            if result is None:
+                geocode_status = GEOCODE_FAILED
+                flash("Could not geocode the destination.", "warning")
+
+        if result is not None:
+            lat = result.lat
+            lon = result.lon
+            geocode_status = GEOCODE_DONE
+
+    except GeocodeRateLimited:
+        # Nominatim's shared rate limit is used up; the worker waits its turn
+        current_app.logger.info("No Nominatim capacity for %r, geocoding in the background", destination)
     except Exception as e:
-        lat = None
-        lon = None
-        flash("Error occurred during geocoding. {e}", "warning")
+        current_app.logger.warning("Geocoding %r failed, retrying in the background: %s", destination, e)
 
     trip = Trip(
         host_id = current_user.id,
@@ -692,6 +797,7 @@ def createTripSubmit():
         destination = destination,
         lat = lat,
         lon = lon,
+        geocode_status = geocode_status,
         start_date = start_date,
         end_date = end_date,
         activities = ",".join(activities),
@@ -699,71 +805,16 @@ def createTripSubmit():
     )
 
     try:
+        # The trip and its seeded packing list are saved together, so a
+        # failure never leaves a trip with half a list
         db.session.add(trip)
+        db.session.flush()  # assigns trip.id
+        trip_id = trip.id
+        add_pack_items(trip_id, sorted(seed_items(activities)), commit=False)
         db.session.commit()
 
-        # ------- NEW: seed packing list items based on activities -------
-        base_items = [
-            "Water bottle",
-            "Snacks",
-            "Weather-appropriate clothing",
-            "First aid kit",
-        ]
-
-        activity_items = {
-            "Hiking": [
-                "Hiking boots",
-                "Daypack",
-                "Trail map or GPS",
-            ],
-            "Camping": [
-                "Tent",
-                "Sleeping bag",
-                "Sleeping pad",
-                "Headlamp or flashlight",
-            ],
-            "Fishing": [
-                "Fishing rod",
-                "Tackle box",
-                "Fishing license",
-            ],
-            "Kayaking": [
-                "Life jacket",
-                "Dry bag",
-                "Water shoes",
-            ],
-            "Canoeing": [
-                "Life jacket",
-                "Dry bag",
-                "Water shoes",
-            ],
-            "Biking": [
-                "Bike",
-                "Helmet",
-                "Bike repair kit",
-            ],
-            "Swimming": [
-                "Swimsuit",
-                "Towel",
-                "Sunscreen",
-            ],
-            "Climbing": [
-                "Climbing shoes",
-                "Harness",
-                "Chalk bag",
-                "Helmet",
-            ],
-        }
-
-        # Build list without duplicates
-        items_to_add = set(base_items)
-        for act in activities:
-            items_to_add.update(activity_items.get(act, []))
-
-        # Save items to DB
-        for item_name in items_to_add:
-            add_pack_item(trip.id, item_name)
-        # ---------------------------------------------------------------
+        if geocode_status == GEOCODE_PENDING:
+            current_app.extensions["geocode_worker"].enqueue(trip_id)
 
         flash("Trip created successfully!", "success")
         return redirect(url_for("main.trips"))
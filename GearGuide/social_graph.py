@@ -0,0 +1,292 @@
+# "people you may know": friend-of-friend suggestions from an in-memory graph
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+# a shared trip says more than one mutual friend does
+SHARED_TRIP_WEIGHT = 2
+
+# session.info key for graph changes waiting on a commit
+CHANGES_KEY = "social_graph_changes"
+
+
+def _add(adjacency : dict, key : int, value : int) -> None:
+    # inserts value into the sorted id array at adjacency[key]
+    ids = adjacency.get(key)
+    if ids is None:
+        adjacency[key] = array("i", (value,))
+        return
+    i = bisect_left(ids, value)
+    if i == len(ids) or ids[i] != value:
+        ids.insert(i, value)
+
+
+def _discard(adjacency : dict, key : int, value : int) -> None:
+    ids = adjacency.get(key)
+    if ids is None:
+        return
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+def _sorted_arrays(lists : dict) -> dict:
+    return {key: array("i", sorted(set(ids))) for key, ids in lists.items()}
+
+
+class SocialGraph:
+    """Friendships and trip co-membership held in memory as sorted id arrays
+
+    Built from the friendships, trips and trip_invites tables on first use.
+    After that every committed change to a Friendship, Trip or TripInvite
+    is applied to it incrementally, so it stays current without being
+    rebuilt. Writes made by other worker processes only show up at the
+    next rebuild, every SOCIAL_GRAPH_TTL seconds.
+
+    Pending and blocked pairs are never suggested."""
+
+    def __init__(self, app=None):
+        self.ttl = 300.0
+        self.max_scan = 30000
+        self.builds = 0
+        self.updates = 0
+        self._friends = {}   # user id -> array of accepted friend ids
+        self._hidden = {}    # user id -> set of pending or blocked user ids
+        self._trips = {}     # user id -> array of trip ids they are on
+        self._members = {}   # trip id -> array of host and accepted guest ids
+        self._built_at = None
+        self._replay = None  # changes committed while a rebuild is running
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config["SOCIAL_GRAPH_TTL"]
+        self.max_scan = app.config["SOCIAL_GRAPH_MAX_SCAN"]
+        app.extensions["social_graph"] = self
+        if not self._listening:
+            self._listen()
+            self._listening = True
+
+    # ---- keeping up with writes ----
+
+    def _listen(self) -> None:
+        from .models import Friendship, Trip, TripInvite
+
+        def record(target, change):
+            session = object_session(target)
+            if session is not None:
+                session.info.setdefault(CHANGES_KEY, []).append(change)
+
+        def pair_saved(mapper, connection, target):
+            record(target, ("pair", target.user1_id, target.user2_id, target.status))
+
+        def pair_deleted(mapper, connection, target):
+            record(target, ("pair", target.user1_id, target.user2_id, None))
+
+        def trip_saved(mapper, connection, target):
+            record(target, ("member", target.id, target.host_id, True))
+
+        def trip_deleted(mapper, connection, target):
+            record(target, ("trip", target.id))
+
+        def invite_saved(mapper, connection, target):
+            record(target, ("member", target.trip_id, target.user_id, bool(target.accepted)))
+
+        def invite_deleted(mapper, connection, target):
+            record(target, ("member", target.trip_id, target.user_id, False))
+
+        for kind in ("after_insert", "after_update"):
+            event.listen(Friendship, kind, pair_saved)
+            event.listen(TripInvite, kind, invite_saved)
+        event.listen(Trip, "after_insert", trip_saved)
+        event.listen(Friendship, "after_delete", pair_deleted)
+        event.listen(TripInvite, "after_delete", invite_deleted)
+        event.listen(Trip, "after_delete", trip_deleted)
+
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def _after_commit(self, session) -> None:
+        changes = session.info.pop(CHANGES_KEY, None)
+        if changes:
+            self.apply(changes)
+
+    def _after_rollback(self, session) -> None:
+        session.info.pop(CHANGES_KEY, None)
+
+    def apply(self, changes : list[tuple]) -> None:
+        """Applies committed changes; a no-op until the graph is first built"""
+
+        with self._lock:
+            if self._replay is not None:
+                self._replay.extend(changes)
+            if self._built_at is None:
+                return
+            for change in changes:
+                self._apply(change)
+            self.updates += len(changes)
+
+    def _apply(self, change : tuple) -> None:
+        # each change sets state rather than toggling it, so replaying one is harmless
+        if change[0] == "pair":
+            _, a, b, status = change
+            _discard(self._friends, a, b)
+            _discard(self._friends, b, a)
+            self._hidden.get(a, set()).discard(b)
+            self._hidden.get(b, set()).discard(a)
+            if status == "ACCEPTED":
+                _add(self._friends, a, b)
+                _add(self._friends, b, a)
+            elif status is not None:
+                self._hidden.setdefault(a, set()).add(b)
+                self._hidden.setdefault(b, set()).add(a)
+
+        elif change[0] == "member":
+            _, trip_id, user_id, member = change
+            if member:
+                _add(self._members, trip_id, user_id)
+                _add(self._trips, user_id, trip_id)
+            else:
+                _discard(self._members, trip_id, user_id)
+                _discard(self._trips, user_id, trip_id)
+
+        elif change[0] == "trip":
+            for user_id in self._members.pop(change[1], ()):
+                _discard(self._trips, user_id, change[1])
+
+    # ---- building ----
+
+    def _fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < self.ttl
+
+    def _ensure_built(self) -> None:
+        if self._fresh():
+            return
+
+        with self._build_lock:
+            if self._fresh():
+                return
+
+            from .database import get_friendship_pairs, get_trip_memberships
+
+            with self._lock:
+                self._replay = []
+
+            try:
+                friends, hidden, trips, members = {}, {}, {}, {}
+                for a, b, status in get_friendship_pairs():
+                    if status == "ACCEPTED":
+                        friends.setdefault(a, []).append(b)
+                        friends.setdefault(b, []).append(a)
+                    else:
+                        hidden.setdefault(a, set()).add(b)
+                        hidden.setdefault(b, set()).add(a)
+                for trip_id, user_id in get_trip_memberships():
+                    members.setdefault(trip_id, []).append(user_id)
+                    trips.setdefault(user_id, []).append(trip_id)
+
+                with self._lock:
+                    self._friends = _sorted_arrays(friends)
+                    self._hidden = hidden
+                    self._trips = _sorted_arrays(trips)
+                    self._members = _sorted_arrays(members)
+                    # writes that committed while we were reading
+                    for change in self._replay:
+                        self._apply(change)
+                    self._built_at = time.monotonic()
+                    self.builds += 1
+            finally:
+                with self._lock:
+                    self._replay = None
+
+    def invalidate(self) -> None:
+        """Forces a rebuild on next use"""
+        with self._lock:
+            self._built_at = None
+
+    # ---- reading ----
+
+    def suggestions(
+        self,
+        user_id : int,
+        limit : int
+    ) -> list[tuple[int, int, int]]:
+        """Best limit (user id, mutual friends, shared trips) candidates for user_id
+
+        Candidates are friends of friends and people on the same trips,
+        ranked by mutual friends plus SHARED_TRIP_WEIGHT per shared trip.
+        Friends are expanded smallest first and expansion stops after
+        SOCIAL_GRAPH_MAX_SCAN ids, so a hub friend with a huge list can't
+        make one call slow. Must run in an app context"""
+
+        self._ensure_built()
+
+        mutual = Counter()
+        shared = Counter()
+        with self._lock:
+            friends = self._friends.get(user_id, ())
+            budget = self.max_scan
+            for friend in sorted(friends, key=lambda f: len(self._friends.get(f, ()))):
+                theirs = self._friends.get(friend, ())
+                if len(theirs) > budget:
+                    break
+                mutual.update(theirs)
+                budget -= len(theirs)
+
+            for trip_id in self._trips.get(user_id, ()):
+                shared.update(self._members.get(trip_id, ()))
+
+            excluded = set(friends)
+            excluded.update(self._hidden.get(user_id, ()))
+            excluded.add(user_id)
+
+        # score everything in C-level Counter ops; only the winners are looked at one by one
+        scores = mutual.copy()
+        for c, count in shared.items():
+            scores[c] += SHARED_TRIP_WEIGHT * count
+        for c in excluded:
+            scores.pop(c, None)
+
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [(c, mutual.get(c, 0), shared.get(c, 0)) for c, _ in best]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._friends),
+                "friendships": sum(len(ids) for ids in self._friends.values()) // 2,
+                "trips": len(self._members),
+                "builds": self.builds,
+                "updates": self.updates,
+                "age": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+            }
+
+
+def people_you_may_know(
+    user_id : int
+) -> list[dict]:
+    """Suggested friends for the friends page, with why they were suggested
+
+    Each entry is {"user", "mutual_friends", "shared_trips"}"""
+
+    from . import social_graph
+    from .database import get_users_by_ids
+
+    ranked = social_graph.suggestions(user_id, current_app.config["PEOPLE_YOU_MAY_KNOW_LIMIT"])
+    users = {u.id: u for u in get_users_by_ids([user_id for user_id, _, _ in ranked])}
+    return [
+        {"user": users[c], "mutual_friends": mutual, "shared_trips": shared}
+        for c, mutual, shared in ranked
+        if c in users
+    ]
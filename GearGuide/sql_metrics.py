@@ -0,0 +1,183 @@
+# per-request SQL statement counts and timings, with N+1 detection
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# collapses bound values and IN lists so repeats of one query share a shape
+_IN_LIST = re.compile(r"\bIN \((?:\?|%\(\w+\)s|%s|:\w+)(?:, ?(?:\?|%\(\w+\)s|%s|:\w+))*\)", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def statement_shape(
+    statement : str
+) -> str:
+    """The statement with whitespace, literals and IN lists normalized"""
+
+    shape = " ".join(statement.split())
+    shape = _STRING.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    return _IN_LIST.sub("IN (...)", shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by query_budget() when a block runs more statements than allowed"""
+
+
+class QueryLog:
+    """Statements run while it is active, with their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement : str, seconds : float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold : int) -> list[tuple[str, int]]:
+        """(shape, count) for statements run more than threshold times"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+class SQLMetrics:
+    """Counts statements and database time per request
+
+    With SQL_METRICS on, every response gets a Server-Timing "db" entry and
+    one JSON line on the GearGuide.sql logger with the statement count, the
+    database time and any statement shape repeated more than
+    SQL_N_PLUS_ONE_THRESHOLD times (an N+1 query loop). Those requests are
+    logged as warnings.
+
+    query_budget() works whether or not SQL_METRICS is on."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.threshold = 5
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+        self._listening = False
+        self._listen_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config["SQL_METRICS"]
+        self.threshold = app.config["SQL_N_PLUS_ONE_THRESHOLD"]
+        app.extensions["sql_metrics"] = self
+        self._listen()
+
+        if self.enabled:
+            # a child of app.logger, so the lines go wherever the app's logs go
+            self.logger = app.logger.getChild("sql")
+            if self.logger.level == logging.NOTSET:
+                self.logger.setLevel(logging.INFO)
+            app.before_request(self._start_request)
+            app.after_request(self._finish_request)
+            app.teardown_request(self._end_request)
+
+    # ---- collecting ----
+
+    def _listen(self) -> None:
+        # on the Engine class, so engines created later are covered too
+        with self._listen_lock:
+            if self._listening:
+                return
+            event.listen(Engine, "before_cursor_execute", self._before_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_execute)
+            self._listening = True
+
+    def _logs(self) -> list:
+        logs = getattr(self._local, "logs", None)
+        if logs is None:
+            logs = self._local.logs = []
+        return logs
+
+    @contextmanager
+    def collect(self):
+        """Records the statements this thread runs inside the block into a QueryLog"""
+        log = QueryLog()
+        logs = self._logs()
+        logs.append(log)
+        try:
+            yield log
+        finally:
+            logs.remove(log)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, "logs", None):
+            conn.info.setdefault("sql_metrics_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        logs = getattr(self._local, "logs", None)
+        started = conn.info.get("sql_metrics_started")
+        if not logs or not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        for log in logs:
+            log.record(statement, elapsed)
+
+    # ---- per request ----
+
+    def _start_request(self) -> None:
+        g._sql_log = QueryLog()
+        self._logs().append(g._sql_log)
+
+    def _finish_request(self, response):
+        log = g.get("_sql_log")
+        if log is None:
+            return response
+
+        db_ms = log.seconds * 1000
+        timing = f'db;dur={db_ms:.1f};desc="{log.count} queries"'
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        repeated = log.repeated(self.threshold)
+        self.logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "queries": log.count,
+                    "db_ms": round(db_ms, 2),
+                    "n_plus_one": [{"statement": shape, "count": n} for shape, n in repeated],
+                }
+            ),
+        )
+        return response
+
+    def _end_request(self, exc) -> None:
+        log = g.pop("_sql_log", None)
+        logs = self._logs()
+        if log in logs:
+            logs.remove(log)
+
+    @contextmanager
+    def query_budget(self, max_queries : int):
+        """Fails with QueryBudgetExceeded if the block runs more than max_queries statements
+
+            with sql_metrics.query_budget(5):
+                client.get(f"/trips/{trip_id}")
+
+        Only statements run on the calling thread are counted (a test
+        client request runs on it)"""
+
+        with self.collect() as log:
+            yield log
+        if log.count > max_queries:
+            shapes = "\n".join(f"  {n} x {shape}" for shape, n in log.shapes.most_common())
+            raise QueryBudgetExceeded(f"{log.count} queries run, budget is {max_queries}:\n{shapes}")
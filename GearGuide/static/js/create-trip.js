@@ -44,7 +44,7 @@ if (destInput && list) {
       list.innerHTML = "";
       return;
     }
-    debounce = setTimeout(() => searchPlaces(q), 400);
+    debounce = setTimeout(() => searchPlaces(q), 250);
   });
 
   destInput.addEventListener("blur", () =>
@@ -53,34 +53,33 @@ if (destInput && list) {
     }, 150)
   );
 
+  // Suggestions come from our own /geocode/suggest endpoint, which caches
+  // answers and keeps us under Nominatim's rate limit
+  let inflight;
+
   async function searchPlaces(q) {
     try {
-      const url = `https://nominatim.openstreetmap.org/search?format=json&addressdetails=1&limit=6&q=${encodeURIComponent(q)}`;
-      const res = await fetch(url, { headers: { Accept: "application/json" } });
+      // only the latest keystroke's answer matters
+      if (inflight) inflight.abort();
+      inflight = new AbortController();
+
+      const url = `/geocode/suggest?q=${encodeURIComponent(q)}`;
+      const res = await fetch(url, {
+        headers: { Accept: "application/json" },
+        signal: inflight.signal,
+      });
       const data = await res.json();
+      const suggestions = (data && data.suggestions) || [];
 
-      if (!Array.isArray(data) || data.length === 0) {
+      if (suggestions.length === 0) {
         list.style.display = "none";
         list.innerHTML = "";
         return;
       }
 
-      list.innerHTML = data
+      list.innerHTML = suggestions
         .map((item) => {
-          const a = item.address || {};
-          const city =
-            a.city ||
-            a.town ||
-            a.village ||
-            a.hamlet ||
-            a.suburb ||
-            a.municipality ||
-            "";
-          const region = a.state || a.county || "";
-          const country = a.country || "";
-          const pretty =
-            [city, region, country].filter(Boolean).join(", ") ||
-            item.display_name;
+          const pretty = item.label;
           return `<li data-val="${escapeHtml(pretty)}" role="option">${escapeHtml(pretty)}</li>`;
         })
         .join("");
@@ -94,7 +93,8 @@ if (destInput && list) {
           destInput.setAttribute("aria-expanded", "false");
         });
       });
-    } catch {
+    } catch (err) {
+      if (err.name === "AbortError") return; // superseded by a newer keystroke
       list.style.display = "none";
       list.innerHTML = "";
     }
@@ -0,0 +1,63 @@
+// Infinite scroll for paged lists. Each "More" link is a plain link to the
+// next page; with JS it instead fetches the next page from its JSON list
+// endpoint and appends the rows, as soon as the link scrolls into view.
+document.addEventListener("DOMContentLoaded", () => {
+  const links = Array.from(document.querySelectorAll("a.load-more[data-src][data-target]"));
+  if (!links.length) return;
+
+  const observer = "IntersectionObserver" in window
+    ? new IntersectionObserver((entries) => {
+        entries.forEach((entry) => {
+          if (entry.isIntersecting && entry.target.isConnected) loadMore(entry.target);
+        });
+      })
+    : null;
+
+  function loadMore(link) {
+    if (link.dataset.loading) return;
+    link.dataset.loading = "1";
+
+    const url = new URL(link.dataset.src, window.location.origin);
+    url.searchParams.set("after", link.dataset.cursor);
+
+    fetch(url, { headers: { Accept: "application/json" } })
+      .then((res) => {
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        return res.json();
+      })
+      .then((data) => {
+        const target = document.querySelector(link.dataset.target);
+        const rows = document.createElement("div");
+        rows.innerHTML = data.html || "";
+        const added = Array.from(rows.children);
+        added.forEach((row) => target.appendChild(row));
+        // lets per-row scripts (e.g. weather badges) pick up the new rows
+        target.dispatchEvent(new CustomEvent("rows:added", { bubbles: true, detail: { rows: added } }));
+
+        if (data.next_cursor) {
+          link.dataset.cursor = data.next_cursor;
+          delete link.dataset.loading;
+          if (observer) {
+            // observing again re-checks it, in case the new rows didn't push it off screen
+            observer.unobserve(link);
+            observer.observe(link);
+          }
+        } else {
+          link.remove();
+        }
+      })
+      .catch((err) => {
+        // leave the plain link working
+        console.error("Load more error:", err);
+        delete link.dataset.loading;
+      });
+  }
+
+  links.forEach((link) => {
+    link.addEventListener("click", (e) => {
+      e.preventDefault();
+      loadMore(link);
+    });
+    if (observer) observer.observe(link);
+  });
+});
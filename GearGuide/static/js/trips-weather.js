@@ -0,0 +1,72 @@
+// Forecast badges on the trips list, loaded with one /weather/batch call
+// per batch of rows (the first page, then each page load-more.js appends)
+(() => {
+  // Emoji icon from forecast text (same rules as weather.js)
+  function getWeatherIcon(shortForecast, isDaytime) {
+    if (!shortForecast) return isDaytime ? "🌤️" : "🌙";
+    const s = shortForecast.toLowerCase();
+
+    if (s.includes("thunder")) return "⛈️";
+    if (s.includes("snow") || s.includes("sleet") || s.includes("flurries")) return "❄️";
+    if (s.includes("rain") || s.includes("shower") || s.includes("drizzle")) return "🌧️";
+    if (s.includes("fog") || s.includes("haze") || s.includes("mist")) return "🌫️";
+    if (s.includes("cloud")) return isDaytime ? "⛅" : "☁️";
+    if (s.includes("sun") || s.includes("clear")) return isDaytime ? "☀️" : "🌙";
+    return isDaytime ? "🌤️" : "🌙";
+  }
+
+  // Best period for a "YYYY-MM-DD" date: daytime if there is one
+  function periodForDate(forecast, dateKey) {
+    const dayPeriods = forecast.filter((p) => {
+      const d = new Date(p.startTime);
+      return !isNaN(d) && d.toISOString().slice(0, 10) === dateKey;
+    });
+    return dayPeriods.find((p) => p.isDaytime === true) || dayPeriods[0] || null;
+  }
+
+  function loadBadges(badges) {
+    if (!badges.length) return;
+
+    const tripIds = [...new Set(badges.map((b) => parseInt(b.dataset.tripId, 10)))];
+
+    fetch("/weather/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ trip_ids: tripIds }),
+    })
+      .then((res) => res.json())
+      .then((data) => {
+        const byTrip = {};
+        (data.results || []).forEach((r) => {
+          if (r.forecast) byTrip[r.trip_id] = r.forecast;
+        });
+
+        badges.forEach((badge) => {
+          const forecast = byTrip[badge.dataset.tripId];
+          if (!forecast) return;
+
+          // Trips past the forecast range just don't get a badge
+          const best = periodForDate(forecast, badge.dataset.start);
+          if (!best) return;
+
+          const unit = best.temperatureUnit || "F";
+          badge.textContent = `${getWeatherIcon(best.shortForecast, best.isDaytime)} ${
+            best.temperature != null ? best.temperature + "°" + unit : ""
+          }`;
+          badge.title = best.shortForecast || "";
+          badge.style.display = "";
+        });
+      })
+      .catch((err) => {
+        console.error("Trip weather badges error:", err);
+      });
+  }
+
+  const selector = ".weather-badge[data-trip-id]";
+  document.addEventListener("DOMContentLoaded", () => {
+    loadBadges(Array.from(document.querySelectorAll(selector)));
+  });
+  document.addEventListener("rows:added", (e) => {
+    loadBadges(e.detail.rows.flatMap((row) => Array.from(row.querySelectorAll(selector))));
+  });
+})();
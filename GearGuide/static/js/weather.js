@@ -34,14 +34,6 @@ if (toggleBtn && suggestionsWrapper) {
 
   /* -------- Helper functions -------- */
 
-  // Turn an ISO datetime into a normalized date key "YYYY-MM-DD" using UTC
-  function toDateKeyFromISO(isoString) {
-    if (!isoString) return null;
-    const d = new Date(isoString);
-    if (isNaN(d)) return null;
-    return d.toISOString().slice(0, 10);
-  }
-
   // Turn a "YYYY-MM-DD" (or ISO datetime) into "MM/DD" for display
   function formatDateMMDD(dateStrOrIso) {
     if (!dateStrOrIso) return "";
@@ -92,207 +84,120 @@ if (toggleBtn && suggestionsWrapper) {
     `;
   }
 
-  // Build array of date keys from trip start → end as "YYYY-MM-DD" (UTC-normalized)
-  function getTripDateKeys(startStr, endStr) {
-    if (!startStr || !endStr) return [];
-    const dates = [];
-    const start = new Date(startStr + "T00:00:00Z");
-    const end = new Date(endStr + "T00:00:00Z");
-    if (isNaN(start) || isNaN(end)) return [];
+  /* -------- Weather-based packing suggestions (computed server-side) -------- */
 
-    let cur = new Date(start);
-    while (cur <= end) {
-      dates.push(cur.toISOString().slice(0, 10)); // YYYY-MM-DD
-      cur.setUTCDate(cur.getUTCDate() + 1);
-    }
-    return dates;
+  function loadSuggestions() {
+    // Already rendered into the page when the forecast was cached
+    if (!suggestListEl || meta.dataset.suggestionsReady || !meta.dataset.suggestionsUrl) return;
+
+    fetch(meta.dataset.suggestionsUrl)
+      .then((res) => res.json())
+      .then((data) => {
+        const suggestions = (data && data.suggestions) || [];
+        if (!suggestions.length) return;
+
+        if (suggestEmptyEl) {
+          suggestEmptyEl.remove();
+        }
+        suggestions.forEach((item) => {
+          const li = document.createElement("li");
+          li.textContent = item;
+          suggestListEl.appendChild(li);
+        });
+      })
+      .catch((err) => {
+        console.error("Weather suggestions fetch error:", err);
+      });
   }
 
   /* -------- Fetch Weather from backend /weather route -------- */
 
   if (!Number.isFinite(lat) || !Number.isFinite(lon)) {
     loadingEl.textContent =
-      "No geographic coordinates available for this destination.";
+      meta.dataset.geocodeStatus === "PENDING"
+        ? "Still looking up this destination's location. Refresh in a moment for the forecast."
+        : "No geographic coordinates available for this destination.";
     return;
   }
 
-  fetch(`/weather?lat=${lat}&lon=${lon}`)
+  // Render one forecast row; dateStr is "YYYY-MM-DD" or an ISO datetime
+  function buildPeriodBlock(period, dateStr) {
+    const icon = getWeatherIcon(period.shortForecast, period.isDaytime);
+    const temp = period.temperature;
+    const unit = period.temperatureUnit || "F";
+
+    const block = document.createElement("div");
+    block.style.marginBottom = "1rem";
+    block.innerHTML = `
+      <div style="display:flex; align-items:flex-start; gap:0.75rem;">
+        <div style="font-size:1.5rem;">${icon}</div>
+        <div style="flex:1;">
+          <strong>${period.name || "Forecast"} (${formatDateMMDD(dateStr)})</strong><br>
+          <span>${temp != null ? temp + "°" + unit : "—"} · ${
+      period.shortForecast || ""
+    }</span>
+          ${buildTempBar(temp)}
+          <br>
+          <small class="muted">Wind: ${period.windSpeed || "—"} ${
+      period.windDirection || ""
+    }</small>
+        </div>
+      </div>
+    `;
+    return block;
+  }
+
+  // The server groups periods by day and picks each day's best period
+  const params = new URLSearchParams({ lat, lon, compact: "1" });
+  if (tripStartStr && tripEndStr) {
+    params.set("start", tripStartStr);
+    params.set("end", tripEndStr);
+  }
+
+  fetch(`/weather?${params}`)
     .then((res) => res.json())
     .then((data) => {
       loadingEl.style.display = "none";
 
-      if (data.error || !data.forecast) {
+      if (data.error || !data.days) {
         errorEl.textContent = "Weather data unavailable.";
         errorEl.style.display = "block";
         return;
       }
 
-      const forecast = data.forecast || [];
-
-      // Group periods by normalized date key
-      const periodsByDate = {};
-      forecast.forEach((p) => {
-        const key = toDateKeyFromISO(p.startTime);
-        if (!key) return;
-        if (!periodsByDate[key]) periodsByDate[key] = [];
-        periodsByDate[key].push(p);
-      });
+      // The forecast is cached server-side now, so this is cheap
+      loadSuggestions();
 
       containerEl.innerHTML = "";
       containerEl.style.display = "block";
 
-      const tripDateKeys = getTripDateKeys(tripStartStr, tripEndStr);
-      let itemsRendered = 0;
-
-      /* -------- Weather-based packing suggestions -------- */
-
-      if (suggestListEl) {
-        let willRain = false;
-        let willSnow = false;
-        let veryCold = false; // <= 40°F
-        let veryHot = false;  // >= 85°F
-
-        if (tripDateKeys.length) {
-          tripDateKeys.forEach((dateKey) => {
-            const dayPeriods = periodsByDate[dateKey] || [];
-            dayPeriods.forEach((p) => {
-              const short = (p.shortForecast || "").toLowerCase();
-              const temp = p.temperature;
-
-              if (short.includes("rain") || short.includes("shower") || short.includes("drizzle")) {
-                willRain = true;
-              }
-              if (short.includes("snow") || short.includes("sleet") || short.includes("flurries")) {
-                willSnow = true;
-              }
-              if (typeof temp === "number") {
-                if (temp <= 40) veryCold = true;
-                if (temp >= 85) veryHot = true;
-              }
-            });
-          });
-        }
-
-        const suggestions = new Set();
-
-        if (willRain || willSnow) {
-          suggestions.add("Rain jacket");
-          suggestions.add("Waterproof boots or shoes");
-          suggestions.add("Extra warm socks");
-          suggestions.add("Dry bag or pack liner");
-        }
-        if (veryCold) {
-          suggestions.add("Insulated jacket");
-          suggestions.add("Gloves");
-          suggestions.add("Beanie or warm hat");
-          suggestions.add("Thermal base layers");
-        }
-        if (veryHot) {
-          suggestions.add("Sun hat");
-          suggestions.add("Sunscreen");
-          suggestions.add("Lightweight, breathable clothing");
-          suggestions.add("Electrolyte packets");
-        }
-
-        if (suggestions.size > 0) {
-          if (suggestEmptyEl) {
-            suggestEmptyEl.remove();
-          }
-          suggestions.forEach((item) => {
-            const li = document.createElement("li");
-            li.textContent = item;
-            suggestListEl.appendChild(li);
-          });
-        }
-      }
-
       /* -------- Render per-day forecast for trip dates -------- */
 
-      if (tripDateKeys.length) {
-        tripDateKeys.forEach((dateKey) => {
-          const dayPeriods = periodsByDate[dateKey] || [];
-
-          if (!dayPeriods.length) {
-            // No forecast yet for this date (e.g., trip >7 days out)
-            const block = document.createElement("div");
-            block.style.marginBottom = "1rem";
-            block.innerHTML = `
-              <div style="display:flex; align-items:flex-start; gap:0.75rem;">
-                <div style="font-size:1.5rem;">🌤️</div>
-                <div style="flex:1;">
-                  <strong>${formatDateMMDD(dateKey)}</strong><br>
-                  <span>No forecast available for this date yet.</span>
-                </div>
-              </div>
-            `;
-            containerEl.appendChild(block);
-            return;
-          }
-
-          // Prefer a daytime period; fallback to the first one
-          const best =
-            dayPeriods.find((p) => p.isDaytime === true) || dayPeriods[0];
-
-          const icon = getWeatherIcon(best.shortForecast, best.isDaytime);
-          const temp = best.temperature;
-          const unit = best.temperatureUnit || "F";
-
+      data.days.forEach((day) => {
+        if (!day.period) {
+          // No forecast yet for this date (e.g., trip >7 days out)
           const block = document.createElement("div");
           block.style.marginBottom = "1rem";
           block.innerHTML = `
             <div style="display:flex; align-items:flex-start; gap:0.75rem;">
-              <div style="font-size:1.5rem;">${icon}</div>
+              <div style="font-size:1.5rem;">🌤️</div>
               <div style="flex:1;">
-                <strong>${best.name || "Forecast"} (${formatDateMMDD(
-            dateKey
-          )})</strong><br>
-                <span>${temp != null ? temp + "°" + unit : "—"} · ${
-            best.shortForecast || ""
-          }</span>
-                ${buildTempBar(temp)}
-                <br>
-                <small class="muted">Wind: ${
-                  best.windSpeed || "—"
-                } ${best.windDirection || ""}</small>
+                <strong>${formatDateMMDD(day.date)}</strong><br>
+                <span>No forecast available for this date yet.</span>
               </div>
             </div>
           `;
           containerEl.appendChild(block);
-          itemsRendered++;
-        });
-      }
+          return;
+        }
 
-      // If trip is out of range and nothing rendered, show first few raw periods as a fallback
-      if (!itemsRendered && forecast.length) {
-        const fallback = forecast.slice(0, 5);
-        fallback.forEach((period) => {
-          const icon = getWeatherIcon(period.shortForecast, period.isDaytime);
-          const temp = period.temperature;
-          const unit = period.temperatureUnit || "F";
+        containerEl.appendChild(buildPeriodBlock(day.period, day.date));
+      });
 
-          const block = document.createElement("div");
-          block.style.marginBottom = "1rem";
-          block.innerHTML = `
-            <div style="display:flex; align-items:flex-start; gap:0.75rem;">
-              <div style="font-size:1.5rem;">${icon}</div>
-              <div style="flex:1;">
-                <strong>${period.name || "Forecast"} (${formatDateMMDD(
-            period.startTime
-          )})</strong><br>
-                <span>${temp != null ? temp + "°" + unit : "—"} · ${
-            period.shortForecast || ""
-          }</span>
-                ${buildTempBar(temp)}
-                <br>
-                <small class="muted">Wind: ${
-                  period.windSpeed || "—"
-                } ${period.windDirection || ""}</small>
-              </div>
-            </div>
-          `;
-          containerEl.appendChild(block);
-        });
-      }
+      // If trip is out of range, the server sends the next few periods as a fallback
+      (data.upcoming || []).forEach((period) => {
+        containerEl.appendChild(buildPeriodBlock(period, period.startTime));
+      });
     })
     .catch((err) => {
       loadingEl.style.display = "none";
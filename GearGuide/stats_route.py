@@ -0,0 +1,31 @@
+from flask import Blueprint, abort, current_app, jsonify
+from flask_login import login_required
+
+from . import weather_cache, http_client, social_graph
+from .geocode import geocode_stats
+
+# Blueprint so it can be registered in create_app()
+bp = Blueprint("stats", __name__)
+
+
+@bp.route("/stats", methods=["GET"])
+@login_required
+def stats():
+    """
+    Operational counters for outbound HTTP, the weather caches, geocoding
+    and the social graph
+
+    Only served with STATS_ENABLED or in debug mode
+    """
+
+    if not (current_app.config["STATS_ENABLED"] or current_app.debug):
+        abort(404)
+
+    return jsonify(
+        {
+            "http": http_client.stats(),
+            "weather_cache": weather_cache.stats(),
+            "geocode": geocode_stats(),
+            "social_graph": social_graph.stats(),
+        }
+    )
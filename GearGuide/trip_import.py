@@ -0,0 +1,329 @@
+# bulk trip import from CSV or JSON, for onboarding outfits with many trips
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import click
+import requests
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Trip, PackListItem
+from .database import get_user_by_username
+from .geocode import (
+    GEOCODE_PENDING,
+    GEOCODE_DONE,
+    GEOCODE_FAILED,
+    GeocodeRateLimited,
+    cached_geocode,
+    geocode_destination,
+    normalize_destination,
+)
+from .packing import seed_items
+
+# Blueprint so it can be registered in create_app()
+bp = Blueprint("trips", __name__)
+
+REQUIRED_FIELDS = ("name", "destination", "start_date", "end_date")
+
+
+class RowError(ValueError):
+    """A row that can't be imported; the message is shown to the user"""
+
+
+def parse_rows(
+    text : str,
+    fmt : str
+) -> list[dict]:
+    """Reads trips from CSV (with a header row) or a JSON list of objects
+
+    Raises ValueError if the document itself can't be parsed"""
+
+    if fmt == "json":
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get("trips")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON must be a list of trip objects")
+        return rows
+
+    try:
+        return list(csv.DictReader(io.StringIO(text)))
+    except csv.Error as e:
+        # e.g. a field over csv.field_size_limit() or a stray NUL byte
+        raise ValueError(f"Bad CSV: {e}")
+
+
+def _clean_row(row : dict, today : date) -> dict:
+    # validates one row and returns the Trip fields, or raises RowError
+    # JSON rows can hold any type; CSV rows are always strings
+    not_text = [
+        key for key in (*REQUIRED_FIELDS, "notes")
+        if row.get(key) is not None and not isinstance(row[key], str)
+    ]
+    if not_text:
+        raise RowError(f"{', '.join(not_text)} must be text")
+
+    fields = {key: (row.get(key) or "").strip() for key in REQUIRED_FIELDS}
+
+    missing = [key for key in REQUIRED_FIELDS if not fields[key]]
+    if missing:
+        raise RowError(f"Missing {', '.join(missing)}")
+
+    try:
+        start_date = datetime.strptime(fields["start_date"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(fields["end_date"], "%Y-%m-%d").date()
+    except ValueError:
+        raise RowError("Dates must be YYYY-MM-DD")
+
+    if start_date < today:
+        raise RowError("Start date is in the past")
+    if end_date < start_date:
+        raise RowError("End date is before start date")
+
+    activities = row.get("activities") or []
+    if isinstance(activities, str):
+        activities = activities.split(",")
+    if not isinstance(activities, list):
+        raise RowError("activities must be text or a list of text")
+    activities = [a.strip() for a in activities if isinstance(a, str) and a.strip()]
+
+    return {
+        "name": fields["name"][:100],
+        "destination": fields["destination"][:255],
+        "start_date": start_date,
+        "end_date": end_date,
+        "activities": activities,
+        "notes": (row.get("notes") or "").strip() or None,
+    }
+
+
+def _geocode_or_error(app, destination : str):
+    # runs on a worker thread, so it needs its own app context
+    with app.app_context():
+        try:
+            return geocode_destination(destination, wait_for_limit=app.config["GEOCODE_LIMIT_WAIT"])
+        except (requests.RequestException, GeocodeRateLimited, ValueError, KeyError) as e:
+            return e
+
+
+def geocode_destinations(
+    destinations : list[str]
+) -> tuple[dict, dict]:
+    """Geocodes many destinations at once, each unique one only once
+
+    Destinations are deduplicated by their normalized form. Ones the
+    gazetteer or geocode cache know are resolved inline; the rest are
+    looked up concurrently, each call waiting its turn at the shared
+    Nominatim rate limiter.
+
+    Returns (results, counts): results maps each normalized destination
+    to a GeocodeResult, None (no match) or the exception that stopped
+    the lookup."""
+
+    unique = {}
+    for destination in destinations:
+        unique.setdefault(normalize_destination(destination), destination)
+
+    results = {}
+    missing = []
+    for key, destination in unique.items():
+        result = cached_geocode(destination)
+        if result is not None:
+            results[key] = result
+        else:
+            missing.append(key)
+
+    if missing:
+        app = current_app._get_current_object()
+        workers = min(app.config["TRIP_IMPORT_GEOCODE_WORKERS"], len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            looked_up = pool.map(lambda key: _geocode_or_error(app, unique[key]), missing)
+            results.update(zip(missing, looked_up))
+
+    counts = {
+        "unique_destinations": len(unique),
+        "resolved_locally": len(unique) - len(missing),
+        "looked_up": len(missing),
+    }
+    return results, counts
+
+
+def _new_trip(host_id : int, fields : dict, location) -> tuple[Trip, list[str]]:
+    if location is None:
+        lat, lon, status = None, None, GEOCODE_FAILED
+    elif isinstance(location, Exception):
+        lat, lon, status = None, None, GEOCODE_PENDING
+    else:
+        lat, lon, status = location.lat, location.lon, GEOCODE_DONE
+
+    trip = Trip(
+        host_id=host_id,
+        name=fields["name"],
+        destination=fields["destination"],
+        lat=lat,
+        lon=lon,
+        geocode_status=status,
+        start_date=fields["start_date"],
+        end_date=fields["end_date"],
+        activities=",".join(fields["activities"]),
+        notes=fields["notes"],
+    )
+    return trip, sorted(seed_items(fields["activities"]))
+
+
+def _insert_batch(host_id : int, batch : list[tuple[int, dict, object]]) -> tuple[list[tuple[int, str]], list[dict]]:
+    # inserts trips and their seeded items in one transaction and returns
+    # (trip id, geocode status) for each. If the batch fails, each row is
+    # retried on its own to find the bad one.
+    def add(rows):
+        trips = []
+        for _, fields, location in rows:
+            trip, items = _new_trip(host_id, fields, location)
+            db.session.add(trip)
+            trips.append((trip, items))
+        db.session.flush()  # assigns trip ids
+        db.session.add_all(
+            PackListItem(trip_id=trip.id, name=item, is_packed=False)
+            for trip, items in trips
+            for item in items
+        )
+        # read before the commit expires them
+        created = [(trip.id, trip.geocode_status) for trip, _ in trips]
+        db.session.commit()
+        return created
+
+    try:
+        return add(batch), []
+    except IntegrityError:
+        db.session.rollback()
+
+    created, errors = [], []
+    for row in batch:
+        try:
+            created += add([row])
+        except IntegrityError as e:
+            db.session.rollback()
+            errors.append({"row": row[0], "error": f"Could not save trip: {e.orig}"})
+    return created, errors
+
+
+def import_trips(
+    host_id : int,
+    rows : list[dict]
+) -> dict:
+    """Creates trips for host_id from parsed rows, reporting per-row errors
+
+    Bad rows are skipped and reported; they never abort the rest of the
+    import. Row numbers in the report count from 1. Trips whose lookup
+    failed are saved as pending and handed to the geocode worker."""
+
+    config = current_app.config
+    today = date.today()
+    report = {"rows": len(rows), "created": 0, "errors": [], "warnings": []}
+
+    if len(rows) > config["TRIP_IMPORT_MAX_ROWS"]:
+        report["errors"].append({"row": None, "error": f"At most {config['TRIP_IMPORT_MAX_ROWS']} trips per import"})
+        return report
+
+    # 1) Validate every row, including names already used by this host
+    existing = {name for (name,) in db.session.query(Trip.name).filter(Trip.host_id == host_id)}
+    valid = []
+    for number, row in enumerate(rows, 1):
+        try:
+            fields = _clean_row(row, today)
+        except RowError as e:
+            report["errors"].append({"row": number, "error": str(e)})
+            continue
+
+        if fields["name"] in existing:
+            report["errors"].append({"row": number, "error": f"A trip named {fields['name']!r} already exists"})
+            continue
+        existing.add(fields["name"])
+        valid.append((number, fields))
+
+    # 2) Geocode each distinct destination once
+    locations, report["geocode"] = geocode_destinations([fields["destination"] for _, fields in valid])
+
+    # 3) Insert in batches, one transaction each
+    pending = []
+    batch_size = config["TRIP_IMPORT_BATCH_SIZE"]
+    for start in range(0, len(valid), batch_size):
+        batch = []
+        for number, fields in valid[start:start + batch_size]:
+            location = locations[normalize_destination(fields["destination"])]
+            if location is None:
+                report["warnings"].append({"row": number, "warning": "Could not geocode the destination"})
+            batch.append((number, fields, location))
+
+        created, errors = _insert_batch(host_id, batch)
+        report["created"] += len(created)
+        report["errors"] += errors
+        pending += [trip_id for trip_id, status in created if status == GEOCODE_PENDING]
+
+    worker = current_app.extensions["geocode_worker"]
+    for trip_id in pending:
+        worker.enqueue(trip_id)
+    report["geocode"]["pending"] = len(pending)
+
+    report["errors"].sort(key=lambda e: e["row"] or 0)
+    return report
+
+
+@bp.route("/trips/import", methods=["POST"])
+@login_required
+def import_trips_route():
+    """
+    Bulk-creates trips for the logged in user.
+
+    Accepts an uploaded CSV or JSON file as "file", or a JSON body with
+    a "trips" list. CSV needs a header row with name, destination,
+    start_date and end_date columns; activities (comma separated) and
+    notes are optional. Returns a per-row report.
+    """
+
+    upload = request.files.get("file")
+    try:
+        if upload is not None:
+            fmt = "json" if upload.filename.lower().endswith(".json") else "csv"
+            rows = parse_rows(upload.read().decode("utf-8-sig"), fmt)
+        else:
+            rows = parse_rows(request.get_data(as_text=True), "json")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not read trips: {e}"}), 400
+
+    report = import_trips(current_user.id, rows)
+    status = 200 if report["created"] or not report["errors"] else 400
+    return jsonify(report), status
+
+
+@bp.cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--host", "username", required=True, help="Username of the trips' host")
+def import_command(path, username):
+    """Import trips from a CSV or JSON file"""
+
+    user = get_user_by_username(username)
+    if user is None:
+        raise click.ClickException(f"No user named {username!r}")
+
+    try:
+        with open(path, encoding="utf-8-sig") as f:
+            rows = parse_rows(f.read(), "json" if path.lower().endswith(".json") else "csv")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise click.ClickException(f"Could not read trips: {e}")
+
+    report = import_trips(user.id, rows)
+    geocode = report.get("geocode", {})
+    print(
+        f"{report['created']} of {report['rows']} trips created; "
+        + ", ".join(f"{k}={v}" for k, v in geocode.items())
+    )
+    for warning in report["warnings"]:
+        print(f"row {warning['row']}: warning: {warning['warning']}")
+    for error in report["errors"]:
+        print(f"row {error['row']}: {error['error']}")
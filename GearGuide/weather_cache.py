@@ -0,0 +1,353 @@
+# in-memory caches for National Weather Service lookups
+import threading
+import time
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple
+
+
+class Forecast(NamedTuple):
+    """Simplified forecast periods for one gridpoint
+
+    version changes whenever NWS issues a new forecast, so anything
+    derived from the periods can be cached against it. stale is set
+    when the forecast is past its expiry and is being served while a
+    refresh runs (or while NWS is down)."""
+
+    periods : list[dict]
+    version : str
+    fetched_at : datetime | None = None
+    expires_at : datetime | None = None
+    stale : bool = False
+
+
+class TTLCache:
+    """Thread-safe LRU cache where every entry carries its own expiry time
+
+    Entries past their expiry are treated as misses. When the cache is full
+    the least recently used entry is evicted."""
+
+    def __init__(self, maxsize : int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def ttl_remaining(self, key) -> float:
+        """Seconds until key expires, or 0 if it is missing or expired
+
+        Does not count as a hit or miss and doesn't touch LRU order"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return 0
+            return max(0, entry[1] - time.monotonic())
+
+    def set(self, key, value, ttl : float) -> None:
+        """Stores value under key for ttl seconds
+
+        A ttl of zero or less removes any existing entry instead"""
+        with self._lock:
+            if ttl <= 0:
+                self._data.pop(key, None)
+                return
+
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class Gridpoint(NamedTuple):
+    """An NWS forecast grid cell: the issuing office plus the cell's x/y"""
+
+    office : str
+    x : int
+    y : int
+
+
+def _point_in_ring(lat : float, lon : float, ring : list) -> bool:
+    # ray casting over a GeoJSON ring of [lon, lat] pairs
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lon_i, lat_i = ring[i][0], ring[i][1]
+        lon_j, lat_j = ring[j][0], ring[j][1]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+class GridpointIndex:
+    """Resolves coordinates to NWS gridpoints without calling /points
+
+    Holds the polygon of every grid cell we have seen a forecast for.
+    Cells are bucketed on a coarse lat/lon grid, so a lookup only tests
+    the handful of cells near the coordinate. The oldest cells are
+    dropped once maxsize is reached."""
+
+    BUCKET_DEGREES = 0.05
+
+    def __init__(self, maxsize : int = 4096):
+        self.maxsize = maxsize
+        self._cells = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # set once the index has been rebuilt from the forecasts table
+        self.seeded = False
+
+    def _bucket(self, lat : float, lon : float) -> tuple[int, int]:
+        return (int(lat // self.BUCKET_DEGREES), int(lon // self.BUCKET_DEGREES))
+
+    def _bucket_range(self, bbox : tuple[float, float, float, float]):
+        min_lat, min_lon, max_lat, max_lon = bbox
+        low = self._bucket(min_lat, min_lon)
+        high = self._bucket(max_lat, max_lon)
+        for i in range(low[0], high[0] + 1):
+            for j in range(low[1], high[1] + 1):
+                yield (i, j)
+
+    def add(self, gridpoint : Gridpoint, polygon : list) -> None:
+        """Registers a cell from the GeoJSON Polygon coordinates NWS returns"""
+
+        ring = polygon[0]
+        lats = [point[1] for point in ring]
+        lons = [point[0] for point in ring]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+
+        with self._lock:
+            self._remove(gridpoint)
+            self._cells[gridpoint] = (bbox, ring)
+            for bucket in self._bucket_range(bbox):
+                self._buckets.setdefault(bucket, []).append(gridpoint)
+
+            while len(self._cells) > self.maxsize:
+                self._remove(next(iter(self._cells)))
+
+    def _remove(self, gridpoint : Gridpoint) -> None:
+        cell = self._cells.pop(gridpoint, None)
+        if cell is None:
+            return
+        for bucket in self._bucket_range(cell[0]):
+            members = self._buckets.get(bucket)
+            if members and gridpoint in members:
+                members.remove(gridpoint)
+                if not members:
+                    del self._buckets[bucket]
+
+    def lookup(self, lat : float, lon : float) -> Gridpoint | None:
+        """Returns the known cell containing the coordinate, or None"""
+
+        with self._lock:
+            for gridpoint in self._buckets.get(self._bucket(lat, lon), ()):
+                (min_lat, min_lon, max_lat, max_lon), ring = self._cells[gridpoint]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon and _point_in_ring(lat, lon, ring):
+                    self.hits += 1
+                    return gridpoint
+
+            self.misses += 1
+            return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._buckets.clear()
+            self.hits = 0
+            self.misses = 0
+            self.seeded = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cells": len(self._cells),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class _Call:
+    """An in-flight call that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key
+
+    The first thread to call do() for a key runs fn; any thread that asks
+    for the same key while that call is running waits for it and gets the
+    same result (or the same exception) instead of calling fn again."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def running(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*(s-maxage|max-age)\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def ttl_from_headers(headers, default : float, maximum : float, minimum : float = 0) -> float:
+    """Works out how long a response may be cached for
+
+    Honors Cache-Control (no-store, no-cache, s-maxage, max-age) first and
+    falls back to Expires. Returns default when neither header is usable,
+    and always a value between minimum and maximum."""
+
+    return max(minimum, min(_header_ttl(headers, default), maximum))
+
+
+def _header_ttl(headers, default : float) -> float:
+    cache_control = headers.get("Cache-Control", "")
+    lowered = cache_control.lower()
+
+    if "no-store" in lowered or "no-cache" in lowered:
+        return 0
+
+    ages = dict((k.lower(), int(v)) for k, v in _MAX_AGE_RE.findall(cache_control))
+    if ages:
+        return ages.get("s-maxage", ages.get("max-age"))
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires)
+            date = headers.get("Date")
+            now = parsedate_to_datetime(date) if date else datetime.now(timezone.utc)
+            return max(0, (expires_at - now).total_seconds())
+        except (TypeError, ValueError):
+            # "Expires: 0" and other invalid dates mean already expired
+            return 0
+
+    return default
+
+
+class WeatherCache:
+    """Two-tier cache for the /weather route
+
+    grid resolves any coordinate inside an already-seen grid cell
+    locally. points maps exact coordinates to their gridpoint for cells
+    we have no polygon for yet, and lives for a long time since
+    gridpoints rarely move. forecasts maps a gridpoint to its simplified
+    periods and follows the NWS caching headers, so nearby trips share
+    one forecast.
+
+    inflight coalesces concurrent misses for the same key so only one
+    request per gridpoint goes upstream at a time. suggestions holds the
+    packing suggestions worked out from each trip's forecast."""
+
+    def __init__(self, app=None):
+        self.grid = GridpointIndex()
+        self.points = TTLCache()
+        self.forecasts = TTLCache()
+        self.suggestions = TTLCache()
+        self.suggestions_ttl = 60 * 60
+        self.inflight = SingleFlight()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.grid.maxsize = app.config["WEATHER_POINTS_CACHE_SIZE"]
+        self.points.maxsize = app.config["WEATHER_POINTS_CACHE_SIZE"]
+        self.forecasts.maxsize = app.config["WEATHER_FORECAST_CACHE_SIZE"]
+        self.suggestions.maxsize = app.config["WEATHER_SUGGESTIONS_CACHE_SIZE"]
+        self.suggestions_ttl = app.config["WEATHER_FORECAST_MAX_TTL"]
+        app.extensions["weather_cache"] = self
+
+    def clear(self) -> None:
+        self.grid.clear()
+        self.points.clear()
+        self.forecasts.clear()
+        self.suggestions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "grid": self.grid.stats(),
+            "points": self.points.stats(),
+            "forecasts": self.forecasts.stats(),
+            "suggestions": self.suggestions.stats(),
+            "coalesced": self.inflight.coalesced,
+            "in_flight": self.inflight.in_flight(),
+        }
@@ -1,6 +1,23 @@
-from flask import Blueprint, request, jsonify
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import current_user
 import requests
 
+from . import db, weather_cache, http_client
+from .weather_cache import Forecast, Gridpoint, ttl_from_headers
+from .packing import group_periods_by_date, period_date, trip_dates
+from .database import (
+    get_viewable_trips,
+    get_forecast_entry,
+    save_forecast_entry,
+    extend_forecast_entry,
+    get_forecast_polygons,
+)
+
 # National Weather Service requires a User-Agent
 NWS_HEADERS = {
     "User-Agent": "GearGuideApp (contact@example.com)",
@@ -11,10 +28,439 @@ NWS_HEADERS = {
 bp = Blueprint("weather", __name__)
 
 
+class NWSError(Exception):
+    """Raised when NWS answers with something other than a 200"""
+
+    def __init__(self, message : str, status_code : int, details : str = ""):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details
+
+
+def forecast_url(
+    gridpoint : Gridpoint
+) -> str:
+    """The NWS forecast URL for a gridpoint"""
+
+    return f"{current_app.config['NWS_BASE_URL']}/gridpoints/{gridpoint.office}/{gridpoint.x},{gridpoint.y}/forecast"
+
+
+def get_cached_gridpoint(
+    lat : float,
+    lon : float
+) -> Gridpoint | None:
+    """Resolves a coordinate to its gridpoint without calling NWS
+
+    Checks the spatial index of known grid cells first, then the exact
+    coordinate in the points cache. Returns None if neither knows it."""
+
+    if not weather_cache.grid.seeded:
+        _seed_grid_index()
+
+    gridpoint = weather_cache.grid.lookup(lat, lon)
+    if gridpoint is not None:
+        return gridpoint
+
+    # NWS itself rounds coordinates to 4 decimal places, so we key on that too
+    return weather_cache.points.get((round(lat, 4), round(lon, 4)))
+
+
+def _seed_grid_index() -> None:
+    # rebuild the spatial index from stored grid cells after a restart
+    weather_cache.grid.seeded = True
+    for office, grid_x, grid_y, polygon in get_forecast_polygons():
+        weather_cache.grid.add(Gridpoint(office, grid_x, grid_y), json.loads(polygon))
+
+
+def get_gridpoint(
+    lat : float,
+    lon : float
+) -> Gridpoint:
+    """Looks up the NWS gridpoint for a coordinate
+
+    Only calls /points for coordinates outside every grid cell we know"""
+
+    gridpoint = get_cached_gridpoint(lat, lon)
+    if gridpoint is not None:
+        return gridpoint
+
+    key = (round(lat, 4), round(lon, 4))
+    return weather_cache.inflight.do(("points", key), lambda: _fetch_gridpoint(key))
+
+
+def _fetch_gridpoint(key : tuple[float, float]) -> Gridpoint:
+    # another thread may have filled the cache while we waited to lead
+    gridpoint = weather_cache.points.get(key)
+    if gridpoint is not None:
+        return gridpoint
+
+    points_url = f"{current_app.config['NWS_BASE_URL']}/points/{key[0]},{key[1]}"
+    points_res = http_client.get(points_url, headers=NWS_HEADERS)
+
+    if points_res.status_code != 200:
+        raise NWSError("NWS points lookup failed", points_res.status_code, points_res.text)
+
+    properties = points_res.json()["properties"]
+    gridpoint = Gridpoint(properties["gridId"], int(properties["gridX"]), int(properties["gridY"]))
+    weather_cache.points.set(key, gridpoint, current_app.config["WEATHER_POINTS_TTL"])
+    return gridpoint
+
+
+def simplify_periods(
+    periods : list[dict]
+) -> list[dict]:
+    """Simplify periods down to fields we care about"""
+
+    return [
+        {
+            "name": p.get("name"),
+            "startTime": p.get("startTime"),
+            "endTime": p.get("endTime"),
+            "isDaytime": p.get("isDaytime"),
+            "temperature": p.get("temperature"),
+            "temperatureUnit": p.get("temperatureUnit"),
+            "windSpeed": p.get("windSpeed"),
+            "windDirection": p.get("windDirection"),
+            "shortForecast": p.get("shortForecast"),
+            "detailedForecast": p.get("detailedForecast"),
+        }
+        for p in periods
+    ]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def get_gridpoint_forecast(
+    gridpoint : Gridpoint
+) -> Forecast:
+    """Fetches the simplified forecast periods for a gridpoint
+
+    Checks the in-memory cache, then the forecasts table, and only then
+    NWS. A stored forecast past its expiry is returned straight away
+    (marked stale) while a background thread refreshes it, so NWS being
+    slow or down never blocks a request that has something to show.
+    Concurrent misses for the same gridpoint share one upstream request."""
+
+    forecast = weather_cache.forecasts.get(gridpoint)
+    if forecast is not None:
+        return forecast
+
+    return weather_cache.inflight.do(("forecast", gridpoint), lambda: _fetch_forecast(gridpoint))
+
+
+def refresh_forecast(
+    gridpoint : Gridpoint
+) -> Forecast:
+    """Fetches a gridpoint's forecast from NWS even if it is cached or stored
+
+    Used by the prefetcher and by stale-while-revalidate refreshes"""
+
+    return weather_cache.inflight.do(("refresh", gridpoint), lambda: _fetch_forecast(gridpoint, force=True))
+
+
+def _refresh_in_background(gridpoint : Gridpoint) -> None:
+    if weather_cache.inflight.running(("refresh", gridpoint)):
+        return
+
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                refresh_forecast(gridpoint)
+            except (NWSError, KeyError, requests.RequestException) as e:
+                # keep serving the stored forecast; we'll retry once it ages out of memory
+                app.logger.warning("Background forecast refresh failed for %s: %s", gridpoint, e)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name="forecast-refresh", daemon=True).start()
+
+
+def _forecast_from_entry(entry, stale : bool) -> Forecast:
+    return Forecast(
+        periods=json.loads(entry.periods),
+        version=entry.version,
+        fetched_at=entry.fetched_at,
+        expires_at=entry.expires_at,
+        stale=stale,
+    )
+
+
+def _cache_stored_forecast(gridpoint : Gridpoint, entry) -> Forecast:
+    now = _utcnow()
+    stale = entry.expires_at <= now
+    forecast = _forecast_from_entry(entry, stale)
+
+    if stale:
+        weather_cache.forecasts.set(gridpoint, forecast, current_app.config["WEATHER_STALE_TTL"])
+        # only start the refresh once the stale copy is cached, so it can't overwrite the fresh one
+        _refresh_in_background(gridpoint)
+    else:
+        weather_cache.forecasts.set(gridpoint, forecast, (entry.expires_at - now).total_seconds())
+
+    return forecast
+
+
+def _load_stored_forecast(gridpoint : Gridpoint) -> Forecast | None:
+    entry = get_forecast_entry(*gridpoint)
+    if entry is None:
+        return None
+    return _cache_stored_forecast(gridpoint, entry)
+
+
+def _fetch_forecast(gridpoint : Gridpoint, force : bool = False) -> Forecast:
+    if not force:
+        forecast = weather_cache.forecasts.get(gridpoint)
+        if forecast is not None:
+            return forecast
+
+    entry = get_forecast_entry(*gridpoint)
+    if entry is not None and not force:
+        return _cache_stored_forecast(gridpoint, entry)
+
+    # Revalidate what we have instead of downloading it again
+    headers = dict(NWS_HEADERS)
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+    forecast_res = http_client.get(forecast_url(gridpoint), headers=headers)
+
+    ttl = ttl_from_headers(
+        forecast_res.headers,
+        default=current_app.config["WEATHER_FORECAST_TTL"],
+        maximum=current_app.config["WEATHER_FORECAST_MAX_TTL"],
+        minimum=current_app.config["WEATHER_FORECAST_MIN_TTL"],
+    )
+
+    if forecast_res.status_code == 304 and entry is not None:
+        expires_at = _utcnow() + timedelta(seconds=ttl)
+        forecast = _forecast_from_entry(entry, stale=False)._replace(expires_at=expires_at)
+        weather_cache.forecasts.set(gridpoint, forecast, ttl)
+        extend_forecast_entry(*gridpoint, expires_at=expires_at)
+        return forecast
+
+    if forecast_res.status_code != 200:
+        raise NWSError("NWS forecast fetch failed", forecast_res.status_code, forecast_res.text)
+
+    forecast_data = forecast_res.json()
+    properties = forecast_data["properties"]
+    fetched_at = _utcnow()
+    forecast = Forecast(
+        periods=simplify_periods(properties["periods"]),
+        version=properties.get("updateTime") or properties.get("generatedAt") or "",
+        fetched_at=fetched_at,
+        expires_at=fetched_at + timedelta(seconds=ttl),
+    )
+
+    # The forecast's geometry is the grid cell itself; remembering it lets
+    # any other coordinate inside the cell skip the /points lookup
+    polygon = None
+    geometry = forecast_data.get("geometry") or {}
+    if geometry.get("type") == "Polygon" and geometry.get("coordinates"):
+        polygon = geometry["coordinates"]
+        weather_cache.grid.add(gridpoint, polygon)
+
+    weather_cache.forecasts.set(gridpoint, forecast, ttl)
+
+    save_forecast_entry(
+        *gridpoint,
+        periods=json.dumps(forecast.periods),
+        version=forecast.version,
+        polygon=json.dumps(polygon) if polygon is not None else None,
+        fetched_at=forecast.fetched_at,
+        expires_at=forecast.expires_at,
+        etag=forecast_res.headers.get("ETag"),
+        last_modified=forecast_res.headers.get("Last-Modified"),
+    )
+    return forecast
+
+
+def get_forecast(
+    lat : float,
+    lon : float
+) -> Forecast:
+    """Returns the simplified forecast for a coordinate
+
+    Raises NWSError, KeyError or requests.RequestException on failure"""
+
+    return get_gridpoint_forecast(get_gridpoint(lat, lon))
+
+
+def get_cached_forecast(
+    lat : float,
+    lon : float
+) -> Forecast | None:
+    """Returns the forecast for a coordinate only if it is already cached
+
+    Never waits on NWS, so it is safe to use while rendering a page.
+    A stale stored forecast is returned and refreshed in the background."""
+
+    gridpoint = get_cached_gridpoint(lat, lon)
+    if gridpoint is None:
+        return None
+
+    forecast = weather_cache.forecasts.get(gridpoint)
+    if forecast is None:
+        forecast = _load_stored_forecast(gridpoint)
+    return forecast
+
+
+def _forecast_or_error(app, lat : float, lon : float) -> Forecast | str:
+    # runs on a worker thread, so it needs its own app context
+    with app.app_context():
+        try:
+            return get_forecast(lat, lon)
+        except NWSError as e:
+            return e.message
+        except KeyError:
+            return "Unexpected NWS response format"
+        except requests.RequestException as e:
+            return f"Error contacting NWS API: {e}"
+
+
+def get_forecasts(
+    coords : list[tuple[float, float]]
+) -> dict[tuple[float, float], Forecast | str]:
+    """Returns forecasts for many coordinates at once
+
+    Results are keyed by the coordinate rounded to 4 decimal places.
+    Cached forecasts are returned directly; the rest are fetched on a
+    bounded thread pool, where single-flight coalescing makes coordinates
+    in the same gridpoint share one upstream request. A coordinate whose
+    fetch failed maps to an error message instead of a Forecast."""
+
+    results = {}
+    missing = []
+    for lat, lon in coords:
+        key = (round(lat, 4), round(lon, 4))
+        if key in results or key in missing:
+            continue
+
+        forecast = get_cached_forecast(*key)
+        if forecast is not None:
+            results[key] = forecast
+        else:
+            missing.append(key)
+
+    if missing:
+        app = current_app._get_current_object()
+        workers = min(current_app.config["WEATHER_BATCH_WORKERS"], len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = pool.map(lambda key: _forecast_or_error(app, *key), missing)
+            results.update(zip(missing, fetched))
+
+    return results
+
+
+# fields kept for each period in compact responses
+COMPACT_FIELDS = (
+    "name",
+    "startTime",
+    "isDaytime",
+    "temperature",
+    "temperatureUnit",
+    "windSpeed",
+    "windDirection",
+    "shortForecast",
+)
+
+
+def compact_period(
+    period : dict
+) -> dict:
+    """Drops the long text fields from a simplified period"""
+
+    return {field: period.get(field) for field in COMPACT_FIELDS}
+
+
+def filter_periods(
+    periods : list[dict],
+    start_date : date,
+    end_date : date
+) -> list[dict]:
+    """Keeps only the periods that start between start_date and end_date"""
+
+    return [p for p in periods if (day := period_date(p)) is not None and start_date <= day <= end_date]
+
+
+def daily_forecast(
+    periods : list[dict],
+    start_date : date | None = None,
+    end_date : date | None = None
+) -> list[dict]:
+    """One entry per day, holding that day's best period in compact form
+
+    The best period is the first daytime one, or the day's first period
+    if it has no daytime period. Without start/end the days are the ones
+    the forecast covers; with them, every date in the window is listed
+    and days beyond the forecast get a period of None."""
+
+    by_date = group_periods_by_date(periods)
+    days = trip_dates(start_date, end_date) if start_date and end_date else sorted(by_date)
+
+    daily = []
+    for day in days:
+        day_periods = by_date.get(day, [])
+        best = next((p for p in day_periods if p.get("isDaytime") is True), None)
+        if best is None and day_periods:
+            best = day_periods[0]
+
+        daily.append(
+            {
+                "date": day.isoformat(),
+                "period": compact_period(best) if best else None,
+            }
+        )
+
+    return daily
+
+
+def forecast_etag(
+    forecast : Forecast
+) -> str:
+    """ETag for a /weather response built from this forecast
+
+    Derived from the forecast's identity and the query string rather
+    than the response body, so a 304 can be sent without serializing"""
+
+    key = f"{forecast.version}|{forecast.fetched_at}|{forecast.stale}|{request.query_string.decode()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def cache_for(
+    response,
+    forecast : Forecast,
+    etag : str
+):
+    """Adds ETag and Cache-Control to a response built from a forecast
+
+    Browsers may reuse it until the forecast expires; stale forecasts
+    must be revalidated on every use since a refresh is under way."""
+
+    max_age = 0
+    if forecast.expires_at is not None and not forecast.stale:
+        max_age = max(0, int((forecast.expires_at - _utcnow()).total_seconds()))
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
 @bp.route("/weather", methods=["GET"])
 def weather():
     """
     Example: /weather?lat=35.2271&lon=-80.8431
+
+    Optional start/end (YYYY-MM-DD) keep only periods on those dates.
+    compact=1 returns one small entry per day instead of raw periods.
     """
 
     # latitude and longitude from query parameters
@@ -24,63 +470,133 @@ def weather():
     if lat is None or lon is None:
         return jsonify({"error": "lat and lon query parameters are required"}), 400
 
+    # optional trip window
+    start_str = request.args.get("start")
+    end_str = request.args.get("end")
+    compact = request.args.get("compact", "").lower() in ("1", "true", "yes")
+
+    if bool(start_str) != bool(end_str):
+        return jsonify({"error": "start and end must be given together"}), 400
+
+    start_date = end_date = None
+    if start_str:
+        try:
+            start_date = date.fromisoformat(start_str)
+            end_date = date.fromisoformat(end_str)
+        except ValueError:
+            return jsonify({"error": "start and end must be YYYY-MM-DD dates"}), 400
+
+        if end_date < start_date:
+            return jsonify({"error": "end must not be before start"}), 400
+
     try:
-        # 1) Look up the grid point from NWS
-        points_url = f"https://api.weather.gov/points/{lat},{lon}"
-        points_res = requests.get(points_url, headers=NWS_HEADERS, timeout=10)
-
-        if points_res.status_code != 200:
-            return jsonify(
-                {
-                    "error": "NWS points lookup failed",
-                    "details": points_res.text,
-                }
-            ), points_res.status_code
-
-        points_data = points_res.json()
-        forecast_url = points_data["properties"]["forecast"]
-
-        # 2) Fetch forecast for that gridpoint
-        forecast_res = requests.get(forecast_url, headers=NWS_HEADERS, timeout=10)
-        if forecast_res.status_code != 200:
-            return jsonify(
-                {
-                    "error": "NWS forecast fetch failed",
-                    "details": forecast_res.text,
-                }
-            ), forecast_res.status_code
-
-        forecast_data = forecast_res.json()
-        periods = forecast_data["properties"]["periods"]
-
-        # 3) Simplify periods down to fields you care about
-        simplified = [
-            {
-                "name": p.get("name"),
-                "startTime": p.get("startTime"),
-                "endTime": p.get("endTime"),
-                "isDaytime": p.get("isDaytime"),
-                "temperature": p.get("temperature"),
-                "temperatureUnit": p.get("temperatureUnit"),
-                "windSpeed": p.get("windSpeed"),
-                "windDirection": p.get("windDirection"),
-                "shortForecast": p.get("shortForecast"),
-                "detailedForecast": p.get("detailedForecast"),
-            }
-            for p in periods
-        ]
+        forecast = get_forecast(lat, lon)
+
+        etag = forecast_etag(forecast)
+        if request.if_none_match.contains(etag):
+            return cache_for(current_app.response_class(status=304), forecast, etag)
+
+        body = {
+            "lat": lat,
+            "lon": lon,
+            "stale": forecast.stale,
+        }
+
+        if compact:
+            body["days"] = daily_forecast(forecast.periods, start_date, end_date)
 
+            # Trip is beyond the forecast range: send the next few periods to show instead
+            if not any(day["period"] for day in body["days"]):
+                body["upcoming"] = [compact_period(p) for p in forecast.periods[:5]]
+        elif start_date:
+            body["forecast"] = filter_periods(forecast.periods, start_date, end_date)
+        else:
+            body["forecast"] = forecast.periods
+
+        return cache_for(jsonify(body), forecast, etag)
+
+    except NWSError as e:
         return jsonify(
             {
-                "lat": lat,
-                "lon": lon,
-                "forecast": simplified,
+                "error": e.message,
+                "details": e.details,
             }
-        )
-
+        ), e.status_code
     except KeyError:
         # If NWS changes their response format or something is missing
         return jsonify({"error": "Unexpected NWS response format"}), 500
     except requests.RequestException as e:
         # Network / HTTP errors
         return jsonify({"error": f"Error contacting NWS API: {e}"}), 502
+
+
+@bp.route("/weather/batch", methods=["POST"])
+def weather_batch():
+    """
+    Example body: {"trip_ids": [1, 2]} or {"points": [{"lat": 35.2271, "lon": -80.8431}]}
+
+    trip_ids requires a logged in user and skips trips they can't view
+    """
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    trip_ids = body.get("trip_ids") or []
+    points = body.get("points") or []
+
+    if not isinstance(trip_ids, list) or not isinstance(points, list):
+        return jsonify({"error": "trip_ids and points must be lists"}), 400
+
+    if len(trip_ids) + len(points) > current_app.config["WEATHER_BATCH_MAX_ITEMS"]:
+        return jsonify({"error": "Too many items in one batch"}), 400
+
+    # (fields identifying the item, lat, lon) for every requested item
+    items = []
+
+    if trip_ids:
+        if not current_user.is_authenticated:
+            return jsonify({"error": "Log in to look up trips"}), 401
+
+        try:
+            trip_ids = [int(trip_id) for trip_id in trip_ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "trip_ids must be integers"}), 400
+
+        for trip in get_viewable_trips(current_user.id, trip_ids):
+            items.append(({"trip_id": trip.id}, trip.lat, trip.lon))
+
+    for point in points:
+        try:
+            items.append(({}, float(point["lat"]), float(point["lon"])))
+        except (TypeError, KeyError, ValueError):
+            return jsonify({"error": "Each point needs numeric lat and lon"}), 400
+
+    forecasts = get_forecasts([(lat, lon) for _, lat, lon in items if lat is not None and lon is not None])
+
+    results = []
+    for fields, lat, lon in items:
+        result = dict(fields, lat=lat, lon=lon)
+
+        if lat is None or lon is None:
+            result["error"] = "No coordinates for this trip"
+        else:
+            forecast = forecasts[(round(lat, 4), round(lon, 4))]
+            if isinstance(forecast, Forecast):
+                result["forecast"] = forecast.periods
+            else:
+                result["error"] = forecast
+
+        results.append(result)
+
+    return jsonify({"results": results})
+
+
+@bp.cli.command("prefetch")
+def prefetch_command():
+    """Warm the forecast cache for trips starting soon"""
+
+    from .prefetch import prefetch_upcoming_forecasts
+
+    summary = prefetch_upcoming_forecasts()
+    print(", ".join(f"{k}={v}" for k, v in summary.items()))
@@ -0,0 +1,166 @@
+# SQLite concurrency benchmark: default config vs the production profile
+#
+# Runs the app in several worker processes, like gunicorn would, all sharing
+# one SQLite file. Writer processes save pack list changes (PATCH
+# /trips/<id>/pack-list) while reader processes load trip pages
+# (GET /trips/<id>). Each profile gets a fresh database, and the report shows
+# throughput, latency and failed requests ("database is locked") per role.
+#
+#   python benchmarks/bench_db_concurrency.py --readers 6 --writers 2 --seconds 10
+#
+# Put --dir on a real disk rather than tmpfs to see the cost of the fsyncs
+# that synchronous=NORMAL saves.
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(1, ROOT)  # the repo root, for GearGuide
+from bench_routes import BENCH_USER, percentile  # noqa: E402
+
+ITEMS_PER_TRIP = 30
+
+
+def setup_database(db_path : str, profile : str, trips : int) -> list[int]:
+    """Creates the schema, the bench user and their trips; returns the trip ids"""
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from GearGuide import create_app, db
+    from GearGuide.database import add_user, add_pack_items, get_user_by_username
+    from GearGuide.models import Trip
+
+    app = create_app(profile)
+    with app.app_context():
+        db.create_all()
+        add_user(BENCH_USER["username"], BENCH_USER["email"], BENCH_USER["password"])
+        host_id = get_user_by_username(BENCH_USER["username"]).id
+
+        start = date.today() + timedelta(days=7)
+        trip_ids = []
+        for i in range(trips):
+            trip = Trip(
+                host_id=host_id, name=f"Bench trip {i}", destination="Bench destination",
+                lat=37.0, lon=-119.0, start_date=start, end_date=start + timedelta(days=3),
+            )
+            db.session.add(trip)
+            db.session.commit()
+            trip_ids.append(trip.id)
+            add_pack_items(trip.id, [f"Item {n}" for n in range(ITEMS_PER_TRIP)])
+        db.engine.dispose()
+    return trip_ids
+
+
+def worker(role : str, index : int, db_path : str, profile : str, trip_ids : list[int], seconds : float, results) -> None:
+    """One app process hitting its route until the deadline"""
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from GearGuide import create_app
+
+    app = create_app(profile)
+    # failed requests are counted, not printed
+    app.logger.setLevel(logging.CRITICAL)
+    client = app.test_client()
+    client.post("/login", data={"email": BENCH_USER["email"], "password": BENCH_USER["password"]})
+
+    # writers each own one trip; readers go round all of them
+    own_trip_id = trip_ids[index % len(trip_ids)]
+    item_ids = []
+    if role == "writer":
+        item_ids = [item["id"] for item in client.patch(f"/trips/{own_trip_id}/pack-list", json={}).get_json()["items"]]
+
+    latencies, errors = [], 0
+    packed, extra_id = False, None
+    deadline = time.monotonic() + seconds
+    n = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == "writer":
+                # flip every item, add one and remove the one added last time
+                packed = not packed
+                name = f"Extra {index}-{n}"
+                body = {"packed" if packed else "unpacked": item_ids, "added": [name]}
+                if extra_id is not None:
+                    body["removed"] = [extra_id]
+                res = client.patch(f"/trips/{own_trip_id}/pack-list", json=body)
+                ok = res.status_code == 200
+                if ok:
+                    extra_id = next(item["id"] for item in res.get_json()["items"] if item["name"] == name)
+            else:
+                res = client.get(f"/trips/{trip_ids[n % len(trip_ids)]}")
+                ok = res.status_code == 200
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+        n += 1
+
+    results.put((role, latencies, errors))
+
+
+def run_profile(profile : str, args) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="gearguide-conc-", dir=args.dir), "bench.db")
+
+    # Config reads DATABASE_URL when GearGuide is imported, so every process
+    # that touches the app, setup included, is a fresh one
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        trip_ids = pool.apply(setup_database, (db_path, profile, max(args.writers, 1)))
+
+    results = ctx.Queue()
+    roles = ["writer"] * args.writers + ["reader"] * args.readers
+    procs = [
+        ctx.Process(target=worker, args=(role, i, db_path, profile, trip_ids, args.seconds, results))
+        for i, role in enumerate(roles)
+    ]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    report = {}
+    for role in ("writer", "reader"):
+        latencies = sorted(l for r, ls, _ in collected if r == role for l in ls)
+        report[role] = {
+            "requests": len(latencies),
+            "errors": sum(e for r, _, e in collected if r == role),
+            "throughput": len(latencies) / args.seconds,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite concurrency under the default and production configs")
+    parser.add_argument("--readers", type=int, default=6, help="reader processes")
+    parser.add_argument("--writers", type=int, default=2, help="writer processes")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    parser.add_argument("--dir", default=None, help="where to put the database (default: the temp dir)")
+    args = parser.parse_args()
+
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+    print(f"{args.writers} writer and {args.readers} reader processes for {args.seconds:g}s per profile")
+    print(f"{'profile':<12}{'role':<8}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for profile in args.profiles:
+        for role, r in run_profile(profile, args).items():
+            print(
+                f"{profile:<12}{role:<8}{r['requests']:>7}{r['errors']:>8}{r['throughput']:>9.1f}"
+                f"{ms(r['p50']):>9}{ms(r['p95']):>9}{ms(r['p99']):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# load benchmark for /weather and /create-trip against the local stub
+#
+# Starts the NWS/Nominatim stub and the app in this process (each on its own
+# threaded server, on a throwaway SQLite database), then drives both routes
+# over real HTTP and reports throughput and p50/p95/p99 latency per route.
+#
+#   python benchmarks/bench_routes.py --concurrency 16 --requests 2000 --latency-ms 80
+#
+# Pass --app-url to benchmark an app that is already running instead (it must
+# be configured with NWS_BASE_URL/NOMINATIM_BASE_URL pointing at a stub).
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(1, os.path.dirname(HERE))  # the repo root, for GearGuide
+from stub_server import StubServer  # noqa: E402
+
+BENCH_USER = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+
+# destinations fall inside a small box so /weather sees the mix of cache
+# hits and misses a real user base would produce
+LAT_RANGE = (36.5, 38.5)
+LON_RANGE = (-120.5, -118.5)
+
+
+def percentile(sorted_values : list, p : float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))
+    return sorted_values[index]
+
+
+class RouteStats:
+    """Latencies and error count for one route"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed : float, ok : bool) -> None:
+        with self._lock:
+            self.latencies.append(elapsed)
+            if not ok:
+                self.errors += 1
+
+    def report(self, wall : float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput": len(latencies) / wall if wall else 0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+
+
+def start_app(stub_url : str) -> tuple[str, object]:
+    """Creates the app on a temporary SQLite database and serves it on a thread
+
+    Config is read from the environment when GearGuide is imported, so the
+    environment is set up first."""
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="gearguide-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["NWS_BASE_URL"] = stub_url
+    os.environ["NOMINATIM_BASE_URL"] = stub_url
+    os.environ.setdefault("WEATHER_PREFETCH_EVERY", "0")
+
+    from werkzeug.serving import make_server
+    from GearGuide import create_app, db
+    from GearGuide.database import add_user
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        add_user(BENCH_USER["username"], BENCH_USER["email"], BENCH_USER["password"])
+
+    # one access log line per request would swamp the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="gearguide-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def login_session(app_url : str) -> requests.Session:
+    session = requests.Session()
+    res = session.post(
+        f"{app_url}/login",
+        data={"email": BENCH_USER["email"], "password": BENCH_USER["password"]},
+        allow_redirects=False,
+    )
+    if res.status_code != 302 or "/login" in res.headers.get("Location", ""):
+        raise SystemExit(f"Could not log in as {BENCH_USER['email']}")
+    return session
+
+
+def hit_weather(session : requests.Session, app_url : str, rng : random.Random) -> bool:
+    lat = round(rng.uniform(*LAT_RANGE), 4)
+    lon = round(rng.uniform(*LON_RANGE), 4)
+    params = {"lat": lat, "lon": lon}
+    if rng.random() < 0.5:
+        start = date.today() + timedelta(days=rng.randint(0, 4))
+        params.update(compact=1, start=start.isoformat(), end=(start + timedelta(days=2)).isoformat())
+    res = session.get(f"{app_url}/weather", params=params)
+    return res.status_code == 200
+
+
+def hit_create_trip(session : requests.Session, app_url : str, rng : random.Random) -> bool:
+    start = date.today() + timedelta(days=rng.randint(0, 30))
+    res = session.post(
+        f"{app_url}/create-trip",
+        data={
+            "name": f"Bench trip {uuid.uuid4().hex[:8]}",
+            # a small pool of destinations, so repeats are common like in real use
+            "destination": f"Bench destination {rng.randint(1, 200)}",
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.randint(0, 5))).isoformat(),
+            "activities": rng.sample(["Hiking", "Camping", "Fishing", "Biking"], 2),
+            "notes": "",
+        },
+        allow_redirects=False,
+    )
+    # success redirects to the trip list, failures back to the form
+    return res.status_code == 302 and "/create-trip" not in res.headers.get("Location", "")
+
+
+ROUTES = {
+    "/weather": hit_weather,
+    "/create-trip": hit_create_trip,
+}
+
+
+def run_route(app_url : str, route : str, concurrency : int, total : int, seed : int) -> dict:
+    hit = ROUTES[route]
+    stats = RouteStats()
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = login_session(app_url)
+            local.rng = random.Random(seed + i)
+        start = time.perf_counter()
+        try:
+            ok = hit(local.session, app_url, local.rng)
+        except requests.RequestException:
+            ok = False
+        stats.record(time.perf_counter() - start, ok)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return stats.report(time.perf_counter() - wall_start)
+
+
+def print_report(results : dict) -> None:
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+    print(f"{'route':<14}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in results.items():
+        print(
+            f"{route:<14}{r['requests']:>7}{r['errors']:>8}{r['throughput']:>9.1f}"
+            f"{ms(r['p50']):>9}{ms(r['p95']):>9}{ms(r['p99']):>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /weather and /create-trip against the NWS/Nominatim stub")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--latency-ms", type=float, default=50, help="stub base latency")
+    parser.add_argument("--jitter-ms", type=float, default=25, help="stub latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of stub responses that are 503s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--app-url", default=None, help="benchmark an already running app instead")
+    args = parser.parse_args()
+
+    stub = None
+    if args.app_url:
+        app_url = args.app_url.rstrip("/")
+    else:
+        stub = StubServer(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate, seed=args.seed,
+        ).start()
+        app_url, _ = start_app(stub.url)
+
+    print(f"{args.requests} requests per route at concurrency {args.concurrency} against {app_url}")
+    results = {}
+    for route in args.routes:
+        results[route] = run_route(app_url, route, args.concurrency, args.requests, args.seed)
+    print_report(results)
+
+    if stub is not None:
+        upstream = requests.get(f"{stub.url}/_stats").json()
+        print("upstream calls:", ", ".join(f"{k}={v}" for k, v in upstream.items()))
+
+
+if __name__ == "__main__":
+    main()
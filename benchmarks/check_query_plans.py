@@ -0,0 +1,288 @@
+# query plan and query budget regression check for database.py and routes.py
+#
+# Migrates a throwaway SQLite database to head (so the indexes under test are
+# the ones the migrations create), seeds it, then calls the database.py
+# helpers and GETs the main pages while recording every statement the app
+# sends. Each statement is run through EXPLAIN QUERY PLAN, and the check
+# fails if any of them reads a whole table instead of using an index. Each
+# page must also stay within its query budget (see ROUTE_BUDGETS).
+#
+#   python benchmarks/check_query_plans.py [--verbose]
+#
+# Exits 1 if a plan contains a full table scan or a page is over budget. The
+# test suite runs the same checks (tests/test_query_plans.py and
+# tests/test_query_budgets.py); this script prints the plans for humans.
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(1, ROOT)  # the repo root, for GearGuide
+from stub_server import StubServer  # noqa: E402
+
+# "SCAN trips" is a full table scan; "SCAN trips USING INDEX ..." walks an
+# index (e.g. a partial one) and "SEARCH ..." is a lookup
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+PASSWORD = "check-password"
+
+
+class StatementLog:
+    """Statements the app sent, minus the ones expected to read everything"""
+
+    def __init__(self):
+        self.statements = {}
+        self.allow_scan = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if executemany or verb not in ("SELECT", "UPDATE", "DELETE"):
+            return
+        if statement not in self.statements:
+            self.statements[statement] = (parameters, self.allow_scan)
+
+    @contextmanager
+    def scans_allowed(self):
+        # for helpers whose job is to read a whole table
+        self.allow_scan = True
+        try:
+            yield
+        finally:
+            self.allow_scan = False
+
+
+def seed(db, users : int = 50) -> dict:
+    """Users who host trips, invite each other and are friends in a ring"""
+
+    from GearGuide.database import (
+        add_user,
+        get_user_by_username,
+        invite_user_to_trip,
+        send_friend_request,
+        accept_friend_request,
+        add_pack_item,
+        save_geocode_entry,
+        save_forecast_entry,
+    )
+    from GearGuide.models import Trip
+
+    ids = []
+    for i in range(users):
+        add_user(f"user{i}", f"user{i}@example.com", PASSWORD)
+        ids.append(get_user_by_username(f"user{i}").id)
+
+    start = date.today() + timedelta(days=7)
+    trip_ids = []
+    for i, user_id in enumerate(ids):
+        trip = Trip(
+            host_id=user_id, name=f"Trip {i}", destination=f"Place {i}",
+            lat=37.0 + i / 100, lon=-119.0, start_date=start, end_date=start + timedelta(days=2),
+            activities="Hiking,Camping",
+        )
+        db.session.add(trip)
+        db.session.commit()
+        trip_ids.append(trip.id)
+        add_pack_item(trip.id, "Water")
+
+    for i, user_id in enumerate(ids):
+        friend = ids[(i + 1) % len(ids)]
+        send_friend_request(user_id, friend)
+        if i % 2 == 0:
+            accept_friend_request(user_id, friend)
+        invite_user_to_trip(friend, trip_ids[i])
+        save_geocode_entry(f"place {i}", 37.0, -119.0, f"Place {i}")
+
+    now = datetime.now(timezone.utc)
+    save_forecast_entry("TST", 1, 1, "[]", "v1", None, now, now + timedelta(hours=1))
+    return {"user_ids": ids, "trip_ids": trip_ids}
+
+
+def exercise_helpers(log : StatementLog, seeded : dict) -> None:
+    """Calls every read/update helper in database.py once"""
+
+    from GearGuide import database as d
+
+    user_id, other_id = seeded["user_ids"][:2]
+    trip_id = seeded["trip_ids"][0]
+    trip = d.get_trip(trip_id)
+
+    d.get_user_by_username("user0")
+    d.get_user_profile(user_id)
+    d.is_trip_member(other_id, trip)
+    d.load_trip_view(trip_id, user_id)
+    d.get_viewable_trips(user_id, seeded["trip_ids"][:5])
+    # first pages, then pages after a cursor, which adds the keyset predicate
+    trip_cursor = d.encode_cursor((date.today(), 0))
+    user_cursor = d.encode_cursor(("", 0))
+    for cursor in (None, trip_cursor):
+        d.get_hosted_trips_page(user_id, cursor)
+        d.get_users_trips_page(user_id, cursor)
+        d.get_pending_trip_invites_page(other_id, cursor)
+    for cursor in (None, user_cursor):
+        d.get_users_friends_page(user_id, cursor)
+        d.get_pending_friend_requests_page(other_id, cursor)
+    d.get_users_invited(trip_id)
+    d.get_trips_invited(user_id)
+    d.get_users_friends(user_id)
+    d.get_users_by_ids(seeded["user_ids"][:5])
+    d.send_friend_request(user_id, seeded["user_ids"][5])
+    d.accept_friend_request(user_id, seeded["user_ids"][5])
+    d.remove_friend(user_id, seeded["user_ids"][5])
+    d.block_user(user_id, seeded["user_ids"][9])
+    d.invite_user_to_trip(seeded["user_ids"][7], trip_id)
+    items = d.get_pack_list(trip_id)
+    d.update_pack_item_status(items[0].id, True)
+    d.add_pack_item(trip_id, "Snacks")
+    d.remove_pack_item(d.get_pack_list(trip_id)[-1].id)
+    d.add_pack_items(trip_id, ["Tent", "Stove"])
+    items = d.get_pack_list(trip_id)
+    d.sync_pack_list(trip_id, packed=[items[0].id], unpacked=[items[-1].id], added=["Map"], removed=[items[1].id])
+    d.get_forecast_entry("TST", 1, 1)
+    d.extend_forecast_entry("TST", 1, 1, datetime.now(timezone.utc) + timedelta(hours=2))
+    d.get_geocode_entry("place 1")
+    d.record_geocode_hit("place 1")
+    d.get_geocode_labels(100)
+    d.create_rate_limit_bucket("check", 1.0, 0.0)
+    tokens, updated_at = d.get_rate_limit_bucket("check")
+    d.swap_rate_limit_tokens("check", updated_at, tokens - 1, updated_at + 1)
+    d.get_pending_geocode_trip_ids()
+    d.claim_trip_geocode(trip_id, 0)
+    d.set_trip_location(trip_id, 37.0, -119.0, "DONE")
+
+    with log.scans_allowed():
+        # rebuilds the gridpoint index from every stored cell
+        d.get_forecast_polygons()
+        # build the social graph
+        d.get_friendship_pairs()
+        d.get_trip_memberships()
+
+
+# (path, most statements it may run) for the pages a logged in user visits
+# most. {trip_id} is a trip user1 hosts and {shared_trip_id} one they were
+# invited to. Budgets are per request for user1, including the login lookup.
+# They don't depend on how many trips, friends or items there are, so a page
+# that starts looping over rows blows its budget straight away.
+ROUTE_BUDGETS = [
+    ("/home", 1),
+    ("/trips", 4),
+    ("/friends", 4),
+    ("/account", 1),
+    ("/trips/{trip_id}", 6),
+    ("/trips/{shared_trip_id}", 5),
+    ("/trips/{trip_id}/suggestions", 5),  # first fetch also stores the forecast
+    ("/geocode/suggest?q=plac", 3),
+    ("/trips/list", 3),
+    ("/trips/invites", 2),
+    ("/friends/list", 2),
+    ("/friends/requests", 2),
+]
+
+
+def route_path(template : str, seeded : dict) -> str:
+    """A ROUTE_BUDGETS path with the seeded trip ids filled in"""
+    # user1 hosts trip 1 and is invited to user0's trip
+    return template.format(trip_id=seeded["trip_ids"][1], shared_trip_id=seeded["trip_ids"][0])
+
+
+def login(client) -> None:
+    """Logs the test client in as user1"""
+    res = client.post("/login", data={"email": "user1@example.com", "password": PASSWORD})
+    if res.status_code != 302:
+        raise RuntimeError("Could not log in as user1")
+
+
+def exercise_routes(app, seeded : dict) -> list[str]:
+    """GETs each page within its query budget; returns the budget failures"""
+
+    from GearGuide import sql_metrics
+    from GearGuide.sql_metrics import QueryBudgetExceeded
+
+    client = app.test_client()
+    login(client)
+
+    failures = []
+    for template, budget in ROUTE_BUDGETS:
+        path = route_path(template, seeded)
+        try:
+            with sql_metrics.query_budget(budget):
+                res = client.get(path)
+        except QueryBudgetExceeded as e:
+            failures.append(f"GET {path}: {e}")
+            continue
+        if res.status_code >= 500:
+            raise RuntimeError(f"GET {path} failed with {res.status_code}")
+    return failures
+
+
+def explain(db, statements : dict) -> list[tuple[str, list[str], bool]]:
+    """(statement, plan lines, full scan?) for every recorded statement"""
+
+    results = []
+    with db.engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        for statement, (parameters, allow_scan) in statements.items():
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [row[3] for row in cursor.fetchall()]
+            scans = [line for line in plan if FULL_SCAN.match(line)]
+            results.append((statement, plan, bool(scans) and not allow_scan))
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail if any app query plans a full table scan")
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not just the failures")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    stub = StubServer(latency_ms=0).start()
+    db_path = os.path.join(tempfile.mkdtemp(prefix="gearguide-plans-"), "plans.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["NWS_BASE_URL"] = stub.url
+    os.environ["NOMINATIM_BASE_URL"] = stub.url
+    os.environ.setdefault("WEATHER_PREFETCH_EVERY", "0")
+
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from GearGuide import create_app, db
+
+    app = create_app()
+    log = StatementLog()
+    try:
+        with app.app_context():
+            upgrade(directory=os.path.join(ROOT, "migrations"))
+            seeded = seed(db)
+
+            event.listen(db.engine, "before_cursor_execute", log)
+            exercise_helpers(log, seeded)
+            budget_failures = exercise_routes(app, seeded)
+            event.remove(db.engine, "before_cursor_execute", log)
+
+            results = explain(db, log.statements)
+    finally:
+        stub.stop()
+
+    failures = [r for r in results if r[2]]
+    for statement, plan, failed in results:
+        if failed or args.verbose:
+            print(("FULL SCAN" if failed else "ok") + ":")
+            print("  " + " ".join(statement.split()))
+            for line in plan:
+                print(f"    {line}")
+
+    for failure in budget_failures:
+        print(f"OVER BUDGET: {failure}")
+
+    print(f"{len(results)} statements checked, {len(failures)} with a full table scan")
+    print(f"{len(ROUTE_BUDGETS)} pages checked, {len(budget_failures)} over their query budget")
+    return 1 if failures or budget_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# local stand-in for the NWS and Nominatim APIs, for load tests
+#
+# Replays the recorded responses in benchmarks/fixtures/ so the app can be
+# driven hard without touching (or being rate limited by) the real APIs.
+#
+#   python benchmarks/stub_server.py --port 8089 --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+#
+# then point the app at it:
+#
+#   export NWS_BASE_URL=http://127.0.0.1:8089
+#   export NOMINATIM_BASE_URL=http://127.0.0.1:8089
+import argparse
+import copy
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# size of one stub gridpoint cell in degrees, roughly an NWS 2.5km cell
+CELL = 0.025
+
+
+def load_fixture(name : str):
+    with open(FIXTURES / f"{name}.json") as f:
+        return json.load(f)
+
+
+def cell_for(lat : float, lon : float) -> tuple[int, int]:
+    """Grid x/y of the stub cell containing a coordinate
+
+    Offset so they are never negative, like real NWS grid numbers"""
+    return math.floor((lon + 180) / CELL), math.floor((lat + 90) / CELL)
+
+
+def cell_polygon(x : int, y : int) -> list:
+    """GeoJSON polygon (lon, lat rings) covering a stub cell"""
+    west, south = x * CELL - 180, y * CELL - 90
+    east, north = west + CELL, south + CELL
+    return [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+
+
+def create_stub_app(
+    latency_ms : float = 0,
+    jitter_ms : float = 0,
+    error_rate : float = 0,
+    seed : int | None = None
+) -> Flask:
+    """Builds the stub app
+
+    Every response is delayed by latency_ms plus up to jitter_ms, and
+    error_rate of requests get a 503 instead of the recorded response."""
+
+    app = Flask(__name__)
+    points_fixture = load_fixture("points")
+    forecast_fixture = load_fixture("forecast")
+    search_fixture = load_fixture("nominatim_search")
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    counts = {"points": 0, "forecast": 0, "search": 0, "errors": 0, "not_modified": 0}
+    counts_lock = threading.Lock()
+
+    def count(key):
+        with counts_lock:
+            counts[key] += 1
+
+    @app.before_request
+    def simulate_upstream():
+        if request.path == "/_stats":
+            return None
+        with rng_lock:
+            delay = latency_ms + rng.uniform(0, jitter_ms)
+            fail = rng.random() < error_rate
+        time.sleep(delay / 1000)
+        if fail:
+            count("errors")
+            return jsonify({"title": "Service Unavailable", "status": 503}), 503
+        return None
+
+    @app.get("/points/<float(signed=True):lat>,<float(signed=True):lon>")
+    def points(lat, lon):
+        count("points")
+        x, y = cell_for(lat, lon)
+        base = request.host_url.rstrip("/")
+
+        body = copy.deepcopy(points_fixture)
+        props = body["properties"]
+        props["gridX"], props["gridY"] = x, y
+        props["forecast"] = f"{base}/gridpoints/{props['gridId']}/{x},{y}/forecast"
+        props["forecastHourly"] = props["forecast"] + "/hourly"
+        props["forecastGridData"] = f"{base}/gridpoints/{props['gridId']}/{x},{y}"
+        body["geometry"]["coordinates"] = [lon, lat]
+        return jsonify(body)
+
+    @app.get("/gridpoints/<office>/<int:x>,<int:y>/forecast")
+    def forecast(office, x, y):
+        # one forecast "issue" per hour, so ETags change like the real thing
+        now = datetime.now(timezone.utc)
+        issued = now.replace(minute=0, second=0, microsecond=0)
+        etag = '"' + hashlib.sha1(f"{office}/{x},{y}/{issued.isoformat()}".encode()).hexdigest() + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=900",
+            "Last-Modified": issued.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        }
+
+        if request.headers.get("If-None-Match") == etag:
+            count("not_modified")
+            return "", 304, headers
+
+        count("forecast")
+        body = copy.deepcopy(forecast_fixture)
+        body["geometry"]["coordinates"] = cell_polygon(x, y)
+
+        # rebase the recorded periods onto today so trip dates line up
+        periods = body["properties"]["periods"]
+        first = datetime.fromisoformat(periods[0]["startTime"])
+        shift = now.astimezone(first.tzinfo).replace(hour=first.hour, minute=0, second=0, microsecond=0) - first
+        for p in periods:
+            p["startTime"] = (datetime.fromisoformat(p["startTime"]) + shift).isoformat()
+            p["endTime"] = (datetime.fromisoformat(p["endTime"]) + shift).isoformat()
+        body["properties"]["generatedAt"] = issued.isoformat()
+        body["properties"]["updateTime"] = issued.isoformat()
+
+        return jsonify(body), 200, headers
+
+    @app.get("/search")
+    def search():
+        count("search")
+        query = request.args.get("q", "").strip()
+        if not query:
+            return jsonify([])
+
+        # spread destinations deterministically over the continental US
+        digest = hashlib.sha1(query.lower().encode()).digest()
+        lat = 30 + digest[0] / 255 * 17
+        lon = -122 + digest[1] / 255 * 44
+
+        body = copy.deepcopy(search_fixture)
+        body[0]["lat"] = f"{lat:.7f}"
+        body[0]["lon"] = f"{lon:.7f}"
+        body[0]["name"] = query
+        body[0]["display_name"] = query
+        return jsonify(body[: int(request.args.get("limit", 1))])
+
+    @app.get("/_stats")
+    def stats():
+        with counts_lock:
+            return jsonify(dict(counts))
+
+    return app
+
+
+class StubServer:
+    """Runs the stub app on a background thread, for use from other scripts"""
+
+    def __init__(self, host : str = "127.0.0.1", port : int = 0, **options):
+        self.server = make_server(host, port, create_stub_app(**options), threaded=True)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="nws-stub", daemon=True)
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local NWS/Nominatim stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0, help="base delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra random delay, 0 to this many ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with a 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    print(f"NWS/Nominatim stub listening on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Add the trips host and start date index where 9b5cdb99069a ran without it
+
+Revision ID: d7987cfe27f1
+Revises: b7d2136effca
+Create Date: 2026-10-18 16:59:32.576571
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7987cfe27f1'
+down_revision = 'b7d2136effca'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ix_trips_host_start is created by 9b5cdb99069a with the other listing
+    # indexes; this only adds it to databases that ran 9b5cdb99069a before it did
+    op.create_index('ix_trips_host_start', 'trips', ['host_id', 'start_date', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    # left for 9b5cdb99069a's downgrade to drop
+    pass
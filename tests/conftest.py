@@ -0,0 +1,48 @@
+# shared fixtures: one app on a throwaway SQLite database migrated to head
+import os
+import tempfile
+
+import pytest
+
+# Config reads the environment when GearGuide is imported
+_db_dir = tempfile.mkdtemp(prefix="gearguide-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'tests.db')}"
+os.environ["WEATHER_PREFETCH_EVERY"] = "0"
+os.environ.pop("GEARGUIDE_CONFIG", None)
+
+from flask_migrate import upgrade  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+from GearGuide import create_app, db  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def stub():
+    """The NWS/Nominatim stub from benchmarks/, so no test calls the real APIs"""
+    server = StubServer(latency_ms=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def app(stub):
+    """The app, migrated to head (so indexes are the ones the migrations create)"""
+    app = create_app()
+    app.config.update(NWS_BASE_URL=stub.url, NOMINATIM_BASE_URL=stub.url)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        yield app
+
+
+@pytest.fixture(scope="session")
+def seeded(app):
+    """user0..user49 with a trip each, friends and invites in a ring"""
+    from check_query_plans import seed
+    return seed(db)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
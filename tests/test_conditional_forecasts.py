@@ -0,0 +1,58 @@
+# conditional requests: NWS 304s extend the stored forecast, /weather sends 304s
+from datetime import timedelta
+
+import requests
+
+from GearGuide import db, weather_cache, weather_route
+from GearGuide.database import get_forecast_entry
+from GearGuide.weather_route import get_gridpoint, get_gridpoint_forecast, refresh_forecast
+
+LAT, LON = 44.0612, -121.3153
+
+
+def _stub_counts(stub):
+    return requests.get(f"{stub.url}/_stats").json()
+
+
+def test_not_modified_extends_the_cached_forecast(app, stub):
+    gridpoint = get_gridpoint(LAT, LON)
+    first = get_gridpoint_forecast(gridpoint)
+    entry = get_forecast_entry(*gridpoint)
+    assert entry.etag
+
+    # age it out, so the refresh has to revalidate with NWS
+    expired = weather_route._utcnow() - timedelta(minutes=1)
+    entry.expires_at = expired
+    db.session.commit()
+    weather_cache.forecasts.set(gridpoint, None, 0)
+    before = _stub_counts(stub)
+
+    forecast = refresh_forecast(gridpoint)
+
+    after = _stub_counts(stub)
+    assert after["not_modified"] == before["not_modified"] + 1
+    assert after["forecast"] == before["forecast"]
+
+    assert forecast.periods == first.periods
+    assert not forecast.stale
+    assert forecast.expires_at > weather_route._utcnow()
+    assert weather_cache.forecasts.get(gridpoint) == forecast
+
+    db.session.expire_all()
+    assert get_forecast_entry(*gridpoint).expires_at == forecast.expires_at
+
+
+def test_weather_answers_if_none_match_with_304(client):
+    url = f"/weather?lat={LAT}&lon={LON}&compact=1"
+    res = client.get(url)
+    assert res.status_code == 200
+    etag = res.headers["ETag"]
+
+    res = client.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+    assert not res.data
+
+    # a different query is a different representation
+    res = client.get(f"/weather?lat={LAT}&lon={LON}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
@@ -0,0 +1,47 @@
+# forecasts NWS marks uncacheable are still kept for WEATHER_FORECAST_MIN_TTL
+from datetime import timedelta
+
+import pytest
+
+from GearGuide import weather_cache, weather_route
+from GearGuide.database import get_forecast_entry
+from GearGuide.weather_cache import ttl_from_headers
+from GearGuide.weather_route import get_gridpoint, get_gridpoint_forecast
+
+LAT, LON = 47.6062, -122.3321
+
+
+@pytest.mark.parametrize("headers, ttl", [
+    ({"Cache-Control": "no-cache"}, 60),
+    ({"Cache-Control": "max-age=0"}, 60),
+    ({"Expires": "0"}, 60),
+    ({"Cache-Control": "max-age=300"}, 300),
+    ({"Cache-Control": "max-age=99999"}, 3600),
+    ({}, 900),
+])
+def test_ttl_is_clamped(headers, ttl):
+    assert ttl_from_headers(headers, default=900, maximum=3600, minimum=60) == ttl
+
+
+def test_no_cache_forecast_is_not_refetched_on_every_request(app, monkeypatch):
+    real_get = weather_route.http_client.get
+    forecast_calls = []
+
+    def no_cache_get(url, **kwargs):
+        response = real_get(url, **kwargs)
+        if url.endswith("/forecast"):
+            forecast_calls.append(url)
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    monkeypatch.setattr(weather_route.http_client, "get", no_cache_get)
+    gridpoint = get_gridpoint(LAT, LON)
+
+    first = get_gridpoint_forecast(gridpoint)
+    again = get_gridpoint_forecast(gridpoint)
+
+    assert len(forecast_calls) == 1
+    assert again == first and not again.stale
+    min_ttl = app.config["WEATHER_FORECAST_MIN_TTL"]
+    assert weather_cache.forecasts.ttl_remaining(gridpoint) > min_ttl - 5
+    assert get_forecast_entry(*gridpoint).expires_at > weather_route._utcnow() + timedelta(seconds=min_ttl - 5)
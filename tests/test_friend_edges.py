@@ -0,0 +1,103 @@
+# friend_edges mirror every friendships row in both directions
+import importlib.util
+import os
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from GearGuide import db
+from GearGuide.database import (
+    accept_friend_request,
+    add_user,
+    block_user,
+    get_pending_friend_requests_page,
+    get_user_by_username,
+    get_users_friends,
+    remove_friend,
+    send_friend_request,
+)
+from GearGuide.models import FriendEdge
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations", "versions", "b7d2136effca_add_friend_edges_table.py",
+)
+
+
+def _user(name):
+    add_user(name, f"{name}@example.com", f"{name}-password")
+    return get_user_by_username(name).id
+
+
+def _edges(a, b):
+    """{(user_id, friend_id): (status, outgoing)} for both directions of a pair"""
+    db.session.expire_all()
+    rows = FriendEdge.query.filter(FriendEdge.user_id.in_((a, b)), FriendEdge.friend_id.in_((a, b))).all()
+    return {(e.user_id, e.friend_id): (e.status, e.outgoing) for e in rows}
+
+
+def test_request_accept_and_remove_keep_both_edges_in_step(app):
+    alice, bob = _user("edge_alice"), _user("edge_bob")
+
+    assert send_friend_request(bob, alice)
+    assert _edges(alice, bob) == {
+        (bob, alice): ("PENDING", True),
+        (alice, bob): ("PENDING", False),
+    }
+    assert [u.id for u in get_pending_friend_requests_page(alice).items] == [bob]
+    assert get_pending_friend_requests_page(bob).items == []
+
+    accept_friend_request(alice, bob)
+    assert {status for status, _ in _edges(alice, bob).values()} == {"ACCEPTED"}
+    assert len(_edges(alice, bob)) == 2
+    assert [u.id for u in get_users_friends(alice)] == [bob]
+    assert [u.id for u in get_users_friends(bob)] == [alice]
+
+    remove_friend(bob, alice)
+    assert _edges(alice, bob) == {}
+    assert get_users_friends(alice) == []
+    assert get_users_friends(bob) == []
+
+
+def test_block_sets_both_edges(app):
+    carol, dave = _user("edge_carol"), _user("edge_dave")
+
+    assert block_user(dave, carol)
+    edges = _edges(carol, dave)
+    assert set(edges) == {(carol, dave), (dave, carol)}
+    assert {status for status, _ in edges.values()} == {"BLOCKED"}
+
+
+def test_migration_backfills_both_directions(tmp_path):
+    spec = importlib.util.spec_from_file_location("friend_edges_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE users (id INTEGER PRIMARY KEY)"))
+        conn.execute(sa.text(
+            "CREATE TABLE friendships (id INTEGER PRIMARY KEY, user1_id INTEGER, user2_id INTEGER, "
+            "status VARCHAR(20), initiator_id INTEGER)"
+        ))
+        conn.execute(sa.text("INSERT INTO users (id) VALUES (1), (2), (3), (4)"))
+        conn.execute(sa.text(
+            "INSERT INTO friendships (user1_id, user2_id, status, initiator_id) VALUES "
+            "(1, 2, 'ACCEPTED', 1), (1, 3, 'PENDING', 3), (2, 4, 'PENDING', NULL)"
+        ))
+
+        with Operations.context(MigrationContext.configure(conn)):
+            migration.upgrade()
+
+        rows = conn.execute(sa.text("SELECT user_id, friend_id, status, outgoing FROM friend_edges")).all()
+
+    assert {(u, f): (s, bool(o)) for u, f, s, o in rows} == {
+        (1, 2): ("ACCEPTED", True),
+        (2, 1): ("ACCEPTED", False),
+        (1, 3): ("PENDING", False),
+        (3, 1): ("PENDING", True),
+        # no initiator: outgoing on both sides, so neither sees an incoming request
+        (2, 4): ("PENDING", True),
+        (4, 2): ("PENDING", True),
+    }
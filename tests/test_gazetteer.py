@@ -0,0 +1,111 @@
+# the offline gazetteer only answers a geocode when the match is certain
+import importlib
+import os
+
+import pytest
+
+from GearGuide.gazetteer import Gazetteer
+
+# GearGuide.gazetteer is also the name of the app's Gazetteer instance
+gazetteer_module = importlib.import_module("GearGuide.gazetteer")
+
+PLACES = """name,lat,lon,kind,region
+Lake Tahoe,39.0968,-120.0324,lake,CA
+Lake Placid,44.2795,-73.9799,lake,NY
+Mesa Verde National Park,37.2309,-108.4618,national_park,CO
+Red River Gorge,37.8242,-83.6833,gorge,KY
+Moab,38.5733,-109.5498,town,UT
+"""
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    source = tmp_path / "places.csv"
+    source.write_text(PLACES, encoding="utf-8")
+    return Gazetteer(str(tmp_path / "places.idx"), str(source))
+
+
+@pytest.mark.parametrize("text, label", [
+    ("Lake Tahoe", "Lake Tahoe, CA"),
+    ("lake tahoe, ca", "Lake Tahoe, CA"),
+    ("Lake Tahoe, California", "Lake Tahoe, CA"),
+    ("Moab, UT, USA", "Moab, UT"),
+    ("Mesa Verde National Park", "Mesa Verde National Park, CO"),
+])
+def test_lookup_exact(gazetteer, text, label):
+    assert gazetteer.lookup(text).label == label
+
+
+@pytest.mark.parametrize("text", [
+    "Lake Placid, Florida",   # same name, other region
+    "Lake Tahoe, Nevada",
+    "Moab, Utah, France",
+    "Mesa",                   # prefix of one place
+    "Red River",
+    "Moabi",                  # one typo away
+])
+def test_lookup_not_sure(gazetteer, text):
+    assert gazetteer.lookup(text) is None
+
+
+def test_suggest_matching_is_kept(gazetteer):
+    assert [p.label for p in gazetteer.prefix("Mesa", 5)] == ["Mesa Verde National Park, CO"]
+    assert gazetteer.fuzzy("Moabi").label == "Moab, UT"
+
+
+def test_stats_count_lookups(gazetteer):
+    gazetteer.lookup("Moab")
+    gazetteer.lookup("Moabi")
+    assert gazetteer.stats() == {"entries": gazetteer.count, "hits": 1, "misses": 1}
+
+
+@pytest.mark.parametrize("content", [b"", b"GGZ", b"NOPE" + b"\0" * 64, b"GGZ1" + b"\xff" * 12],
+                         ids=["empty", "short", "foreign", "bad sizes"])
+def test_corrupt_index_disables_lookups_once(tmp_path, monkeypatch, content):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(content)
+    gazetteer = Gazetteer(str(path))
+
+    opened = []
+    real_mmap = gazetteer_module.mmap.mmap
+    monkeypatch.setattr(gazetteer_module.mmap, "mmap", lambda *a, **k: opened.append(1) or real_mmap(*a, **k))
+
+    assert gazetteer.lookup("Moab") is None
+    assert gazetteer.prefix("Moa", 5) == []
+    assert gazetteer.lookup("Lake Tahoe") is None
+    # not re-opened on every request
+    assert len(opened) <= 1
+
+
+def test_read_only_install_builds_in_the_fallback_path(tmp_path):
+    source = tmp_path / "places.csv"
+    source.write_text(PLACES, encoding="utf-8")
+    unwritable = str(tmp_path / "missing-dir" / "places.idx")
+    fallback = tmp_path / "instance" / "gazetteer.idx"
+
+    assert Gazetteer(unwritable, str(source), str(fallback)).lookup("Moab").label == "Moab, UT"
+    built_at = fallback.stat().st_mtime_ns
+
+    # up to date, so the next process maps it as is
+    assert Gazetteer(unwritable, str(source), str(fallback)).lookup("Moab").label == "Moab, UT"
+    assert fallback.stat().st_mtime_ns == built_at
+
+    # and a newer source rebuilds it
+    os.utime(source, ns=(built_at + 10**9, built_at + 10**9))
+    assert Gazetteer(unwritable, str(source), str(fallback)).lookup("Moab").label == "Moab, UT"
+    assert fallback.stat().st_mtime_ns != built_at
+
+
+def test_fuzzy_compares_few_names(tmp_path, monkeypatch):
+    source = tmp_path / "many.csv"
+    rows = [f"Lake Zone {'x' * (i % 20)}{i},40.0,-105.0,lake,CO" for i in range(2000)]
+    source.write_text("name,lat,lon,kind,region\nLake Tahoe,39.0968,-120.0324,lake,CA\n" + "\n".join(rows) + "\n")
+    gazetteer = Gazetteer(str(tmp_path / "many.idx"), str(source))
+
+    compared = []
+    real_distance = gazetteer_module._edit_distance
+    monkeypatch.setattr(gazetteer_module, "_edit_distance", lambda a, b, limit: compared.append(b) or real_distance(a, b, limit))
+
+    assert gazetteer.fuzzy("Lake Tahoo").label == "Lake Tahoe, CA"
+    assert len(compared) <= gazetteer_module.FUZZY_SCAN
+    assert all(abs(len(key) - len("lake tahoo")) <= 1 for key in compared)
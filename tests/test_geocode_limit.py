@@ -0,0 +1,55 @@
+# every Nominatim geocode goes through the shared rate limiter
+from datetime import date, timedelta
+
+import pytest
+
+from GearGuide import geocode
+from GearGuide.database import add_user
+from GearGuide.geocode import GEOCODE_PENDING, GeocodeRateLimited, geocode_destination
+from GearGuide.models import Trip
+
+
+class NoCapacity:
+    """A limiter with no tokens left that remembers how long it was asked to wait"""
+
+    def __init__(self):
+        self.waits = []
+
+    def acquire(self, timeout):
+        self.waits.append(timeout)
+        return False
+
+
+@pytest.fixture
+def no_capacity(monkeypatch):
+    limiter = NoCapacity()
+    monkeypatch.setattr(geocode, "nominatim_limiter", lambda: limiter)
+    return limiter
+
+
+def test_geocode_destination_waits_for_the_limiter_by_default(app, no_capacity):
+    with pytest.raises(GeocodeRateLimited):
+        geocode_destination("Limiter Default Test Place")
+    assert no_capacity.waits == [app.config["GEOCODE_LIMIT_WAIT"]]
+
+
+def test_create_trip_saves_pending_when_rate_limited(app, no_capacity):
+    add_user("creator", "creator@example.com", "creator-password")
+    client = app.test_client()
+    client.post("/login", data={"email": "creator@example.com", "password": "creator-password"})
+
+    start = date.today() + timedelta(days=3)
+    res = client.post("/create-trip", data={
+        "name": "Rate limited trip",
+        "destination": "Limiter Route Test Place",
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=1)).isoformat(),
+        "activities": ["Hiking"],
+        "notes": "",
+    })
+
+    assert res.status_code == 302
+    assert no_capacity.waits == [app.config["GEOCODE_LIMIT_WAIT"]]
+    trip = Trip.query.filter_by(name="Rate limited trip").one()
+    assert trip.geocode_status == GEOCODE_PENDING
+    assert trip.lat is None
@@ -0,0 +1,100 @@
+# the geocode worker never leaves a claimed trip PENDING with nothing queued
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from GearGuide import db, geocode_worker
+from GearGuide.database import add_user, get_user_by_username
+from GearGuide.geocode import GEOCODE_FAILED, GEOCODE_PENDING
+from GearGuide.geocode_worker import GeocodeWorker
+from GearGuide.models import Trip
+
+
+@pytest.fixture
+def worker(app, monkeypatch):
+    """A worker that records what it queues instead of running a thread"""
+
+    worker = GeocodeWorker()
+    worker.app = app
+    worker.max_attempts = 3
+    worker.queued = []
+    monkeypatch.setattr(worker, "enqueue", lambda trip_id, delay=0: worker.queued.append(trip_id))
+    return worker
+
+
+@pytest.fixture(scope="module")
+def host(app):
+    add_user("geoworker", "geoworker@example.com", "geoworker-password")
+    return get_user_by_username("geoworker").id
+
+
+def _pending_trip(host_id, name, attempts=0):
+    start = date.today() + timedelta(days=4)
+    trip = Trip(host_id=host_id, name=name, destination=f"{name} Place", start_date=start,
+                end_date=start + timedelta(days=1), geocode_status=GEOCODE_PENDING, geocode_attempts=attempts)
+    db.session.add(trip)
+    db.session.commit()
+    return trip.id
+
+
+def _trip(trip_id):
+    db.session.expire_all()
+    return db.session.get(Trip, trip_id)
+
+
+def _explode(*args, **kwargs):
+    raise RuntimeError("database went away")
+
+
+class _Result:
+    lat, lon = 40.0, -105.0
+
+
+def _fail_only_done(set_trip_location):
+    # saving the coordinates fails; marking the trip FAILED still works
+    def wrapped(trip_id, lat, lon, status):
+        if lat is not None:
+            raise RuntimeError("disk I/O error")
+        set_trip_location(trip_id, lat, lon, status)
+    return wrapped
+
+
+def test_unexpected_error_requeues_the_trip(worker, host, monkeypatch):
+    trip_id = _pending_trip(host, "Worker retry")
+    monkeypatch.setattr(geocode_worker, "geocode_destination", _explode)
+
+    worker.process(trip_id)
+
+    assert worker.queued == [trip_id]
+    trip = _trip(trip_id)
+    assert trip.geocode_status == GEOCODE_PENDING
+    assert trip.geocode_attempts == 1
+
+
+def test_unexpected_error_on_the_last_attempt_fails_the_trip(worker, host, monkeypatch):
+    trip_id = _pending_trip(host, "Worker give up", attempts=2)
+    monkeypatch.setattr(geocode_worker, "set_trip_location", _fail_only_done(geocode_worker.set_trip_location))
+    monkeypatch.setattr(geocode_worker, "geocode_destination", lambda *a, **k: _Result())
+
+    worker.process(trip_id)
+
+    assert worker.queued == []
+    assert _trip(trip_id).geocode_status == GEOCODE_FAILED
+
+
+def test_pending_trips_are_resumed_once(app, worker, monkeypatch):
+    monkeypatch.setattr(geocode_worker, "get_pending_geocode_trip_ids", lambda: [7, 8])
+    start = threading.Barrier(8)
+
+    def first_request():
+        start.wait()
+        worker._resume_pending()
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert worker.queued == [7, 8]
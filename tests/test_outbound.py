@@ -0,0 +1,112 @@
+# circuit breaker states and how OutboundClient.get feeds them
+import pytest
+import requests
+
+from GearGuide import outbound
+from GearGuide.outbound import CircuitBreaker, CircuitOpenError, OutboundClient
+
+
+class Clock:
+    """Stands in for time.monotonic so reset_timeout can pass instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(outbound.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_threshold_and_closes_after_a_good_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    # only one trial at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def _client(monkeypatch, results):
+    """An OutboundClient whose sessions answer with results, in order"""
+
+    client = OutboundClient()
+    client.retries = 0
+    client.breaker_threshold = 1
+    client.breaker_reset = 30
+
+    def fake_get(self, url, **kwargs):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        response = requests.Response()
+        response.status_code = result
+        return response
+
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    return client
+
+
+@pytest.mark.parametrize("error", [
+    requests.TooManyRedirects("loop"),
+    requests.exceptions.ChunkedEncodingError("cut off"),
+    requests.exceptions.InvalidURL("bad"),
+])
+def test_breaker_recovers_after_a_non_retryable_error_in_half_open(monkeypatch, clock, error):
+    client = _client(monkeypatch, [requests.ConnectionError("down"), error, 200])
+    url = "http://upstream.test/points"
+
+    with pytest.raises(requests.ConnectionError):
+        client.get(url)
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+
+    clock.now += 30
+    with pytest.raises(type(error)):
+        client.get(url)
+    assert client.stats()["upstream.test"]["circuit"] == "open"
+
+    # the failed trial must not leave the host locked out
+    clock.now += 30
+    assert client.get(url).status_code == 200
+    assert client.stats()["upstream.test"]["circuit"] == "closed"
+
+
+def test_retryable_status_counts_as_a_failure(monkeypatch, clock):
+    client = _client(monkeypatch, [503, 200])
+    url = "http://upstream.test/forecast"
+
+    assert client.get(url).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+    assert client.stats()["upstream.test"]["short_circuited"] == 1
@@ -0,0 +1,117 @@
+# pack list diffs applied by sync_pack_list and PATCH /trips/<id>/pack-list
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from GearGuide import db
+from GearGuide.database import MAX_BOUND_PARAMETERS, add_pack_items, add_user, get_pack_list, get_user_by_username, sync_pack_list
+from GearGuide.models import Trip
+
+PASSWORD = "packer-password"
+
+
+def _trip(host_id, name, items=()):
+    start = date.today() + timedelta(days=5)
+    trip = Trip(host_id=host_id, name=name, destination="Pack Test", lat=40.0, lon=-105.0,
+                start_date=start, end_date=start + timedelta(days=2))
+    db.session.add(trip)
+    db.session.commit()
+    add_pack_items(trip.id, list(items))
+    return trip.id
+
+
+def _items(trip_id):
+    db.session.expire_all()
+    return {item.name: bool(item.is_packed) for item in get_pack_list(trip_id)}
+
+
+def _ids(trip_id):
+    return {item.name: item.id for item in get_pack_list(trip_id)}
+
+
+@pytest.fixture(scope="module")
+def packer(app):
+    add_user("packer", "packer@example.com", PASSWORD)
+    return get_user_by_username("packer").id
+
+
+def test_applies_every_kind_of_change(packer):
+    trip_id = _trip(packer, "Sync all", ["Tent", "Stove", "Map", "Rope"])
+    ids = _ids(trip_id)
+
+    counts = sync_pack_list(
+        trip_id,
+        packed=[ids["Tent"], ids["Stove"]],
+        unpacked=[ids["Map"]],
+        added=["Headlamp", "Tent"],
+        removed=[ids["Rope"]],
+    )
+
+    # Map was never packed and Tent is already on the list
+    assert counts == {"packed": 2, "unpacked": 0, "added": 1, "removed": 1}
+    assert _items(trip_id) == {"Tent": True, "Stove": True, "Map": False, "Headlamp": False}
+
+
+def test_removed_wins_and_other_trips_are_untouched(packer):
+    trip_id = _trip(packer, "Sync mine", ["Tent", "Stove"])
+    other_id = _trip(packer, "Sync other", ["Tent"])
+    ids, other_ids = _ids(trip_id), _ids(other_id)
+
+    counts = sync_pack_list(
+        trip_id,
+        packed=[ids["Tent"], other_ids["Tent"]],
+        unpacked=[ids["Tent"]],
+        removed=[ids["Stove"], other_ids["Tent"]],
+    )
+
+    assert counts == {"packed": 1, "unpacked": 0, "added": 0, "removed": 1}
+    assert _items(trip_id) == {"Tent": True}
+    assert _items(other_id) == {"Tent": False}
+
+
+def test_patch_route_returns_the_new_list(app, packer):
+    trip_id = _trip(packer, "Sync route", ["Tent"])
+    tent = _ids(trip_id)["Tent"]
+    client = app.test_client()
+    client.post("/login", data={"email": "packer@example.com", "password": PASSWORD})
+
+    res = client.patch(f"/trips/{trip_id}/pack-list", json={"packed": [tent], "added": ["  Water  "]})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["changes"] == {"packed": 1, "unpacked": 0, "added": 1, "removed": 0}
+    assert [(i["name"], i["is_packed"]) for i in body["items"]] == [("Tent", True), ("Water", False)]
+
+    assert client.patch(f"/trips/{trip_id}/pack-list", json={"packed": ["Tent"]}).status_code == 400
+    assert client.patch(f"/trips/{trip_id}/pack-list", json=[tent]).status_code == 400
+
+
+def test_patch_route_hides_trips_the_user_is_not_on(app, packer):
+    trip_id = _trip(packer, "Sync private", ["Tent"])
+    add_user("outsider", "outsider@example.com", PASSWORD)
+    client = app.test_client()
+    client.post("/login", data={"email": "outsider@example.com", "password": PASSWORD})
+
+    res = client.patch(f"/trips/{trip_id}/pack-list", json={"removed": [_ids(trip_id)["Tent"]]})
+    assert res.status_code == 404
+    assert _items(trip_id) == {"Tent": False}
+
+
+def test_many_items_stay_under_the_parameter_limit(app, packer):
+    trip_id = _trip(packer, "Sync bulk")
+    inserts = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO PACK_LIST_ITEMS"):
+            inserts.append(len(parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        added = add_pack_items(trip_id, [f"Item {i}" for i in range(1000)])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert added == 1000
+    assert len(_items(trip_id)) == 1000
+    assert len(inserts) > 1
+    assert max(inserts) <= MAX_BOUND_PARAMETERS
@@ -0,0 +1,133 @@
+# keyset pages: every row exactly once, in (start_date, id) order, across ties
+from datetime import date, timedelta
+
+import pytest
+
+from GearGuide import db
+from GearGuide.database import (
+    accept_friend_request,
+    add_user,
+    decode_cursor,
+    encode_cursor,
+    get_hosted_trips_page,
+    get_pending_trip_invites_page,
+    get_user_by_username,
+    get_users_friends_page,
+    get_users_trips_page,
+    send_friend_request,
+)
+from GearGuide.models import Trip, TripInvite
+
+PASSWORD = "pager-password"
+
+
+def _user(name):
+    add_user(name, f"{name}@example.com", PASSWORD)
+    return get_user_by_username(name).id
+
+
+def _trip(host_id, name, start):
+    trip = Trip(host_id=host_id, name=name, destination="Page Test", lat=40.0, lon=-105.0,
+                start_date=start, end_date=start + timedelta(days=1))
+    db.session.add(trip)
+    db.session.commit()
+    return trip.id
+
+
+def _all_pages(fetch, user_id, limit):
+    """Follows next_cursor from the first page to the last; returns every item"""
+    items, cursor, pages = [], None, 0
+    while True:
+        page = fetch(user_id, cursor, limit)
+        items.extend(page.items)
+        pages += 1
+        if page.next_cursor is None:
+            return items, pages
+        cursor = page.next_cursor
+
+
+@pytest.fixture(scope="module")
+def trips(app):
+    """pager hosts 7 trips and joined 5 of other's, most on the same two dates"""
+
+    pager, other = _user("pager"), _user("pager_host")
+    soon = date.today() + timedelta(days=10)
+    later = soon + timedelta(days=1)
+
+    hosted, shared = [], []
+    # interleave the two owners so ids on one date alternate hosted/shared
+    for i in range(6):
+        hosted.append(_trip(pager, f"Hosted {i}", soon if i % 2 else later))
+        shared.append(_trip(other, f"Shared {i}", soon if i % 2 else later))
+    hosted.append(_trip(pager, "Hosted last", later + timedelta(days=3)))
+
+    for trip_id in shared[:5]:
+        db.session.add(TripInvite(user_id=pager, trip_id=trip_id, accepted=True))
+    # still pending, so not one of pager's trips yet
+    db.session.add(TripInvite(user_id=pager, trip_id=shared[5], accepted=False))
+    db.session.commit()
+    return {"pager": pager, "other": other, "hosted": hosted, "joined": shared[:5], "pending": shared[5:]}
+
+
+def _order(trip_ids):
+    rows = Trip.query.filter(Trip.id.in_(trip_ids)).all()
+    return [t.id for t in sorted(rows, key=lambda t: (t.start_date, t.id))]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 12, 50])
+def test_users_trips_pages_have_no_duplicates_or_gaps(trips, limit):
+    items, pages = _all_pages(get_users_trips_page, trips["pager"], limit)
+
+    assert [t.id for t in items] == _order(trips["hosted"] + trips["joined"])
+    assert pages == max(1, -(-len(items) // limit))
+
+
+@pytest.mark.parametrize("limit", [1, 4])
+def test_hosted_trips_pages(trips, limit):
+    items, _ = _all_pages(get_hosted_trips_page, trips["pager"], limit)
+    assert [t.id for t in items] == _order(trips["hosted"])
+
+
+def test_trip_invite_pages(trips):
+    items, _ = _all_pages(get_pending_trip_invites_page, trips["pager"], 1)
+    assert [trip.id for _, trip, _ in items] == trips["pending"]
+
+
+def test_friend_pages(app):
+    me = _user("pager_friendly")
+    friends = [_user(f"pager_friend_{i}") for i in range(5)]
+    for friend_id in friends:
+        send_friend_request(friend_id, me)
+        accept_friend_request(me, friend_id)
+
+    items, pages = _all_pages(get_users_friends_page, me, 2)
+    assert [u.id for u in items] == friends
+    assert pages == 3
+
+
+def test_cursor_round_trip_and_bad_cursors():
+    key = (date(2030, 1, 2), 42)
+    assert decode_cursor(encode_cursor(key), (date, int)) == key
+
+    for bad in ("not a cursor", encode_cursor(("x", 1)), encode_cursor((True, 1)), encode_cursor((1,))):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, (date, int))
+
+
+def test_json_list_follows_cursors_and_rejects_bad_ones(app, trips):
+    client = app.test_client()
+    client.post("/login", data={"email": "pager@example.com", "password": PASSWORD})
+
+    ids, after = [], None
+    while True:
+        res = client.get("/trips/list", query_string={"limit": 4, **({"after": after} if after else {})})
+        assert res.status_code == 200
+        body = res.get_json()
+        ids.extend(item["id"] for item in body["items"])
+        assert body["html"].count('class="list-row"') == len(body["items"])
+        after = body["next_cursor"]
+        if after is None:
+            break
+
+    assert ids == _order(trips["hosted"] + trips["joined"])
+    assert client.get("/trips/list?after=garbage").status_code == 400
@@ -0,0 +1,31 @@
+# each page runs a fixed number of statements, however much data is behind it
+import pytest
+
+from check_query_plans import ROUTE_BUDGETS, login, route_path
+from GearGuide import sql_metrics
+
+
+@pytest.fixture(scope="module")
+def user1_client(app, seeded):
+    client = app.test_client()
+    login(client)
+    return client
+
+
+@pytest.mark.parametrize("template, budget", ROUTE_BUDGETS, ids=[t for t, _ in ROUTE_BUDGETS])
+def test_route_query_budget(user1_client, seeded, template, budget):
+    path = route_path(template, seeded)
+    with sql_metrics.query_budget(budget):
+        res = user1_client.get(path)
+    assert res.status_code < 500
+
+
+def test_query_budget_catches_a_loop(app):
+    from sqlalchemy import text
+    from GearGuide import db
+    from GearGuide.sql_metrics import QueryBudgetExceeded
+
+    with pytest.raises(QueryBudgetExceeded):
+        with sql_metrics.query_budget(2):
+            for user_id in range(1, 5):
+                db.session.execute(text("SELECT id FROM users WHERE id = :id"), {"id": user_id})
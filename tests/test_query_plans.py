@@ -0,0 +1,25 @@
+# every query the database.py helpers and main pages send must use an index
+from sqlalchemy import event
+
+from check_query_plans import StatementLog, exercise_helpers, exercise_routes, explain
+from GearGuide import db
+
+
+def test_no_full_table_scans(app, seeded):
+    log = StatementLog()
+    event.listen(db.engine, "before_cursor_execute", log)
+    try:
+        exercise_helpers(log, seeded)
+        # page budgets are checked in test_query_budgets; here the pages only add statements
+        exercise_routes(app, seeded)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", log)
+
+    results = explain(db, log.statements)
+    assert results
+    scans = [
+        " ".join(statement.split()) + "\n    " + "\n    ".join(plan)
+        for statement, plan, failed in results
+        if failed
+    ]
+    assert not scans, "full table scans:\n" + "\n".join(scans)
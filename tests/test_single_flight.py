@@ -0,0 +1,99 @@
+# concurrent identical calls share one run of the function
+import threading
+import time
+
+import pytest
+
+from GearGuide.weather_cache import SingleFlight
+
+CALLERS = 8
+
+
+def _run_together(flight, key, fn):
+    """Calls flight.do(key, fn) from CALLERS threads at once
+
+    Returns each thread's result or exception"""
+
+    results = [None] * CALLERS
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def _slow_upstream(release, result=None, error=None):
+    """A fake upstream call that blocks until release is set, counting its calls"""
+
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    return fn, calls
+
+
+def _wait_for_followers(flight, count):
+    # every caller but the leader is parked on the leader's call
+    for _ in range(500):
+        if flight.coalesced >= count:
+            return
+        time.sleep(0.01)
+    pytest.fail(f"only {flight.coalesced} of {count} callers coalesced")
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    fn, calls = _slow_upstream(release, result={"periods": []})
+
+    threads, results = _run_together(flight, ("forecast", "OKX", 1, 2), fn)
+    _wait_for_followers(flight, CALLERS - 1)
+    assert flight.running(("forecast", "OKX", 1, 2))
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.in_flight() == 0
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    fn, calls = _slow_upstream(release, error=ValueError("upstream down"))
+
+    threads, results = _run_together(flight, "key", fn)
+    _wait_for_followers(flight, CALLERS - 1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_later_and_different_keys_call_again():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("a", fn) == 1
+    # the first call finished, so nothing is shared with this one
+    assert flight.do("a", fn) == 2
+    assert flight.do("b", fn) == 3
+    assert flight.coalesced == 0
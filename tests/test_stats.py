@@ -0,0 +1,23 @@
+# /stats is only served when switched on
+import pytest
+
+from GearGuide.database import add_user
+
+
+@pytest.fixture
+def logged_in(app):
+    add_user("statsuser", "statsuser@example.com", "stats-password")
+    client = app.test_client()
+    client.post("/login", data={"email": "statsuser@example.com", "password": "stats-password"})
+    return client
+
+
+def test_stats_is_not_found_by_default(logged_in):
+    assert logged_in.get("/stats").status_code == 404
+
+
+def test_stats_when_enabled(app, logged_in, monkeypatch):
+    monkeypatch.setitem(app.config, "STATS_ENABLED", True)
+    res = logged_in.get("/stats")
+    assert res.status_code == 200
+    assert set(res.get_json()) == {"http", "weather_cache", "geocode", "social_graph"}
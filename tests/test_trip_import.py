@@ -0,0 +1,93 @@
+# bulk trip import reports bad rows instead of failing the whole import
+import csv
+from datetime import date, timedelta
+from io import BytesIO
+
+import pytest
+
+from GearGuide.database import add_user
+
+PASSWORD = "import-password"
+
+
+@pytest.fixture(scope="module")
+def importer(app):
+    add_user("importer", "importer@example.com", PASSWORD)
+    client = app.test_client()
+    client.post("/login", data={"email": "importer@example.com", "password": PASSWORD})
+    return client
+
+
+def trip_row(name, **fields):
+    start = date.today() + timedelta(days=10)
+    row = {
+        "name": name,
+        "destination": "Moab, UT",
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=2)).isoformat(),
+    }
+    row.update(fields)
+    return row
+
+
+def test_mixed_type_json_rows(importer):
+    rows = [
+        trip_row("Good trip", activities=["Hiking"], notes="bring maps"),
+        trip_row(5),
+        trip_row("Numeric notes", notes=7),
+        trip_row("List destination", destination=["Moab"]),
+        trip_row("Numeric date", start_date=20300101),
+        trip_row("Bad activities", activities=3),
+        trip_row("Null notes", notes=None),
+    ]
+    res = importer.post("/trips/import", json={"trips": rows})
+
+    assert res.status_code == 200
+    report = res.get_json()
+    assert report["created"] == 2
+    assert {e["row"]: e["error"] for e in report["errors"]} == {
+        2: "name must be text",
+        3: "notes must be text",
+        4: "destination must be text",
+        5: "start_date must be text",
+        6: "activities must be text or a list of text",
+    }
+
+
+def test_csv_rows_still_import(importer):
+    start = date.today() + timedelta(days=12)
+    body = (
+        "name,destination,start_date,end_date,activities\n"
+        f"CSV trip,\"Moab, UT\",{start},{start + timedelta(days=1)},\"Hiking,Camping\"\n"
+        f"CSV missing,,{start},{start},\n"
+    )
+    res = importer.post("/trips/import", data={"file": (BytesIO(body.encode()), "trips.csv")})
+    report = res.get_json()
+    assert report["created"] == 1
+    assert report["errors"] == [{"row": 2, "error": "Missing destination"}]
+
+
+def _oversized_csv():
+    # one field past csv.field_size_limit()
+    return "name,destination,start_date,end_date\n" + "x" * (csv.field_size_limit() + 1) + ",Moab,2030-01-01,2030-01-02\n"
+
+
+def test_malformed_csv_is_a_bad_request(importer):
+    res = importer.post("/trips/import", data={"file": (BytesIO(_oversized_csv().encode()), "trips.csv")})
+    assert res.status_code == 400
+    assert res.get_json()["error"].startswith("Could not read trips: Bad CSV")
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("trips.csv", _oversized_csv()),
+    ("trips.json", "{not json"),
+])
+def test_cli_reports_unreadable_files_without_a_traceback(app, importer, tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_text(content)
+
+    result = app.test_cli_runner().invoke(args=["trips", "import", str(path), "--host", "importer"])
+
+    assert result.exit_code == 1
+    assert "Error: Could not read trips:" in result.output
+    assert "Traceback" not in result.output
@@ -0,0 +1,21 @@
+# /weather/batch rejects bodies that aren't a JSON object
+import pytest
+
+
+@pytest.mark.parametrize("body", [[1, 2], "trip_ids", 7, None])
+def test_non_object_body_is_a_400(client, body):
+    res = client.post("/weather/batch", json=body)
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "Expected a JSON object"}
+
+
+def test_missing_body_is_a_400(client):
+    res = client.post("/weather/batch", data="not json", content_type="application/json")
+    assert res.status_code == 400
+
+
+def test_points_batch(client):
+    res = client.post("/weather/batch", json={"points": [{"lat": 37.5, "lon": -119.5}]})
+    assert res.status_code == 200
+    [result] = res.get_json()["results"]
+    assert result["lat"] == 37.5 and "forecast" in result